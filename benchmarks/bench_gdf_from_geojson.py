@@ -0,0 +1,75 @@
+"""Compares utils.gdf_from_geojson against one GeoDataFrame per GeoJSON.
+
+The input mimics NUTS LEVL_3: one GeoJSON per unit, each with a single
+polygon feature.
+
+Usage:
+    python benchmarks/bench_gdf_from_geojson.py [units] [vertices]
+"""
+
+from __future__ import annotations
+
+import random
+import sys
+import time
+
+import geopandas as gpd
+import pandas as pd
+
+from gisco_geodata.typing import GeoJSON
+from gisco_geodata.utils import gdf_from_geojson
+
+CRS = 'urn:ogc:def:crs:EPSG::4326'
+
+
+def make_geojson(unit: int, vertices: int) -> GeoJSON:
+    ring = [[random.random(), random.random()] for _ in range(vertices)]
+    ring.append(ring[0])
+    return {
+        'type': 'FeatureCollection',
+        'crs': {'type': 'name', 'properties': {'name': CRS}},
+        'features': [
+            {
+                'type': 'Feature',
+                'properties': {'NUTS_ID': f'XX{unit:03}', 'LEVL_CODE': 3},
+                'geometry': {'type': 'Polygon', 'coordinates': [ring]},
+            }
+        ],
+    }
+
+
+def per_geojson(geojsons: list[GeoJSON]) -> gpd.GeoDataFrame:
+    """The previous implementation of gdf_from_geojson."""
+    return pd.concat(
+        [
+            gpd.GeoDataFrame.from_features(
+                features=geojson['features'],
+                crs=geojson['crs']['properties']['name'],
+            )
+            for geojson in geojsons
+        ]
+    )
+
+
+def timeit(func, *args, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(units: int = 1500, vertices: int = 200):
+    geojsons = [make_geojson(unit, vertices) for unit in range(units)]
+    assert len(per_geojson(geojsons)) == len(gdf_from_geojson(geojsons))
+    before = timeit(per_geojson, geojsons)
+    after = timeit(gdf_from_geojson, geojsons)
+    print(f'{units} GeoJSONs with {vertices} vertices each')
+    print(f'one GeoDataFrame per GeoJSON: {before:.3f}s')
+    print(f'gdf_from_geojson:             {after:.3f}s')
+    print(f'speedup: {before / after:.1f}x')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
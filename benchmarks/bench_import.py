@@ -0,0 +1,57 @@
+"""Measures the time of `import gisco_geodata` in fresh interpreters.
+
+Fails if one of the heavy optional dependencies is imported along with
+the package, or if the best time exceeds the budget, so it can be used
+to guard against regressions.
+
+Usage:
+    python benchmarks/bench_import.py [runs] [budget in seconds]
+"""
+
+from __future__ import annotations
+
+import json
+import subprocess
+import sys
+
+# Imported on first use only.
+HEAVY_MODULES = ('geopandas', 'pandas', 'pyogrio', 'shapely', 'numpy')
+
+CODE = f"""
+import json, sys, time
+start = time.perf_counter()
+import gisco_geodata
+elapsed = time.perf_counter() - start
+heavy = [name for name in {HEAVY_MODULES!r} if name in sys.modules]
+print(json.dumps({{'elapsed': elapsed, 'heavy': heavy}}))
+"""
+
+
+def measure() -> dict:
+    output = subprocess.run(
+        [sys.executable, '-c', CODE],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def main(runs: int = 10, budget: float = 0.5) -> int:
+    results = [measure() for _ in range(runs)]
+    best = min(result['elapsed'] for result in results)
+    heavy = sorted({name for result in results for name in result['heavy']})
+    print(f'import gisco_geodata: {best * 1000:.1f}ms (best of {runs})')
+    if heavy:
+        print(f'heavy modules imported: {", ".join(heavy)}')
+        return 1
+    if best > budget:
+        print(f'over the budget of {budget * 1000:.0f}ms')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    budget = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    sys.exit(main(runs, budget))
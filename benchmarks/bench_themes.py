@@ -0,0 +1,291 @@
+"""Benchmarks the get() and download() methods against a local server.
+
+The synthetic tree of gisco_server.py is served from a subprocess, with
+the injected latency, jitter, bandwidth and error rate, and the package
+reads it as an HTTP mirror. Every scenario is run once to warm up
+(imports, generation of the files by the server), then 'repeat' times
+with the in-memory caches cleared, and once more with tracemalloc to
+measure the peak of the memory allocated during the run.
+
+For every scenario, the percentiles of the wall time of a run are
+reported along with the throughput (units and MiB per second), the
+number of requests of a run, the 503 retried, the highest number
+of concurrent requests seen by the server, and the latency percentiles
+and mean wait of the requests reported by gisco_geodata.collect_stats.
+
+Usage:
+    python benchmarks/bench_themes.py [--repeat 5] [--latency 0.05]
+        [--error-rate 0.01] [--scenario nuts --scenario download] ...
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+import gisco_server
+
+import gisco_geodata
+from gisco_geodata import NUTS, Countries, UrbanAudit
+
+
+def nuts_units(out_dir: Path) -> int:
+    """Every LEVL_3 unit, one request per unit."""
+    gisco_geodata.set_bulk_fetch(False)
+    return len(NUTS().get(nuts_level='LEVL_3', scale='20M'))
+
+
+def nuts_bulk(out_dir: Path) -> int:
+    """Every LEVL_3 unit, from the file of the level."""
+    gisco_geodata.set_bulk_fetch(True)
+    return len(NUTS().get(nuts_level='LEVL_3', scale='20M'))
+
+
+def nuts_countries(out_dir: Path) -> int:
+    """Five countries at 01M, chosen over the file of the level."""
+    gisco_geodata.set_bulk_fetch(True)
+    return len(
+        NUTS().get(
+            countries=['AT', 'BE', 'BG', 'CH', 'CY'],
+            nuts_level='LEVL_0',
+            scale='01M',
+        )
+    )
+
+
+def countries(out_dir: Path) -> int:
+    """Every country at 01M, one request per unit."""
+    gisco_geodata.set_bulk_fetch(False)
+    return len(Countries().get(spatial_type='RG', scale='01M'))
+
+
+def urau(out_dir: Path) -> int:
+    """The cities and urban areas of two countries at 01M."""
+    return len(UrbanAudit().get(countries=['AT', 'BE'], scale='01M'))
+
+
+def download(out_dir: Path, parts: int = 1) -> int:
+    """A binary file of the server (32 MiB by default) to the disk."""
+    NUTS().download(
+        file_format='shp',
+        spatial_type='RG',
+        scale='01M',
+        projection='4326',
+        nuts_level='LEVL_3',
+        out_dir=out_dir,
+        parts=parts,
+    )
+    return 1
+
+
+def download_parts(out_dir: Path) -> int:
+    """The same file as 'download', as 4 concurrent range requests."""
+    return download(out_dir, parts=4)
+
+
+SCENARIOS: dict[str, Callable[[Path], int]] = {
+    'nuts': nuts_units,
+    'nuts-bulk': nuts_bulk,
+    'nuts-countries': nuts_countries,
+    'countries': countries,
+    'urau': urau,
+    'download': download,
+    'download-parts': download_parts,
+}
+
+
+@dataclass
+class Result:
+    scenario: str
+    runs: list[float]
+    units: int
+    requests: float
+    errors: float
+    bytes: float
+    max_in_flight: int
+    peak_memory: int
+    # The latency percentiles of the requests and their mean wait for
+    # the limits, as reported by gisco_geodata.collect_stats.
+    request_p50: Optional[float]
+    request_p90: Optional[float]
+    request_wait: float
+
+    def percentile(self, q: float) -> float:
+        runs = sorted(self.runs)
+        position = q / 100 * (len(runs) - 1)
+        low = int(position)
+        high = min(low + 1, len(runs) - 1)
+        return runs[low] + (runs[high] - runs[low]) * (position - low)
+
+    @property
+    def mean(self) -> float:
+        return sum(self.runs) / len(self.runs)
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            **asdict(self),
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'units_per_second': self.units / self.mean,
+            'mib_per_second': self.bytes / self.mean / 1024**2,
+        }
+
+
+def run(scenario: str, url: str, repeat: int, concurrency: int) -> Result:
+    func = SCENARIOS[scenario]
+
+    def once() -> tuple[float, int]:
+        gisco_geodata.clear_cache()
+        # Every run starts from the same limit, the limiter having
+        # adapted to the latency and errors of the previous run.
+        gisco_geodata.set_semaphore_value(concurrency)
+        with tempfile.TemporaryDirectory() as out_dir:
+            start = time.perf_counter()
+            units = func(Path(out_dir))
+            return (time.perf_counter() - start, units)
+
+    once()
+    before = gisco_server.fetch_stats(url)
+    runs = []
+    units = 0
+    with gisco_geodata.collect_stats() as stats:
+        for _ in range(repeat):
+            elapsed, units = once()
+            runs.append(elapsed)
+    after = gisco_server.fetch_stats(url)
+    # Already tracing when the process is profiled (GISCO_GEODATA_PROFILE),
+    # in which case the run is left out of the profile, which would reset
+    # the peak.
+    gisco_geodata.clear_cache()
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    try:
+        with gisco_geodata.profile(memory=False):
+            once()
+        peak_memory = tracemalloc.get_traced_memory()[1] - base
+    finally:
+        if started:
+            tracemalloc.stop()
+    return Result(
+        scenario=scenario,
+        runs=runs,
+        units=units,
+        requests=(after.requests - before.requests) / repeat,
+        errors=(after.errors - before.errors) / repeat,
+        bytes=(after.bytes - before.bytes) / repeat,
+        max_in_flight=after.max_in_flight,
+        peak_memory=peak_memory,
+        request_p50=stats.percentile(50),
+        request_p90=stats.percentile(90),
+        request_wait=stats.wait / stats.cache_misses
+        if stats.cache_misses
+        else 0.0,
+    )
+
+
+def start_server(args: argparse.Namespace) -> tuple[subprocess.Popen, str]:
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            str(Path(__file__).with_name('gisco_server.py')),
+            '--port=0',
+            *gisco_server.server_options(args),
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    assert process.stdout is not None
+    line = process.stdout.readline()
+    if not line:
+        process.wait()
+        raise RuntimeError('The server did not start.')
+    return (process, line.split()[-1])
+
+
+def _ms(seconds: Optional[float]) -> str:
+    return '-' if seconds is None else f'{seconds * 1000:.0f}ms'
+
+
+def print_table(results: list[Result]):
+    header = (
+        f'{"scenario":<16}{"p50":>8}{"p90":>8}{"p99":>8}{"units/s":>10}'
+        f'{"MiB/s":>8}{"requests":>10}{"503":>6}{"in flight":>11}'
+        f'{"peak MiB":>10}{"req p50":>9}{"req p90":>9}{"wait":>8}'
+    )
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        summary = result.summary()
+        print(
+            f'{result.scenario:<16}'
+            f'{summary["p50"]:>7.3f}s{summary["p90"]:>7.3f}s'
+            f'{summary["p99"]:>7.3f}s'
+            f'{summary["units_per_second"]:>10.1f}'
+            f'{summary["mib_per_second"]:>8.1f}'
+            f'{result.requests:>10.0f}{result.errors:>6.1f}'
+            f'{result.max_in_flight:>11}'
+            f'{result.peak_memory / 1024**2:>10.1f}'
+            f'{_ms(result.request_p50):>9}{_ms(result.request_p90):>9}'
+            f'{_ms(result.request_wait):>8}'
+        )
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--scenario',
+        action='append',
+        choices=list(SCENARIOS),
+        help='can be repeated, defaults to every scenario',
+    )
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument(
+        '--concurrency', type=int, default=gisco_geodata.theme.SEMAPHORE_VALUE
+    )
+    parser.add_argument('--json', type=Path, help='also write the results')
+    gisco_server.add_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = parse_args(argv)
+    process, url = start_server(args)
+    try:
+        gisco_geodata.set_mirror(url)
+        gisco_geodata.set_cache_dir(None)
+        print(
+            f'latency {args.latency}s (+{args.jitter}s), '
+            f'error rate {args.error_rate}, '
+            f'bandwidth {args.bandwidth or "unlimited"}, '
+            f'{args.repeat} runs per scenario'
+        )
+        results = [
+            run(scenario, url, args.repeat, args.concurrency)
+            for scenario in args.scenario or SCENARIOS
+        ]
+    finally:
+        process.terminate()
+        process.wait()
+    print_table(results)
+    if args.json is not None:
+        args.json.write_text(
+            json.dumps([result.summary() for result in results], indent=1)
+        )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,544 @@
+"""A local stand-in for the GISCO distribution API, serving synthetic data.
+
+The tree has the layout of 'https://gisco-services.ec.europa.eu/distribution/v2/'
+for the 'nuts', 'countries' and 'urau' themes: themes.json, datasets.json,
+the files and units of every dataset, one GeoJSON per unit and scale, the
+files with every unit of a level, and binary files (e.g. '.shp.zip')
+served with range requests. The GeoJSON files have the approximate size
+of the real ones for their scale and are generated on first request.
+
+Latency, bandwidth limits and errors (503, retried by the package) can be
+injected. The counters of the server are served at '/_stats'.
+
+Usage:
+    python benchmarks/gisco_server.py [--port 8000] [--latency 0.05] ...
+    GISCO_GEODATA_MIRROR=http://127.0.0.1:8000/ python my_script.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+
+COUNTRIES = (
+    'AT', 'BE', 'BG', 'CH', 'CY', 'CZ', 'DE', 'DK', 'EE', 'EL', 'ES', 'FI',
+    'FR', 'HR', 'HU', 'IE', 'IS', 'IT', 'LI', 'LT', 'LU', 'LV', 'ME', 'MK',
+    'MT', 'NL', 'NO', 'PL', 'PT', 'RO', 'RS', 'SE', 'SI', 'SK', 'TR', 'UK',
+)  # fmt: skip
+SCALES = ('01M', '03M', '10M', '20M', '60M')
+PROJECTIONS = ('4326', '3035', '3857')
+# Rough size of a unit file by scale, as in gisco_geodata.theme.
+UNIT_SIZES = {
+    '100K': 1_500_000,
+    '01M': 300_000,
+    '03M': 100_000,
+    '10M': 30_000,
+    '20M': 10_000,
+    '60M': 4_000,
+}
+# The size of a vertex in a compact GeoJSON, e.g. '[12.345678,45.678901],'.
+VERTEX_SIZE = 24
+_NUTS_CHARS = '123456789ABCDEFGHIJK'
+_UNIT_FILE = re.compile(
+    r'^(?P<unit>[A-Z0-9]+)-(?:region-(?P<scale>\w+)|label)'
+    r'-(?P<projection>\d+)-(?P<year>\d{4})\.geojson$'
+)
+_LEVEL_FILE = re.compile(
+    r'^(?P<code>[A-Z]+)_(?P<type>RG|LB)(?:_(?P<scale>\d{2}M|100K))?'
+    r'_(?P<year>\d{4})_(?P<projection>\d+)(?:_LEVL_(?P<level>\d))?\.geojson$'
+)
+
+
+@dataclass
+class Tree:
+    """The synthetic distribution tree.
+
+    Args:
+        countries: The number of countries, at most len(COUNTRIES).
+        fanout: The number of NUTS units below every unit of the levels
+            0 to 2. Each country has 1 + fanout + fanout**2 + fanout**3
+            units.
+        cities: The number of Urban Audit cities per country, each with
+            a city ('C') and a functional urban area ('F') unit.
+        size_factor: Multiplies the size of the GeoJSON files.
+        file_size: The size of the binary files, in bytes.
+        seed: The seed of the generated geometries.
+    """
+
+    countries: int = 25
+    fanout: int = 4
+    cities: int = 3
+    size_factor: float = 1.0
+    file_size: int = 32 * 1024**2
+    seed: int = 0
+
+    def __post_init__(self) -> None:
+        self.country_ids = COUNTRIES[: self.countries]
+        self.nuts_ids = self._nuts_ids()
+        self.urau_ids = [
+            f'{country}{city:03}{category}'
+            for country in self.country_ids
+            for city in range(1, self.cities + 1)
+            for category in ('C', 'F')
+        ]
+        self.datasets: dict[str, tuple[str, str, list[str]]] = {
+            'nuts': ('2021', 'NUTS', self.nuts_ids),
+            'countries': ('2020', 'CNTR', list(self.country_ids)),
+            'urau': ('2021', 'URAU', self.urau_ids),
+        }
+        self._cache: dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def _nuts_ids(self) -> list[str]:
+        ids = list(self.country_ids)
+        parents = ids
+        for _ in range(3):
+            parents = [
+                f'{parent}{_NUTS_CHARS[i]}'
+                for parent in parents
+                for i in range(self.fanout)
+            ]
+            ids.extend(parents)
+        return ids
+
+    def themes(self) -> dict[str, Any]:
+        return {
+            theme: {'title': code, 'datasets': f'{theme}/datasets.json'}
+            for theme, (_, code, _) in self.datasets.items()
+        }
+
+    def theme_datasets(self, theme: str) -> dict[str, Any]:
+        year = self.datasets[theme][0]
+        return {
+            f'{theme}-{year}': {
+                'date': f'01/01/{year}',
+                'files': f'{theme}-{year}-files.json',
+                'units': f'{theme}-{year}-units.json',
+                'title': f'{theme} {year}',
+            }
+        }
+
+    def files(self, theme: str) -> dict[str, list[str]]:
+        year, code, _ = self.datasets[theme]
+        levels: tuple[str, ...] = ('',)
+        if theme == 'nuts':
+            levels = ('_LEVL_0', '_LEVL_1', '_LEVL_2', '_LEVL_3', '')
+        files: dict[str, list[str]] = {'geojson': [], 'shp': []}
+        for projection in PROJECTIONS:
+            for level in levels:
+                for scale in SCALES:
+                    stem = f'{code}_RG_{scale}_{year}_{projection}{level}'
+                    files['geojson'].append(f'{stem}.geojson')
+                    files['shp'].append(f'{stem}.shp.zip')
+                files['geojson'].append(
+                    f'{code}_LB_{year}_{projection}{level}.geojson'
+                )
+        return files
+
+    def units(self, theme: str) -> dict[str, list[str]]:
+        year, _, ids = self.datasets[theme]
+        return {
+            unit: [
+                f'{unit}-region-{scale}-{projection}-{year}.geojson'
+                for scale in SCALES
+                for projection in PROJECTIONS
+            ]
+            + [
+                f'{unit}-label-{projection}-{year}.geojson'
+                for projection in PROJECTIONS
+            ]
+            for unit in ids
+        }
+
+    def _properties(self, theme: str, unit: str) -> dict[str, Any]:
+        if theme == 'nuts':
+            return {
+                'NUTS_ID': unit,
+                'LEVL_CODE': len(unit) - 2,
+                'CNTR_CODE': unit[:2],
+                'NAME_LATN': f'Region {unit}',
+                'NUTS_NAME': f'Region {unit}',
+                'MOUNT_TYPE': 0,
+                'URBN_TYPE': 0,
+                'COAST_TYPE': 0,
+                'FID': unit,
+            }
+        if theme == 'countries':
+            return {
+                'CNTR_ID': unit,
+                'CNTR_NAME': f'Country {unit}',
+                'NAME_ENGL': f'Country {unit}',
+                'ISO3_CODE': f'{unit}X',
+                'FID': unit,
+            }
+        return {
+            'URAU_CODE': unit,
+            'URAU_CATG': unit[-1],
+            'CNTR_CODE': unit[:2],
+            'URAU_NAME': f'City {unit}',
+            'FID': unit,
+        }
+
+    def _feature(
+        self, theme: str, unit: str, scale: Optional[str]
+    ) -> dict[str, Any]:
+        rng = random.Random(f'{self.seed}-{theme}-{unit}')
+        x, y = rng.uniform(-10, 30), rng.uniform(35, 70)
+        if scale is None:
+            geometry: dict[str, Any] = {
+                'type': 'Point',
+                'coordinates': [round(x, 6), round(y, 6)],
+            }
+        else:
+            size = UNIT_SIZES.get(scale, UNIT_SIZES['01M'])
+            vertices = max(4, int(size * self.size_factor) // VERTEX_SIZE)
+            ring = []
+            for i in range(vertices - 1):
+                angle = 2 * math.pi * i / (vertices - 1)
+                radius = 0.5 * rng.uniform(0.8, 1.2)
+                ring.append(
+                    [
+                        round(x + radius * math.cos(angle), 6),
+                        round(y + radius * math.sin(angle), 6),
+                    ]
+                )
+            ring.append(ring[0])
+            geometry = {'type': 'MultiPolygon', 'coordinates': [[ring]]}
+        return {
+            'type': 'Feature',
+            'id': unit,
+            'properties': self._properties(theme, unit),
+            'geometry': geometry,
+        }
+
+    def _geojson(
+        self,
+        theme: str,
+        units: list[str],
+        scale: Optional[str],
+        projection: str,
+    ) -> bytes:
+        geojson = {
+            'type': 'FeatureCollection',
+            'crs': {
+                'type': 'name',
+                'properties': {'name': f'urn:ogc:def:crs:EPSG::{projection}'},
+            },
+            'features': [self._feature(theme, unit, scale) for unit in units],
+        }
+        return json.dumps(geojson, separators=(',', ':')).encode()
+
+    def _level_units(self, theme: str, level: Optional[str]) -> list[str]:
+        ids = self.datasets[theme][2]
+        if level is None:
+            return ids
+        return [unit for unit in ids if len(unit) - 2 == int(level)]
+
+    def _dumps(self, value: Any) -> bytes:
+        return json.dumps(value).encode()
+
+    def _generate(self, path: str) -> Optional[bytes]:
+        if path == 'themes.json':
+            return self._dumps(self.themes())
+        theme, _, rest = path.partition('/')
+        if theme not in self.datasets:
+            return None
+        year, code, ids = self.datasets[theme]
+        if rest == 'datasets.json':
+            return self._dumps(self.theme_datasets(theme))
+        if rest == f'{theme}-{year}-files.json':
+            return self._dumps(self.files(theme))
+        if rest == f'{theme}-{year}-units.json':
+            return self._dumps(self.units(theme))
+        file_format, _, file_name = rest.partition('/')
+        if file_format == 'distribution':
+            match = _UNIT_FILE.match(file_name)
+            if match is None or match['unit'] not in ids:
+                return None
+            return self._geojson(
+                theme, [match['unit']], match['scale'], match['projection']
+            )
+        if file_format == 'geojson':
+            match = _LEVEL_FILE.match(file_name)
+            if match is None or match['code'] != code:
+                return None
+            return self._geojson(
+                theme,
+                self._level_units(theme, match['level']),
+                match['scale'],
+                match['projection'],
+            )
+        if file_name in self.files(theme).get(file_format, ()):
+            return random.Random(file_name).randbytes(self.file_size)
+        return None
+
+    def get(self, path: str) -> Optional[bytes]:
+        """The content of a file of the tree, None if there is no such file."""
+        with self._lock:
+            content = self._cache.get(path)
+        if content is None:
+            content = self._generate(path)
+            if content is not None:
+                with self._lock:
+                    self._cache[path] = content
+        return content
+
+
+@dataclass
+class Stats:
+    """The counters of the server since it started.
+
+    'max_in_flight' is the highest number of concurrent requests since
+    the previous read of '/_stats'.
+    """
+
+    requests: int = 0
+    errors: int = 0
+    bytes: int = 0
+    in_flight: int = 0
+    max_in_flight: int = 0
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Otherwise the body waits for the delayed ACK of the headers.
+    disable_nagle_algorithm = True
+    server: GiscoServer
+
+    def log_message(self, format: str, *args: Any):
+        pass
+
+    def do_HEAD(self):
+        self._handle(body=False)
+
+    def do_GET(self):
+        self._handle(body=True)
+
+    def _send(
+        self,
+        status: int,
+        content: bytes = b'',
+        headers: Optional[dict[str, str]] = None,
+        body: bool = True,
+    ):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body:
+            self.server.write(self.wfile, content)
+
+    def _handle(self, body: bool):
+        path = self.path.split('?')[0].lstrip('/')
+        if path == '_stats':
+            with self.server.lock:
+                stats = self.server.stats
+                content = json.dumps(asdict(stats)).encode()
+                # The next read reports the peak since this one.
+                stats.max_in_flight = stats.in_flight
+            self._send(200, content)
+            return
+        with self.server.lock:
+            stats = self.server.stats
+            stats.requests += 1
+            stats.in_flight += 1
+            stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+        try:
+            self._respond(path, body)
+        finally:
+            with self.server.lock:
+                self.server.stats.in_flight -= 1
+
+    def _respond(self, path: str, body: bool):
+        server = self.server
+        delay = server.latency + server.rng.uniform(0, server.jitter)
+        if delay:
+            time.sleep(delay)
+        if server.rng.random() < server.error_rate:
+            with server.lock:
+                server.stats.errors += 1
+            self._send(503, b'Service Unavailable', body=body)
+            return
+        content = server.tree.get(path)
+        if content is None:
+            self._send(404, b'Not Found', body=body)
+            return
+        headers = {'Accept-Ranges': 'bytes'}
+        status = 200
+        range_ = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+        if range_ is not None:
+            start = int(range_[1])
+            end = int(range_[2]) if range_[2] else len(content) - 1
+            if start >= len(content):
+                headers['Content-Range'] = f'bytes */{len(content)}'
+                self._send(416, headers=headers, body=body)
+                return
+            end = min(end, len(content) - 1)
+            headers['Content-Range'] = f'bytes {start}-{end}/{len(content)}'
+            content = content[start : end + 1]
+            status = 206
+        if path.endswith('.json') or path.endswith('.geojson'):
+            headers['Content-Type'] = 'application/json'
+        else:
+            headers['Content-Type'] = 'application/octet-stream'
+        self._send(status, content, headers, body)
+        if body:
+            with server.lock:
+                server.stats.bytes += len(content)
+
+
+class GiscoServer(ThreadingHTTPServer):
+    """Serves a Tree on a thread per connection.
+
+    Args:
+        tree: The served tree.
+        address: The host and port, port 0 picks a free port.
+        latency: The delay before every response, in seconds.
+        jitter: A random delay added to the latency, up to this value.
+        error_rate: The probability of answering with a 503.
+        bandwidth: The maximum number of bytes per second of a response,
+            None means no limit.
+        seed: The seed of the injected jitter and errors.
+    """
+
+    daemon_threads = True
+    # The connections opened at once by the concurrent requests.
+    request_queue_size = 256
+
+    def __init__(
+        self,
+        tree: Optional[Tree] = None,
+        address: tuple[str, int] = ('127.0.0.1', 0),
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        bandwidth: Optional[float] = None,
+        seed: int = 0,
+    ):
+        super().__init__(address, Handler)
+        self.tree = tree if tree is not None else Tree()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.bandwidth = bandwidth
+        self.rng = random.Random(seed)
+        self.stats = Stats()
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host!s}:{port}/'
+
+    def write(self, wfile: Any, content: bytes, chunk_size: int = 64 * 1024):
+        if self.bandwidth is None:
+            wfile.write(content)
+            return
+        view = memoryview(content)
+        for start in range(0, len(view), chunk_size):
+            chunk = view[start : start + chunk_size]
+            wfile.write(chunk)
+            time.sleep(len(chunk) / self.bandwidth)
+
+    def __enter__(self) -> GiscoServer:
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args: Any):
+        self.shutdown()
+        self.server_close()
+
+
+def fetch_stats(url: str) -> Stats:
+    """The counters of a server running in another process."""
+    from urllib.request import urlopen
+
+    with urlopen(f'{url}_stats') as resp:
+        return Stats(**json.load(resp))
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    add_arguments(parser)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    return parser.parse_args(argv)
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """The options of the server, shared with the benchmarks."""
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument(
+        '--bandwidth',
+        type=float,
+        default=None,
+        help='bytes per second of a response',
+    )
+    parser.add_argument('--countries', type=int, default=Tree.countries)
+    parser.add_argument('--fanout', type=int, default=Tree.fanout)
+    parser.add_argument('--cities', type=int, default=Tree.cities)
+    parser.add_argument('--size-factor', type=float, default=Tree.size_factor)
+    parser.add_argument('--file-size', type=int, default=Tree.file_size)
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def server_options(args: argparse.Namespace) -> list[str]:
+    """The command line of the server options in 'args'."""
+    options = [
+        f'--latency={args.latency}',
+        f'--jitter={args.jitter}',
+        f'--error-rate={args.error_rate}',
+        f'--countries={args.countries}',
+        f'--fanout={args.fanout}',
+        f'--cities={args.cities}',
+        f'--size-factor={args.size_factor}',
+        f'--file-size={args.file_size}',
+        f'--seed={args.seed}',
+    ]
+    if args.bandwidth is not None:
+        options.append(f'--bandwidth={args.bandwidth}')
+    return options
+
+
+def main(argv: Optional[list[str]] = None):
+    args = parse_args(argv)
+    tree = Tree(
+        countries=args.countries,
+        fanout=args.fanout,
+        cities=args.cities,
+        size_factor=args.size_factor,
+        file_size=args.file_size,
+        seed=args.seed,
+    )
+    server = GiscoServer(
+        tree,
+        (args.host, args.port),
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        bandwidth=args.bandwidth,
+        seed=args.seed,
+    )
+    # Read by the benchmarks to find the port.
+    print(f'Serving the GISCO stand-in at {server.url}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,19 @@
 from __future__ import annotations
 
+from typing import Literal, Optional
+
+from .caching import DEFAULT_MAX_SIZE, DEFAULT_MEMORY_MAX_SIZE, CacheInfo
+from .catalog import Catalog, FileRecord, aget_catalog, get_catalog
+from .events import (
+    CallEvent,
+    RequestEvent,
+    RequestStats,
+    add_listener,
+    collect_stats,
+    remove_listener,
+)
+from .mirror import MirrorReport, amirror, mirror
+from .profiling import Profile, profile
 from .theme import (
     NUTS,
     CoastalLines,
@@ -9,31 +23,247 @@ from .theme import (
     PostalCodes,
     UrbanAudit,
 )
+from .typing import FilePath
+from .utils import RetryPolicy
 
 __version__ = '0.1.3'
 
 __all__ = [
     'NUTS',
+    'CallEvent',
+    'Catalog',
     'CoastalLines',
     'Communes',
     'Countries',
+    'FileRecord',
     'LocalAdministrativeUnits',
+    'MirrorReport',
     'PostalCodes',
+    'Profile',
+    'RequestEvent',
+    'RequestStats',
+    'RetryPolicy',
     'UrbanAudit',
+    'add_listener',
+    'aget_catalog',
+    'amirror',
+    'collect_stats',
+    'get_catalog',
+    'mirror',
+    'profile',
+    'remove_listener',
 ]
 
 
 def set_semaphore_value(value: int):
-    """The maximum number of asynchronous API calls."""
+    """The maximum number of concurrent requests to a host.
+
+    The limit is shared by all the requests of the process and adapts
+    below this maximum when the server slows down or throttles
+    (see gisco_geodata.limits.AdaptiveLimiter). The synchronous calls
+    have a limit of their own, so that a call made from a coroutine
+    does not wait for the requests of the loop it blocks.
+    """
+    import gisco_geodata.parser
     import gisco_geodata.theme
 
     gisco_geodata.theme.SEMAPHORE_VALUE = value
+    gisco_geodata.parser.LIMITER.max_concurrency = value
+
+
+def set_host_concurrency(host: str, value: Optional[int]):
+    """The maximum number of concurrent requests to a specific host.
+
+    Args:
+        host: The host, with the port if it is not the default one
+            (e.g. 'gisco-services.ec.europa.eu' or 'localhost:8000').
+        value: The maximum. None restores the one of set_semaphore_value.
+    """
+    import gisco_geodata.parser
+
+    gisco_geodata.parser.LIMITER.set_host_limit(host, value)
+
+
+def set_geojson_reader(reader: Literal['json', 'pyogrio']):
+    """How the GeoJSON files are converted to GeoDataFrames.
+
+    'json' parses the files into Python objects (with orjson if it is
+    installed) and builds the GeoDataFrame from the features. 'pyogrio'
+    hands the raw bytes to pyogrio instead, which is faster and uses less
+    memory for whole files (e.g. ThemeParser.download without out_dir,
+    or the file of the level read by get(), see set_bulk_fetch).
+    The per unit files of get() are always parsed with 'json', because
+    pyogrio has a fixed cost per file which outweighs the gain for
+    small files.
+    """
+    import gisco_geodata.theme
+
+    if reader not in ('json', 'pyogrio'):
+        raise ValueError(f'Reader {reader} not allowed.')
+    gisco_geodata.theme.GEOJSON_READER = reader
+
+
+def set_retry_policy(policy: RetryPolicy):
+    """The retry policy used by all requests.
+
+    It can be overridden per call with the 'retry_policy' argument
+    of the functions from gisco_geodata.parser.
+    """
+    import gisco_geodata.utils
+
+    gisco_geodata.utils.RETRY_POLICY = policy
+
+
+def set_bulk_fetch(enabled: bool):
+    """Whether get() may download all the units of a level at once.
+
+    If enabled, NUTS.get and Countries.get download the single file with
+    every unit of the level and filter it locally, when that is estimated
+    to be cheaper than downloading the requested units one by one.
+
+    Disabled by default, as the units missing from the file of the level
+    are left out instead of raising an error.
+    """
+    import gisco_geodata.theme
+
+    gisco_geodata.theme.BULK_FETCH = enabled
 
 
 def set_httpx_args(**kwargs):
-    """Additional kwargs to use for httpx."""
+    """Additional kwargs to use for httpx.
+
+    The arguments are applied to the pooled clients shared by all requests
+    (e.g. 'limits=httpx.Limits(...)' or 'http2=True', which requires
+    the 'h2' package, installed with the 'http2' extra).
+    """
     import gisco_geodata.parser
 
     gisco_geodata.parser.HTTPX_KWARGS = {}
     for k, v in kwargs.items():
         gisco_geodata.parser.HTTPX_KWARGS[k] = v
+    gisco_geodata.parser.SESSION.configure(**gisco_geodata.parser.HTTPX_KWARGS)
+
+
+def set_mirror(mirror: Optional[FilePath]):
+    """Reads the distribution tree from a mirror instead of the GISCO API.
+
+    The mirror has the same layout as the API ('themes.json',
+    '<theme>/datasets.json', '<theme>/<format>/<file>', ...). A local
+    directory or 'file://' URL is read from the disk without any HTTP
+    client. A local mirror can be created with mirror() or
+    'python -m gisco_geodata sync'. The mirror can also be set with the
+    'GISCO_GEODATA_MIRROR' environment variable. The in-memory caches
+    are cleared.
+
+    Args:
+        mirror: A directory, a 'file://' URL or an 'http(s)://' URL.
+            None restores the GISCO API.
+    """
+    import gisco_geodata.parser
+
+    gisco_geodata.parser.BACKEND = gisco_geodata.parser.backend_from_mirror(
+        mirror
+    )
+    clear_cache()
+
+
+def set_rate_limit(
+    rate: Optional[float],
+    burst: Optional[float] = None,
+    lock_file: Optional[FilePath] = None,
+):
+    """Paces the requests with a token bucket shared by all the requests.
+
+    Args:
+        rate: The maximum number of requests per second. None disables
+            the pacing.
+        burst: The number of requests which can be sent at once after
+            an idle period. Defaults to one second of requests.
+        lock_file: A file holding the bucket, to share the rate between
+            the processes using the same file. Requires fcntl, which is
+            not available on Windows.
+    """
+    import gisco_geodata.parser
+    from gisco_geodata.limits import TokenBucket
+
+    if rate is None:
+        gisco_geodata.parser.RATE_LIMITER = None
+    else:
+        gisco_geodata.parser.RATE_LIMITER = TokenBucket(
+            rate, burst=burst, lock_file=lock_file
+        )
+
+
+def set_cache_dir(
+    directory: Optional[FilePath],
+    max_size: Optional[int] = DEFAULT_MAX_SIZE,
+    revalidate: bool = True,
+):
+    """Caches the downloaded files on the disk, across processes.
+
+    The directory can also be set with the 'GISCO_GEODATA_CACHE_DIR'
+    environment variable.
+
+    Args:
+        directory: The cache directory. None disables the disk cache.
+        max_size: The maximum size of the cache in bytes, after which the
+            least recently used files are evicted. None means unbounded.
+        revalidate: Whether to check with the server (conditional GET)
+            that the cached files are still up to date before using them.
+    """
+    import gisco_geodata.parser
+    from gisco_geodata.caching import DiskCache
+
+    if directory is None:
+        gisco_geodata.parser.DISK_CACHE = None
+    else:
+        gisco_geodata.parser.DISK_CACHE = DiskCache(
+            directory, max_size=max_size, revalidate=revalidate
+        )
+
+
+def set_memory_cache(
+    max_size: Optional[int] = DEFAULT_MEMORY_MAX_SIZE,
+    ttl: Optional[float] = None,
+):
+    """Configures the in-memory cache of the downloaded files.
+
+    The existing entries are dropped.
+
+    Args:
+        max_size: The maximum size of the cache in bytes, measured as the
+            size of the downloaded files and as an estimate of the memory
+            taken by the parsed JSON (see caching.json_size). None means
+            unbounded.
+        ttl: The number of seconds after which an entry expires.
+            None means the entries never expire.
+    """
+    import gisco_geodata.parser
+    from gisco_geodata.caching import MemoryCache
+
+    gisco_geodata.parser.MEMORY_CACHE = MemoryCache(max_size=max_size, ttl=ttl)
+
+
+def clear_cache(disk: bool = False):
+    """Clears the in-memory caches.
+
+    Args:
+        disk: Whether to also clear the disk cache, if one is set.
+    """
+    import gisco_geodata.parser
+    import gisco_geodata.theme
+
+    gisco_geodata.parser.MEMORY_CACHE.clear()
+    gisco_geodata.parser._METADATA.clear()
+    gisco_geodata.parser.get_property.cache_clear()
+    gisco_geodata.theme._dataset_key.cache_clear()
+    gisco_geodata.theme._FILE_INDEXES.clear()
+    if disk and gisco_geodata.parser.DISK_CACHE is not None:
+        gisco_geodata.parser.DISK_CACHE.clear()
+
+
+def cache_info() -> CacheInfo:
+    """Statistics of the in-memory cache of the downloaded files."""
+    import gisco_geodata.parser
+
+    return gisco_geodata.parser.MEMORY_CACHE.info()
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from typing import Optional
+
+from .mirror import DEFAULT_CONCURRENCY, mirror
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m gisco_geodata')
+    commands = parser.add_subparsers(dest='command', required=True)
+    sync = commands.add_parser(
+        'sync',
+        help='Mirror a subset of the GISCO distribution API to a directory.',
+        description=(
+            'Mirror a subset of the GISCO distribution API to a directory, '
+            'which can then be used with set_mirror or GISCO_GEODATA_MIRROR.'
+        ),
+    )
+    sync.add_argument('out_dir', help='The directory of the mirror.')
+    sync.add_argument(
+        '--theme', action='append', dest='themes', help='e.g. nuts'
+    )
+    sync.add_argument('--year', action='append', dest='years', help='e.g. 2021')
+    sync.add_argument(
+        '--scale', action='append', dest='scales', help='e.g. 01M'
+    )
+    sync.add_argument(
+        '--format', action='append', dest='formats', help='e.g. geojson'
+    )
+    sync.add_argument(
+        '--units',
+        action='store_true',
+        help='Also mirror the files of every unit, used by get().',
+    )
+    sync.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    sync.add_argument(
+        '--parts',
+        type=int,
+        default=1,
+        help='The number of concurrent range requests per file.',
+    )
+    sync.add_argument(
+        '--verify',
+        action='store_true',
+        help='Compare the SHA-256 digest of the present files.',
+    )
+    sync.add_argument('--quiet', action='store_true')
+    return parser
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = _parser().parse_args(argv)
+    report = mirror(
+        args.out_dir,
+        themes=args.themes,
+        years=args.years,
+        scales=args.scales,
+        formats=args.formats,
+        units=args.units,
+        concurrency=args.concurrency,
+        verify=args.verify,
+        parts=args.parts,
+        progress=None if args.quiet else print,
+    )
+    for path, error in report.failed.items():
+        print(f'{path}: {error}', file=sys.stderr)
+    print(report)
+    return 1 if report.failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,384 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Hashable, Mapping
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+from .typing import FilePath
+
+# 5 GiB, enough to hold a few years of the 01M scale files.
+DEFAULT_MAX_SIZE = 5 * 1024**3
+DEFAULT_MEMORY_MAX_SIZE = 512 * 1024**2
+# The approximate memory taken by the objects parsed from a JSON document,
+# in bytes, beyond the length of the document: a float and a list slot
+# per separated value, a list per bracket, a dict per brace and a str
+# object per string.
+_JSON_VALUE_SIZE = 24
+_JSON_LIST_SIZE = 64
+_JSON_DICT_SIZE = 200
+_JSON_QUOTE_SIZE = 16
+
+
+@dataclass
+class CacheEntry:
+    """A cached response, indexed by the URL it was downloaded from."""
+
+    url: str
+    digest: str
+    size: int
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    @property
+    def validators(self) -> dict[str, str]:
+        """The headers used to revalidate the entry with a conditional GET."""
+        headers = {}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def write_atomic(path: Path, data: bytes):
+    """Writes 'data' to a temporary file renamed to 'path'.
+
+    Readers of 'path' see either the previous or the whole new content.
+    """
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def json_size(content: bytes) -> int:
+    """An estimate of the memory taken by the parsed 'content', in bytes.
+
+    The objects take several times the size of the document (about 6
+    times for GeoJSON), which is estimated from the number of values,
+    lists, dicts and strings without walking the parsed objects.
+    """
+    return (
+        len(content)
+        + _JSON_VALUE_SIZE * content.count(b',')
+        + _JSON_LIST_SIZE * content.count(b'[')
+        + _JSON_DICT_SIZE * content.count(b'{')
+        + _JSON_QUOTE_SIZE * content.count(b'"')
+    )
+
+
+class DiskCache:
+    """A content-addressed HTTP cache stored on the local disk.
+
+    The bodies are stored under 'objects/' by their SHA-256 digest and
+    the 'index/' directory maps every URL to its body and validators
+    (ETag, Last-Modified). 'refs/' lists the index entries of every body,
+    so that they are removed along with it. The least recently used
+    bodies are evicted once 'max_size' is exceeded, down to
+    'EVICTION_TARGET' of it.
+
+    The size is kept up to date as the bodies are stored and measured
+    from the directory once it reaches 'max_size', or every
+    'RESCAN_INTERVAL' bodies. The directory can thus be shared by several
+    processes: the bodies stored by the other processes are accounted
+    for at the next measure.
+
+    Args:
+        directory: Where to store the cache.
+        max_size: The maximum size of the bodies, in bytes.
+            None means the cache is unbounded.
+        revalidate: Whether to revalidate the entries with a conditional
+            GET before using them. If False, the cached bodies are used
+            without contacting the server.
+    """
+
+    # The number of bodies stored between two measures of the directory.
+    RESCAN_INTERVAL = 256
+    # The fraction of 'max_size' kept by an eviction, so that the
+    # directory is not measured again on every stored body.
+    EVICTION_TARGET = 0.9
+
+    def __init__(
+        self,
+        directory: FilePath,
+        max_size: Optional[int] = DEFAULT_MAX_SIZE,
+        revalidate: bool = True,
+    ):
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.revalidate = revalidate
+        self.index_dir = self.directory / 'index'
+        self.objects_dir = self.directory / 'objects'
+        self.refs_dir = self.directory / 'refs'
+        for path in (self.index_dir, self.objects_dir, self.refs_dir):
+            path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # The estimated size of the bodies and the number of bodies stored
+        # since it was last measured; None until the first measure.
+        self._size: Optional[int] = None
+        self._stored = 0
+
+    def _index_path(self, url: str) -> Path:
+        return self.index_dir / f'{_sha256(url.encode())}.json'
+
+    def _object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest
+
+    def _refs_path(self, digest: str) -> Path:
+        return self.refs_dir / digest
+
+    @property
+    def size(self) -> int:
+        """The total size of the stored bodies, in bytes."""
+        return sum(stat.st_size for _, stat in self._stat_objects())
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        try:
+            with open(self._index_path(url), encoding='utf-8') as f:
+                return CacheEntry(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def read(self, entry: CacheEntry) -> Optional[bytes]:
+        """Reads the body of an entry.
+
+        Returns None if the body was evicted in the meantime.
+        """
+        path = self._object_path(entry.digest)
+        try:
+            content = path.read_bytes()
+            # The modification time is used to track the recent usage.
+            os.utime(path)
+        except OSError:
+            self._index_path(entry.url).unlink(missing_ok=True)
+            return None
+        return content
+
+    def put(
+        self, url: str, content: bytes, headers: Mapping[str, str]
+    ) -> CacheEntry:
+        """Stores a response body along with its validators."""
+        entry = CacheEntry(
+            url=url,
+            digest=_sha256(content),
+            size=len(content),
+            etag=headers.get('etag'),
+            last_modified=headers.get('last-modified'),
+        )
+        path = self._object_path(entry.digest)
+        if path.exists():
+            os.utime(path)
+        else:
+            write_atomic(path, content)
+            with self._lock:
+                if self._size is not None:
+                    self._size += entry.size
+                self._stored += 1
+        index_path = self._index_path(url)
+        write_atomic(index_path, json.dumps(asdict(entry)).encode())
+        self._add_ref(entry.digest, index_path.name)
+        self.evict()
+        return entry
+
+    def _add_ref(self, digest: str, name: str):
+        path = self._refs_path(digest)
+        try:
+            refs = path.read_text(encoding='utf-8').split()
+        except OSError:
+            refs = []
+        if name not in refs:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(f'{name}\n')
+
+    def _stat_objects(self) -> list[tuple[Path, os.stat_result]]:
+        stats = []
+        for path in self.objects_dir.iterdir():
+            if path.name.startswith('.tmp-'):
+                # Being written by write_atomic.
+                continue
+            try:
+                stats.append((path, path.stat()))
+            except OSError:
+                continue
+        return stats
+
+    def evict(self):
+        """Removes the least recently used bodies above 'max_size'.
+
+        The directory is only measured when the estimated size exceeds
+        'max_size', or every 'RESCAN_INTERVAL' stored bodies.
+        """
+        if self.max_size is None:
+            return
+        with self._lock:
+            if (
+                self._size is not None
+                and self._size <= self.max_size
+                and self._stored < self.RESCAN_INTERVAL
+            ):
+                return
+            stats = self._stat_objects()
+            total = sum(stat.st_size for _, stat in stats)
+            self._stored = 0
+            if total > self.max_size:
+                target = int(self.max_size * self.EVICTION_TARGET)
+                stats.sort(key=lambda item: item[1].st_mtime)
+                evicted = []
+                for path, stat in stats:
+                    if total <= target:
+                        break
+                    path.unlink(missing_ok=True)
+                    evicted.append(path.name)
+                    total -= stat.st_size
+                self._remove_index_entries(evicted)
+            self._size = total
+
+    def _remove_index_entries(self, digests: list[str]):
+        """Removes the index entries of the given bodies.
+
+        An index entry is kept if it was updated to another body since.
+        """
+        for digest in digests:
+            refs_path = self._refs_path(digest)
+            try:
+                names = refs_path.read_text(encoding='utf-8').split()
+            except OSError:
+                continue
+            for name in names:
+                path = self.index_dir / name
+                try:
+                    with open(path, encoding='utf-8') as f:
+                        current = json.load(f).get('digest')
+                except (OSError, ValueError, AttributeError):
+                    continue
+                if current == digest:
+                    path.unlink(missing_ok=True)
+            refs_path.unlink(missing_ok=True)
+
+    def clear(self):
+        """Removes every entry of the cache."""
+        with self._lock:
+            for directory in (self.index_dir, self.objects_dir, self.refs_dir):
+                shutil.rmtree(directory, ignore_errors=True)
+                directory.mkdir(parents=True, exist_ok=True)
+            self._size = 0
+            self._stored = 0
+
+
+@dataclass
+class CacheInfo:
+    """Statistics of a MemoryCache."""
+
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    size: int
+    max_size: Optional[int]
+    ttl: Optional[float]
+
+
+class MemoryCache:
+    """A thread-safe LRU cache bounded by the total size of its values.
+
+    The size of each value is given when it is stored. For the parser
+    functions, this is the size of the downloaded response for the bytes
+    and the estimate of json_size for the parsed JSON, so that the bound
+    applies to the memory actually taken.
+
+    Args:
+        max_size: The maximum total size of the values, in bytes.
+            None means the cache is unbounded.
+        ttl: The number of seconds after which an entry expires.
+            None means the entries never expire.
+    """
+
+    def __init__(
+        self,
+        max_size: Optional[int] = DEFAULT_MEMORY_MAX_SIZE,
+        ttl: Optional[float] = None,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        # key -> (value, size, expiration time)
+        self._entries: OrderedDict[Hashable, tuple[Any, int, float]] = (
+            OrderedDict()
+        )
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and item[2] < time.monotonic():
+                self._remove(key)
+                item = None
+            if item is None:
+                self._misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return item[0]
+
+    def set(self, key: Hashable, value: Any, size: int):
+        """Stores a value, evicting the least recently used ones if needed.
+
+        Values larger than 'max_size' are not stored.
+        """
+        if self.max_size is not None and size > self.max_size:
+            return
+        expires = (
+            time.monotonic() + self.ttl if self.ttl is not None else math.inf
+        )
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires)
+            self._size += size
+            while self.max_size is not None and self._size > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def _remove(self, key: Hashable):
+        _, size, _ = self._entries.pop(key)
+        self._size -= size
+
+    def clear(self):
+        """Removes every entry and resets the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self._hits = self._misses = self._evictions = 0
+
+    def info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                entries=len(self._entries),
+                size=self._size,
+                max_size=self.max_size,
+                ttl=self.ttl,
+            )
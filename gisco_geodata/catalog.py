@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import asyncio
+import csv
+import re
+from collections.abc import Collection, Iterable, Iterator, Sequence
+from dataclasses import asdict, dataclass, fields, replace
+from typing import TYPE_CHECKING, Any, Optional
+
+import httpx
+
+from .parser import aget_themes, get_file_size
+from .theme import Property, ThemeParser
+from .typing import FilePath
+from .utils import pandas_is_available, run_async
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+SPATIAL_TYPES = ('AT', 'BN', 'LB', 'PT', 'RG')
+PROJECTIONS = ('3035', '3857', '4326')
+_SCALE = re.compile(r'^(\d{2}M|100K)$')
+_YEAR = re.compile(r'^\d{4}$')
+
+
+@dataclass(frozen=True)
+class FileRecord:
+    """A file of a GISCO dataset, with the components of its name.
+
+    For example, 'NUTS_RG_01M_2021_4326_LEVL_3.shp.zip' has the code 'NUTS',
+    the spatial type 'RG', the scale '01M', the projection '4326',
+    the level 'LEVL_3' and the extension 'shp.zip'.
+    """
+
+    theme: str
+    year: str
+    file_format: str
+    file_name: str
+    code: str
+    spatial_type: Optional[str] = None
+    scale: Optional[str] = None
+    projection: Optional[str] = None
+    level: Optional[str] = None
+    extension: str = ''
+    size: Optional[int] = None
+
+    @classmethod
+    def from_file_name(
+        cls, theme: str, year: str, file_format: str, file_name: str
+    ) -> FileRecord:
+        stem, _, extension = file_name.partition('.')
+        code, *tokens = stem.split('_')
+        components: dict[str, Any] = {}
+        if tokens and tokens[0] in SPATIAL_TYPES:
+            components['spatial_type'] = tokens.pop(0)
+        if tokens and _SCALE.match(tokens[0]):
+            components['scale'] = tokens.pop(0)
+        # The year of the file name is the year of the dataset.
+        if tokens and _YEAR.match(tokens[0]):
+            tokens.pop(0)
+        if tokens and tokens[0] in PROJECTIONS:
+            components['projection'] = tokens.pop(0)
+        if tokens:
+            components['level'] = '_'.join(tokens)
+        return cls(
+            theme=theme,
+            year=year,
+            file_format=file_format,
+            file_name=file_name,
+            code=code,
+            extension=extension,
+            **components,
+        )
+
+
+class Catalog:
+    """A queryable collection of FileRecord objects."""
+
+    def __init__(self, records: Iterable[FileRecord]):
+        self.records = list(records)
+
+    def __iter__(self) -> Iterator[FileRecord]:
+        return iter(self.records)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __repr__(self) -> str:
+        return f'Catalog({len(self)} files)'
+
+    def filter(self, **criteria: Optional[str | Collection[str]]) -> Catalog:
+        """Keeps the records matching every criterion.
+
+        Each keyword is a FileRecord field, and the value is either
+        a value or a collection of accepted values. None values are ignored.
+
+        Example:
+            catalog.filter(theme='nuts', scale=['01M', '20M'], level='LEVL_3')
+        """
+        names = {field.name for field in fields(FileRecord)}
+        unknown = set(criteria) - names
+        if unknown:
+            raise ValueError(f'Unknown fields {unknown}, allowed are {names}.')
+        accepted = {
+            name: {value} if isinstance(value, (str, int)) else set(value)
+            for name, value in criteria.items()
+            if value is not None
+        }
+        return Catalog(
+            record
+            for record in self.records
+            if all(
+                getattr(record, name) in values
+                for name, values in accepted.items()
+            )
+        )
+
+    def to_dicts(self) -> list[dict[str, Any]]:
+        return [asdict(record) for record in self.records]
+
+    def to_frame(self) -> pd.DataFrame:
+        assert pandas_is_available()
+
+        import pandas as pd
+
+        return pd.DataFrame(
+            self.to_dicts(),
+            columns=[field.name for field in fields(FileRecord)],
+        )
+
+    def to_csv(self, out_file: FilePath):
+        with open(out_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(
+                f, fieldnames=[field.name for field in fields(FileRecord)]
+            )
+            writer.writeheader()
+            writer.writerows(self.to_dicts())
+
+
+async def _get_size(record: FileRecord) -> FileRecord:
+    try:
+        size = await get_file_size(
+            record.theme, record.file_format, record.file_name
+        )
+    except (httpx.HTTPStatusError, FileNotFoundError):
+        # A file listed but not served, its size stays unknown.
+        size = None
+    return replace(record, size=size)
+
+
+async def aget_catalog(
+    themes: Optional[Sequence[str]] = None,
+    years: Optional[Sequence[str]] = None,
+    sizes: bool = False,
+) -> Catalog:
+    """Lists the files of the datasets as a Catalog.
+
+    Args:
+        themes: The themes to list (e.g. 'nuts'). Defaults to all of them.
+        years: The years to list. Defaults to all of them.
+        sizes: Whether to request the size of every file (one HEAD request
+            per file), otherwise the sizes are None.
+    """
+    if themes is None:
+        themes = list((await aget_themes()).keys())
+    datasets = [
+        dataset
+        for theme in themes
+        for dataset in await ThemeParser(theme).aget_datasets()
+        if years is None or dataset.year in years
+    ]
+    datasets = [
+        dataset
+        for dataset in datasets
+        if (await dataset.aget_properties()).get(Property.FILES.value)
+        is not None
+    ]
+    files = await asyncio.gather(*(dataset.get_files() for dataset in datasets))
+    records = [
+        FileRecord.from_file_name(
+            dataset.theme_parser.name, dataset.year, file_format, file_name
+        )
+        for dataset, files_ in zip(datasets, files)
+        for file_format, file_names in files_.items()
+        for file_name in file_names
+    ]
+    if sizes:
+        records = list(
+            await asyncio.gather(*(_get_size(record) for record in records))
+        )
+    return Catalog(records)
+
+
+def get_catalog(
+    themes: Optional[Sequence[str]] = None,
+    years: Optional[Sequence[str]] = None,
+    sizes: bool = False,
+) -> Catalog:
+    """Lists the files of the datasets as a Catalog, see aget_catalog."""
+    return run_async(aget_catalog(themes, years, sizes))
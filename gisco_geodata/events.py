@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import functools
+import threading
+import time
+import warnings
+from collections import Counter
+from collections.abc import Callable, Coroutine, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Literal, Optional, TypeVar, Union
+
+T = TypeVar('T')
+
+# Where the content of a request came from. 'coalesced' requests waited
+# for an identical request, 'revalidated' ones got a 304 for the disk cache.
+Source = Literal['network', 'revalidated', 'disk', 'memory', 'coalesced']
+CACHE_SOURCES = frozenset({'revalidated', 'disk', 'memory', 'coalesced'})
+
+
+@dataclass
+class RequestEvent:
+    """A request of the parser, to the server or served by a cache.
+
+    The requests to a local mirror are not reported.
+
+    Args:
+        url: The URL, or the path in the distribution tree for the
+            'memory' and 'coalesced' requests.
+        method: The HTTP method.
+        source: Where the content came from.
+        status_code: The status of the response, None if there was none
+            or if it was the 416 confirming that a resumed download was
+            already complete.
+        bytes: The number of bytes received from the server.
+        latency: The time from sending the request until its body was
+            read, in seconds.
+        wait: The time spent waiting for the rate and concurrency limits
+            before sending the request, in seconds.
+        attempt: 0 for the first attempt, n for the retry number n.
+        error: The exception raised by the request, if any.
+    """
+
+    url: str
+    method: str = 'GET'
+    source: Source = 'network'
+    status_code: Optional[int] = None
+    bytes: int = 0
+    latency: float = 0.0
+    wait: float = 0.0
+    attempt: int = 0
+    error: Optional[str] = None
+
+    @property
+    def cache_hit(self) -> bool:
+        return self.source in CACHE_SOURCES
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None or (
+            self.status_code is not None and self.status_code >= 400
+        )
+
+
+@dataclass
+class RequestStats:
+    """The aggregated RequestEvent objects of a call or a block of code."""
+
+    requests: int = 0
+    cache_hits: int = 0
+    # The requests sent to the server, retries included.
+    cache_misses: int = 0
+    retries: int = 0
+    errors: int = 0
+    bytes: int = 0
+    # The sums of the latencies and waits, in seconds.
+    latency: float = 0.0
+    wait: float = 0.0
+    # The wall time of the call or block, in seconds.
+    duration: float = 0.0
+    status_codes: Counter[int] = field(default_factory=Counter)
+    latencies: list[float] = field(default_factory=list, repr=False)
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+
+    def add(self, event: RequestEvent):
+        with self._lock:
+            self.requests += 1
+            if event.cache_hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+            if event.attempt:
+                self.retries += 1
+            if event.failed:
+                self.errors += 1
+            if event.status_code is not None:
+                self.status_codes[event.status_code] += 1
+            self.bytes += event.bytes
+            self.latency += event.latency
+            self.wait += event.wait
+            if event.source != 'memory' and event.source != 'coalesced':
+                self.latencies.append(event.latency)
+
+    @property
+    def hit_ratio(self) -> float:
+        return self.cache_hits / self.requests if self.requests else 0.0
+
+    def percentile(self, q: float) -> Optional[float]:
+        """The latency percentile 'q' (0 to 100), None without requests.
+
+        The requests served by the memory cache or by another request
+        are left out.
+        """
+        with self._lock:
+            latencies = sorted(self.latencies)
+        if not latencies:
+            return None
+        position = q / 100 * (len(latencies) - 1)
+        low = int(position)
+        high = min(low + 1, len(latencies) - 1)
+        return latencies[low] + (latencies[high] - latencies[low]) * (
+            position - low
+        )
+
+
+@dataclass
+class CallEvent:
+    """A get(), aget(), download() or adownload() call which finished.
+
+    Args:
+        name: The coroutine which was called, e.g. 'NUTS.aget' (which
+            is also what NUTS.get runs).
+        stats: The requests of the call.
+        error: The exception raised by the call, if any.
+    """
+
+    name: str
+    stats: RequestStats
+    error: Optional[str] = None
+
+
+Event = Union[RequestEvent, CallEvent]
+Listener = Callable[[Event], Any]
+
+# Replaced rather than mutated, so that emit can iterate without a lock.
+_LISTENERS: tuple[Listener, ...] = ()
+_LISTENERS_LOCK = threading.Lock()
+# The RequestStats collecting the requests of the current context.
+_COLLECTORS: ContextVar[tuple[RequestStats, ...]] = ContextVar(
+    'gisco_geodata_collectors', default=()
+)
+# The attempt number of the call being retried, set by the retry decorators.
+ATTEMPT: ContextVar[int] = ContextVar('gisco_geodata_attempt', default=0)
+
+
+def add_listener(listener: Listener):
+    """Calls 'listener' with every RequestEvent and CallEvent.
+
+    The listener is called from the thread which made the request,
+    usually the thread of the background event loop, so it should be
+    fast and thread-safe. Its exceptions are turned into warnings.
+    """
+    global _LISTENERS
+    with _LISTENERS_LOCK:
+        _LISTENERS = (*_LISTENERS, listener)
+
+
+def remove_listener(listener: Listener):
+    global _LISTENERS
+    with _LISTENERS_LOCK:
+        _LISTENERS = tuple(item for item in _LISTENERS if item != listener)
+
+
+def enabled() -> bool:
+    """Whether an event would be used by a listener or a collector."""
+    return bool(_LISTENERS) or bool(_COLLECTORS.get())
+
+
+def emit(event: Event):
+    if isinstance(event, RequestEvent):
+        for stats in _COLLECTORS.get():
+            stats.add(event)
+    for listener in _LISTENERS:
+        try:
+            listener(event)
+        except Exception as e:
+            warnings.warn(
+                f'The event listener {listener!r} raised {e!r}.',
+                RuntimeWarning,
+                stacklevel=2,
+            )
+
+
+@contextmanager
+def collect_stats() -> Iterator[RequestStats]:
+    """Aggregates the requests made in the block.
+
+    The requests of the tasks started in the block are included, as well
+    as the ones of the synchronous methods (e.g. NUTS.get), which run on
+    the background event loop. Blocks can be nested.
+
+    Example:
+        with collect_stats() as stats:
+            NUTS().get(nuts_level='LEVL_3')
+        print(stats.requests, stats.cache_hits, stats.percentile(90))
+    """
+    stats = RequestStats()
+    token = _COLLECTORS.set((*_COLLECTORS.get(), stats))
+    start = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        stats.duration = time.perf_counter() - start
+        _COLLECTORS.reset(token)
+
+
+def bind_context(coro: Coroutine[Any, Any, T]) -> Coroutine[Any, Any, T]:
+    """Makes a coroutine report to the collectors of the current context.
+
+    Used to run the coroutine on another thread, which does not inherit
+    the context.
+    """
+    collectors = _COLLECTORS.get()
+    if not collectors:
+        return coro
+
+    async def run() -> T:
+        _COLLECTORS.set(collectors)
+        return await coro
+
+    return run()
+
+
+def instrumented(
+    func: Callable[..., Coroutine[Any, Any, T]],
+) -> Callable[..., Coroutine[Any, Any, T]]:
+    """Emits a CallEvent when the decorated method returns or raises."""
+
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs) -> T:
+        if not _LISTENERS:
+            return await func(self, *args, **kwargs)
+        error = None
+        stats = RequestStats()
+        try:
+            with collect_stats() as stats:
+                return await func(self, *args, **kwargs)
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            emit(
+                CallEvent(
+                    f'{type(self).__name__}.{func.__name__}', stats, error
+                )
+            )
+
+    return wrapper
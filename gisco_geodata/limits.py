@@ -0,0 +1,375 @@
+from __future__ import annotations
+
+import asyncio
+import struct
+import threading
+import time
+import weakref
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Optional, Type
+
+import httpx
+
+from .typing import FilePath
+
+DEFAULT_MAX_CONCURRENCY = 50
+# The responses telling that the server is overloaded or rate limiting.
+THROTTLE_STATUS_CODES = frozenset({429, 503})
+# The tokens and the time they were counted, in the file of a TokenBucket.
+_BUCKET = struct.Struct('dd')
+
+
+@dataclass
+class HostState:
+    """The concurrency limit of a host and the measures it is based on."""
+
+    limit: float
+    max_limit: int
+    in_flight: int = 0
+    # Exponentially weighted moving average of the latency, in seconds.
+    latency: Optional[float] = None
+    # The lowest latency observed recently, in seconds.
+    base_latency: Optional[float] = None
+    last_decrease: float = float('-inf')
+    decreases: int = 0
+    waiters: deque[asyncio.Future[None]] = field(default_factory=deque)
+
+
+class Slot:
+    """A request holding a slot of AdaptiveLimiter.
+
+    The latency is measured from the moment the slot is acquired until
+    'response' is called, or until the slot is released.
+    """
+
+    def __init__(
+        self, limiter: AdaptiveLimiter, host: str, partition: Any = None
+    ):
+        self.limiter = limiter
+        self.host = host
+        self.partition = partition
+        self.status_code: Optional[int] = None
+        self.latency: Optional[float] = None
+        self._start = 0.0
+
+    def response(self, status_code: int):
+        """Records the response, before its body is read."""
+        self.status_code = status_code
+        self.latency = time.monotonic() - self._start
+
+    async def __aenter__(self) -> Slot:
+        await self.limiter.acquire(self.host, self.partition)
+        self._start = time.monotonic()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ):
+        if self.latency is None:
+            self.latency = time.monotonic() - self._start
+        throttled = self.status_code in THROTTLE_STATUS_CODES or isinstance(
+            exc, httpx.TimeoutException
+        )
+        self.limiter.release(
+            self.host,
+            latency=None if exc is not None else self.latency,
+            throttled=throttled,
+            partition=self.partition,
+        )
+
+
+class AdaptiveLimiter:
+    """Limits the number of concurrent requests per host, for the process.
+
+    The limit of each host is adjusted with AIMD (additive increase,
+    multiplicative decrease): it is multiplied by 'decrease' when the
+    server throttles (429 or 503, timeouts) or when the latency grows
+    above 'latency_factor' times its recent minimum, at most once per
+    round trip, and grows back by about 'increase' per round trip
+    otherwise, up to the maximum of the host.
+
+    The limiter can be shared by the event loops of several threads.
+    The requests of a partition (e.g. an event loop which others may be
+    blocked on) have their own limits, so they never wait for the slots
+    held by the other requests. A new partition starts from the current
+    limit of the host, and is dropped when the object is.
+
+    Args:
+        max_concurrency: The maximum number of concurrent requests
+            of a host, unless the host has its own maximum.
+        min_concurrency: The lowest limit reached by the decreases.
+        increase: How much the limit grows per round trip.
+        decrease: The factor applied to the limit on congestion.
+        latency_factor: How much the latency has to grow to be treated
+            as congestion. None disables the latency signal.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        min_concurrency: int = 1,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        latency_factor: Optional[float] = 3.0,
+    ):
+        self._max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.host_limits: dict[str, int] = {}
+        self._hosts: dict[str, HostState] = {}
+        self._partitions: weakref.WeakKeyDictionary[
+            Any, dict[str, HostState]
+        ] = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    @property
+    def max_concurrency(self) -> int:
+        return self._max_concurrency
+
+    @max_concurrency.setter
+    def max_concurrency(self, value: int):
+        with self._lock:
+            self._max_concurrency = value
+            for host, state in self._all_states():
+                if host not in self.host_limits:
+                    self._set_max(state, value)
+
+    def set_host_limit(self, host: str, value: Optional[int]):
+        """Sets the maximum concurrency of a host.
+
+        None restores 'max_concurrency' for the host.
+        """
+        with self._lock:
+            if value is None:
+                self.host_limits.pop(host, None)
+            else:
+                self.host_limits[host] = value
+            for host_, state in self._all_states():
+                if host_ == host:
+                    self._set_max(
+                        state, self._max_concurrency if value is None else value
+                    )
+
+    def _set_max(self, state: HostState, value: int):
+        state.max_limit = value
+        state.limit = value
+        self._wake(state)
+
+    def _all_states(self) -> list[tuple[str, HostState]]:
+        states = list(self._hosts.items())
+        for hosts in self._partitions.values():
+            states.extend(hosts.items())
+        return states
+
+    def _state(self, host: str, partition: Any = None) -> HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            max_limit = self.host_limits.get(host, self._max_concurrency)
+            state = self._hosts[host] = HostState(
+                limit=max_limit, max_limit=max_limit
+            )
+        if partition is None:
+            return state
+        hosts = self._partitions.setdefault(partition, {})
+        if host not in hosts:
+            hosts[host] = HostState(
+                limit=state.limit, max_limit=state.max_limit
+            )
+        return hosts[host]
+
+    def state(self, host: str, partition: Any = None) -> HostState:
+        """The current state of a host."""
+        with self._lock:
+            return self._state(host, partition)
+
+    def slot(self, host: str, partition: Any = None) -> Slot:
+        """An async context manager holding a slot of the host."""
+        return Slot(self, host, partition)
+
+    async def acquire(self, host: str, partition: Any = None):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            state = self._state(host, partition)
+            if not state.waiters and state.in_flight < int(state.limit):
+                state.in_flight += 1
+                return
+            future: asyncio.Future[None] = loop.create_future()
+            state.waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if future in state.waiters:
+                    state.waiters.remove(future)
+                    return_slot = False
+                else:
+                    # The slot was granted, unless _grant sees the
+                    # cancellation and releases it itself.
+                    return_slot = not future.cancelled()
+            if return_slot:
+                self.release(host, partition=partition)
+            raise
+
+    def release(
+        self,
+        host: str,
+        latency: Optional[float] = None,
+        throttled: bool = False,
+        partition: Any = None,
+    ):
+        """Releases a slot and adapts the limit of the host.
+
+        Args:
+            latency: The latency of the request, None if unknown.
+            throttled: Whether the server throttled the request.
+            partition: The partition the slot was acquired in.
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._state(host, partition)
+            state.in_flight -= 1
+            congested = throttled
+            if latency is not None:
+                state.latency = (
+                    latency
+                    if state.latency is None
+                    else 0.8 * state.latency + 0.2 * latency
+                )
+                if state.base_latency is None or latency < state.base_latency:
+                    state.base_latency = latency
+                else:
+                    # Slowly forgets an old minimum.
+                    state.base_latency += 0.01 * (
+                        state.latency - state.base_latency
+                    )
+                congested = congested or (
+                    self.latency_factor is not None
+                    and state.latency > self.latency_factor * state.base_latency
+                )
+            if congested:
+                # At most one decrease per round trip, the responses of
+                # the requests sent before the decrease being outdated.
+                if now - state.last_decrease > (state.latency or 0.0):
+                    state.limit = max(
+                        self.min_concurrency, state.limit * self.decrease
+                    )
+                    state.last_decrease = now
+                    state.decreases += 1
+            elif latency is not None:
+                state.limit = min(
+                    state.max_limit,
+                    state.limit + self.increase / max(state.limit, 1.0),
+                )
+            self._wake(state)
+
+    def _wake(self, state: HostState):
+        while state.waiters and state.in_flight < int(state.limit):
+            future = state.waiters.popleft()
+            state.in_flight += 1
+            future.get_loop().call_soon_threadsafe(self._grant, future, state)
+
+    def _grant(self, future: asyncio.Future[None], state: HostState):
+        if future.cancelled():
+            with self._lock:
+                state.in_flight -= 1
+                self._wake(state)
+        else:
+            future.set_result(None)
+
+
+class TokenBucket:
+    """Paces the requests to at most 'rate' per second, with bursts.
+
+    The tokens are reserved in the order of the calls, so the requests
+    keep their order and nobody polls. With 'lock_file', the bucket
+    is stored in that file and shared by every process using it,
+    which requires fcntl (not available on Windows).
+
+    Args:
+        rate: The number of requests per second.
+        burst: The number of requests which can be sent at once after
+            an idle period. Defaults to one second of requests.
+        lock_file: The file holding the bucket shared between processes.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        lock_file: Optional[FilePath] = None,
+    ):
+        if rate <= 0:
+            raise ValueError(f'The rate must be positive, got {rate}.')
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.lock_file = Path(lock_file) if lock_file is not None else None
+        if self.lock_file is not None:
+            import fcntl  # noqa: F401
+
+        self._tokens = self.burst
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def _take(
+        self, tokens: float, updated: float, now: float
+    ) -> tuple[float, float]:
+        """Takes a token, returning the new amount and the time to wait."""
+        tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate)
+        tokens -= 1
+        return (tokens, 0.0 if tokens >= 0 else -tokens / self.rate)
+
+    def reserve(self) -> float:
+        """Takes a token and returns the number of seconds to wait for it."""
+        with self._lock:
+            if self.lock_file is None:
+                now = time.time()
+                self._tokens, delay = self._take(
+                    self._tokens, self._updated, now
+                )
+                self._updated = now
+                return delay
+            return self._reserve_shared(self.lock_file)
+
+    def _reserve_shared(self, lock_file: Path) -> float:
+        import fcntl
+
+        with open(lock_file, 'a+b') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                data = f.read(_BUCKET.size)
+                now = time.time()
+                if len(data) == _BUCKET.size:
+                    tokens, updated = _BUCKET.unpack(data)
+                else:
+                    tokens, updated = self.burst, now
+                tokens, delay = self._take(tokens, updated, now)
+                f.seek(0)
+                f.truncate()
+                f.write(_BUCKET.pack(tokens, now))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return delay
+
+    async def acquire(self):
+        if self.lock_file is None:
+            delay = self.reserve()
+        else:
+            # Waiting for the lock of another process would block the loop.
+            delay = await asyncio.to_thread(self.reserve)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def acquire_sync(self):
+        delay = self.reserve()
+        if delay:
+            time.sleep(delay)
@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import re
+import time
+from collections.abc import Callable, Collection, Sequence
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+from .caching import write_atomic
+from .catalog import FileRecord
+from .parser import (
+    DATASET_PATH,
+    PARAMS_PATH,
+    THEMES_PATH,
+    download_file,
+    get_file_size,
+)
+from .theme import Property
+from .typing import FilePath
+from .utils import json_loads, run_async
+
+# Stores the size and SHA-256 digest of the downloaded files.
+MANIFEST = 'manifest.json'
+DEFAULT_CONCURRENCY = 8
+_UNIT_SCALE = re.compile(r'-(\d{2}M|100K)-', re.IGNORECASE)
+
+
+@dataclass
+class MirrorReport:
+    """The outcome of a mirror, with the download throughput."""
+
+    downloaded: int = 0
+    skipped: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+    failed: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def throughput(self) -> float:
+        """The downloaded bytes per second."""
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f'{self.downloaded} downloaded ({self.bytes / 1024**2:.1f} MiB '
+            f'in {self.seconds:.1f}s, {self.throughput / 1024**2:.1f} MiB/s), '
+            f'{self.skipped} skipped, {len(self.failed)} failed'
+        )
+
+
+def _sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024**2), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load_json(path: Path) -> dict[str, Any]:
+    """The content of a JSON file of the mirror, empty if it is missing."""
+    try:
+        return json.loads(path.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
+
+def _write(path: Path, content: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_atomic(path, content)
+
+
+def _selected_files(
+    theme: str,
+    year: str,
+    files: dict[str, list[str]],
+    scales: Optional[Collection[str]],
+    formats: Optional[Collection[str]],
+) -> list[tuple[str, str]]:
+    """The (file format, file name) pairs to mirror.
+
+    The files without a scale (e.g. the labels) are kept whatever
+    the scales.
+    """
+    selected = []
+    for file_format, file_names in files.items():
+        if formats is not None and file_format not in formats:
+            continue
+        for file_name in file_names:
+            record = FileRecord.from_file_name(
+                theme, year, file_format, file_name
+            )
+            if scales is None or record.scale in (None, *scales):
+                selected.append((file_format, file_name))
+    return selected
+
+
+def _selected_unit_files(
+    units: dict[str, list[str]],
+    scales: Optional[Collection[str]],
+    formats: Optional[Collection[str]],
+) -> list[tuple[str, str]]:
+    """The (directory, file name) pairs of the unit files to mirror.
+
+    The unit files are named like 'AT-region-01M-3035-2021.geojson'.
+    """
+    selected = []
+    for file_names in units.values():
+        for file_name in file_names:
+            scale = _UNIT_SCALE.search(file_name)
+            if formats is not None and (
+                file_name.partition('.')[2] not in formats
+            ):
+                continue
+            if scales is None or scale is None or scale[1].upper() in scales:
+                selected.append(('distribution', file_name))
+    return selected
+
+
+async def _mirror_file(
+    theme: str,
+    file_format: str,
+    file_name: str,
+    out_dir: Path,
+    manifest: dict[str, dict[str, Any]],
+    report: MirrorReport,
+    semaphore: asyncio.Semaphore,
+    verify: bool,
+    parts: int,
+    progress: Optional[Callable[[str], None]],
+):
+    key = f'{theme}/{file_format}/{file_name}'
+    path = out_dir / key
+    entry = manifest.get(key)
+    async with semaphore:
+        try:
+            size = None
+            if path.exists():
+                size = await get_file_size(theme, file_format, file_name)
+                if size is None and entry is not None:
+                    size = entry['size']
+            if size is not None and path.stat().st_size == size:
+                if not verify or (
+                    entry is not None
+                    and entry['size'] == size
+                    and entry['sha256']
+                    == await asyncio.to_thread(_sha256_file, path)
+                ):
+                    report.skipped += 1
+                    return
+            path.parent.mkdir(parents=True, exist_ok=True)
+            await download_file(theme, file_format, file_name, path, parts)
+            manifest[key] = {
+                'size': path.stat().st_size,
+                'sha256': await asyncio.to_thread(_sha256_file, path),
+            }
+        except Exception as e:
+            report.failed[key] = repr(e)
+            return
+    report.downloaded += 1
+    report.bytes += manifest[key]['size']
+    if progress is not None:
+        progress(key)
+
+
+async def amirror(
+    out_dir: FilePath,
+    themes: Optional[Sequence[str]] = None,
+    years: Optional[Collection[str]] = None,
+    scales: Optional[Collection[str]] = None,
+    formats: Optional[Collection[str]] = None,
+    units: bool = False,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    verify: bool = False,
+    parts: int = 1,
+    progress: Optional[Callable[[str], None]] = None,
+) -> MirrorReport:
+    """Copies a subset of the distribution tree to a local directory.
+
+    The directory has the layout of the GISCO API, so it can be used
+    with set_mirror. The metadata files are always refreshed, the selected
+    themes and datasets being added to the ones of the previous mirrors
+    in the directory. The data files which are already present with the
+    size announced by the server are skipped, the size and SHA-256 digest
+    of the downloaded files being recorded in 'manifest.json'.
+
+    Args:
+        out_dir: The directory of the mirror.
+        themes: The themes to mirror (e.g. 'nuts'). Defaults to all of them.
+        years: The years to mirror. Defaults to all of them.
+        scales: The scales to mirror (e.g. '01M'). The files without
+            a scale are always mirrored. Defaults to all of them.
+        formats: The file formats to mirror (e.g. 'geojson').
+            Defaults to all of them.
+        units: Whether to also mirror the files of every unit, used by
+            the get() methods.
+        concurrency: The maximum number of concurrent downloads.
+        verify: Whether to also compare the SHA-256 digest of the present
+            files with the manifest before skipping them.
+        parts: Passed to download_file for every file.
+        progress: Called with the path of every downloaded file.
+    """
+    import gisco_geodata.parser
+
+    start = time.perf_counter()
+    out_dir = Path(out_dir)
+    if scales is not None:
+        # The scales are uppercase in the file names (e.g. '01M').
+        scales = {scale.upper() for scale in scales}
+    all_themes = json_loads(
+        await gisco_geodata.parser.BACKEND.fetch(THEMES_PATH)
+    )
+    if themes is None:
+        themes = list(all_themes.keys())
+    mirrored_themes = _load_json(out_dir / THEMES_PATH)
+    mirrored_themes.update({theme: all_themes[theme] for theme in themes})
+    _write(out_dir / THEMES_PATH, json.dumps(mirrored_themes).encode())
+    files: list[tuple[str, str, str]] = []
+    for theme in themes:
+        path = DATASET_PATH.format(theme=theme)
+        datasets = {
+            key: properties
+            for key, properties in json_loads(
+                await gisco_geodata.parser.BACKEND.fetch(path)
+            ).items()
+            if years is None or key.split('-')[-1] in years
+        }
+        mirrored_datasets = _load_json(out_dir / path)
+        mirrored_datasets.update(datasets)
+        _write(out_dir / path, json.dumps(mirrored_datasets).encode())
+        for key, properties in datasets.items():
+            year = key.split('-')[-1]
+            for property in (Property.FILES.value, Property.UNITS.value):
+                if property not in properties:
+                    continue
+                path = PARAMS_PATH.format(
+                    theme=theme, params=properties[property]
+                )
+                content = await gisco_geodata.parser.BACKEND.fetch(path)
+                _write(out_dir / path, content)
+                if property == Property.FILES.value:
+                    selected = _selected_files(
+                        theme, year, json_loads(content), scales, formats
+                    )
+                elif units:
+                    selected = _selected_unit_files(
+                        json_loads(content), scales, formats
+                    )
+                else:
+                    continue
+                files.extend((theme, *file) for file in selected)
+    manifest = _load_json(out_dir / MANIFEST)
+    report = MirrorReport()
+    semaphore = asyncio.Semaphore(concurrency)
+    try:
+        await asyncio.gather(
+            *(
+                _mirror_file(
+                    theme,
+                    file_format,
+                    file_name,
+                    out_dir,
+                    manifest,
+                    report,
+                    semaphore,
+                    verify,
+                    parts,
+                    progress,
+                )
+                # A file can be listed more than once.
+                for theme, file_format, file_name in dict.fromkeys(files)
+            )
+        )
+    finally:
+        _write(out_dir / MANIFEST, json.dumps(manifest, indent=1).encode())
+        report.seconds = time.perf_counter() - start
+    return report
+
+
+def mirror(
+    out_dir: FilePath,
+    themes: Optional[Sequence[str]] = None,
+    years: Optional[Collection[str]] = None,
+    scales: Optional[Collection[str]] = None,
+    formats: Optional[Collection[str]] = None,
+    units: bool = False,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    verify: bool = False,
+    parts: int = 1,
+    progress: Optional[Callable[[str], None]] = None,
+) -> MirrorReport:
+    """Copies a subset of the distribution tree, see amirror."""
+    return run_async(
+        amirror(
+            out_dir,
+            themes,
+            years,
+            scales,
+            formats,
+            units,
+            concurrency,
+            verify,
+            parts,
+            progress,
+        )
+    )
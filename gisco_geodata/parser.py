@@ -1,84 +1,988 @@
 from __future__ import annotations
 
+import asyncio
+import concurrent.futures
+import glob
+import os
+import shutil
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from collections.abc import AsyncGenerator, Awaitable, Callable, Hashable
 from functools import lru_cache
-from typing import Any, Literal, overload
-from urllib.parse import urljoin
+from pathlib import Path
+from typing import Any, Literal, Optional, TypeVar, cast, overload
+from urllib.parse import urljoin, urlparse
+from urllib.request import url2pathname
 
 import httpx
-from cache import AsyncLRU
 
-from .typing import JSON
-from .utils import async_retry, retry
+from . import events
+from .caching import CacheEntry, DiskCache, MemoryCache, json_size
+from .limits import AdaptiveLimiter, TokenBucket
+from .profiling import stage
+from .typing import JSON, FilePath
+from .utils import (
+    RetryPolicy,
+    async_retry,
+    json_loads,
+    on_shutdown,
+    retry,
+    runs_async_calls,
+)
+
+T = TypeVar('T')
 
 URL = 'https://gisco-services.ec.europa.eu/distribution/v2/'
-THEMES_URL = urljoin(URL, 'themes.json')
-DATASET_URL = urljoin(URL, '{theme}/datasets.json')
+# The paths are relative to the root of the distribution tree.
+THEMES_PATH = 'themes.json'
+DATASET_PATH = '{theme}/datasets.json'
 # 'params' can be multiple paramters separated by a backslash.
-PARAMS_URL = urljoin(URL, '{theme}/{params}')
-FILE_URL = urljoin(URL, '{theme}/{file_format}/{file}')
+PARAMS_PATH = '{theme}/{params}'
+FILE_PATH = '{theme}/{file_format}/{file}'
+THEMES_URL = urljoin(URL, THEMES_PATH)
+DATASET_URL = urljoin(URL, DATASET_PATH)
+PARAMS_URL = urljoin(URL, PARAMS_PATH)
+FILE_URL = urljoin(URL, FILE_PATH)
 
 HTTPX_KWARGS: dict[str, Any] = {}
+# The size of the chunks written to disk when streaming a download.
+CHUNK_SIZE = 1024**2
+# The minimum size of a part when downloading a file with range requests.
+MIN_PART_SIZE = 8 * 1024**2
+# Used unless 'limits' is passed through set_httpx_args.
+DEFAULT_LIMITS = httpx.Limits(
+    max_connections=100, max_keepalive_connections=50, keepalive_expiry=30
+)
 
 
-@lru_cache
-@retry(on=httpx.HTTPStatusError)
-def get_themes() -> JSON:
-    resp = httpx.get(THEMES_URL, **HTTPX_KWARGS)
+async def _close_at_shutdown(client: httpx.AsyncClient):
+    """Closes 'client' when the generator is closed.
+
+    Once started, the generator is closed by the event loop when it shuts
+    down its async generators (e.g. at the end of asyncio.run).
+    """
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+
+class Session:
+    """Owns the pooled HTTP clients shared by every request of the parser.
+
+    An httpx.AsyncClient is bound to the event loop it is first used on,
+    so one pooled client is kept per running loop. The clients are
+    created lazily, on the first request, and closed when their loop
+    shuts down its async generators, before the loop is closed.
+
+    Args:
+        **kwargs: Arguments passed to httpx.Client and httpx.AsyncClient
+            (e.g. 'verify', 'timeout', 'limits', 'http2').
+    """
+
+    def __init__(self, **kwargs: Any):
+        self.kwargs = kwargs
+        self._clients: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, httpx.AsyncClient
+        ] = weakref.WeakKeyDictionary()
+        # The _close_at_shutdown generators of the clients, by loop.
+        self._closers: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, AsyncGenerator[None, None]
+        ] = weakref.WeakKeyDictionary()
+        self._sync_client: Optional[httpx.Client] = None
+        self._lock = threading.Lock()
+
+    def _client_kwargs(self) -> dict[str, Any]:
+        kwargs: dict[str, Any] = {'limits': DEFAULT_LIMITS}
+        kwargs.update(self.kwargs)
+        return kwargs
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """The pooled client of the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.get(loop)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(**self._client_kwargs())
+                self._clients[loop] = client
+                closer = _close_at_shutdown(client)
+                try:
+                    # Runs up to the 'yield', which registers the
+                    # generator with the async generator hooks of the loop.
+                    closer.asend(None).send(None)
+                except StopIteration:
+                    pass
+                self._closers[loop] = closer
+            return client
+
+    @property
+    def sync_client(self) -> httpx.Client:
+        """The pooled client used by the synchronous functions."""
+        with self._lock:
+            if self._sync_client is None or self._sync_client.is_closed:
+                self._sync_client = httpx.Client(**self._client_kwargs())
+            return self._sync_client
+
+    def configure(self, **kwargs: Any):
+        """Replaces the client arguments and drops the existing pools."""
+        self.close()
+        self.kwargs = kwargs
+
+    def close(self):
+        """Closes the pooled clients.
+
+        Clients of loops that are still running are closed on their loop
+        and clients of idle loops are closed by running the loop. The
+        clients of closed loops were already closed when these loops
+        shut down their async generators, unless the loops were closed
+        without doing so, in which case their connections can't be
+        closed anymore.
+        """
+        with self._lock:
+            closers = list(self._closers.items())
+            self._clients.clear()
+            self._closers.clear()
+            sync_client, self._sync_client = self._sync_client, None
+        if sync_client is not None:
+            sync_client.close()
+        for loop, closer in closers:
+            if loop.is_running():
+                asyncio.run_coroutine_threadsafe(closer.aclose(), loop)
+            elif not loop.is_closed():
+                loop.run_until_complete(closer.aclose())
+
+    async def aclose(self):
+        """Closes the pooled client of the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._clients.pop(loop, None)
+            closer = self._closers.pop(loop, None)
+        if closer is not None:
+            await closer.aclose()
+
+
+SESSION = Session(**HTTPX_KWARGS)
+
+
+async def _close_session():
+    await SESSION.aclose()
+
+
+on_shutdown(_close_session)
+# Shared by every request of the process, whatever the event loop.
+LIMITER = AdaptiveLimiter()
+# Paces the requests of the process, None means no pacing.
+RATE_LIMITER: Optional[TokenBucket] = None
+MEMORY_CACHE = MemoryCache()
+_MISSING = object()
+# The requests being fetched, shared by the event loops of every thread.
+_IN_FLIGHT: dict[Hashable, concurrent.futures.Future[Any]] = {}
+_IN_FLIGHT_LOCK = threading.Lock()
+# The parsed themes.json and datasets.json files, by path. They are kept
+# until clear_cache, the metadata of the datasets being mutated in place.
+_METADATA: dict[str, JSON] = {}
+DISK_CACHE: Optional[DiskCache] = None
+if os.environ.get('GISCO_GEODATA_CACHE_DIR'):
+    DISK_CACHE = DiskCache(os.environ['GISCO_GEODATA_CACHE_DIR'])
+
+
+def _cached_or_none(url: str) -> tuple[Optional[CacheEntry], Optional[bytes]]:
+    """Looks up the disk cache.
+
+    Returns the entry to revalidate and, if the entry can be used
+    without revalidation, its content.
+    """
+    if DISK_CACHE is None:
+        return (None, None)
+    entry = DISK_CACHE.get(url)
+    if entry is None or DISK_CACHE.revalidate:
+        return (entry, None)
+    content = DISK_CACHE.read(entry)
+    if content is None:
+        return (None, None)
+    return (entry, content)
+
+
+def _handle_response(
+    url: str, resp: httpx.Response, entry: Optional[CacheEntry]
+) -> Optional[bytes]:
+    """Returns the content of a response, storing it in the disk cache.
+
+    Returns None if the response was a 304 for an entry that got evicted
+    meanwhile, in which case the request needs to be sent again.
+    """
+    if resp.status_code == 304 and entry is not None and DISK_CACHE:
+        return DISK_CACHE.read(entry)
     resp.raise_for_status()
-    return resp.json()
+    if DISK_CACHE is not None:
+        DISK_CACHE.put(url, resp.content, resp.headers)
+    return resp.content
 
 
-@lru_cache
-@retry(on=httpx.HTTPStatusError)
-def get_datasets(theme: str) -> JSON:
-    resp = httpx.get(DATASET_URL.format(theme=theme), **HTTPX_KWARGS)
+def _received_bytes(resp: httpx.Response) -> int:
+    """The size of the response body on the wire."""
+    if resp.num_bytes_downloaded:
+        return resp.num_bytes_downloaded
+    try:
+        # The body was not read from the network (e.g. a mocked response).
+        return len(resp.content)
+    except httpx.ResponseNotRead:
+        return 0
+
+
+def _emit_request(
+    method: str,
+    url: str,
+    start: float,
+    sent: float,
+    resp: Optional[httpx.Response] = None,
+    error: Optional[BaseException] = None,
+):
+    """Emits the RequestEvent of a request sent at 'sent'.
+
+    Args:
+        start: When the request started to wait for the limits.
+    """
+    # A 304 answers a conditional GET for an entry of the disk cache.
+    revalidated = resp is not None and resp.status_code == 304
+    events.emit(
+        events.RequestEvent(
+            url=url,
+            method=method,
+            source='revalidated' if revalidated else 'network',
+            status_code=resp.status_code if resp is not None else None,
+            bytes=_received_bytes(resp) if resp is not None else 0,
+            latency=time.monotonic() - sent,
+            wait=sent - start,
+            attempt=events.ATTEMPT.get(),
+            error=repr(error) if error is not None else None,
+        )
+    )
+
+
+def _get_sync(url: str, headers: dict[str, str]) -> httpx.Response:
+    start = time.monotonic()
+    if RATE_LIMITER is not None:
+        RATE_LIMITER.acquire_sync()
+    sent = time.monotonic()
+    try:
+        resp = SESSION.sync_client.get(
+            url, headers=headers, follow_redirects=True
+        )
+    except Exception as e:
+        if events.enabled():
+            _emit_request('GET', url, start, sent, error=e)
+        raise
+    if events.enabled():
+        _emit_request('GET', url, start, sent, resp)
+    return resp
+
+
+def _emit_disk_hit(url: str):
+    if events.enabled():
+        events.emit(
+            events.RequestEvent(
+                url=url, source='disk', attempt=events.ATTEMPT.get()
+            )
+        )
+
+
+@retry()
+def _fetch_sync(url: str) -> bytes:
+    entry, content = _cached_or_none(url)
+    if content is not None:
+        _emit_disk_hit(url)
+        return content
+    headers = entry.validators if entry is not None else {}
+    resp = _get_sync(url, headers)
+    content = _handle_response(url, resp, entry)
+    if content is None:
+        resp = _get_sync(url, {})
+        content = _handle_response(url, resp, None)
+    return cast(bytes, content)
+
+
+def _limiter_partition() -> Optional[asyncio.AbstractEventLoop]:
+    """The partition of LIMITER for the requests of the running loop.
+
+    The coroutines run by run_async have the limits of their loop: the
+    loop of the other requests may be blocked in run_async, waiting for
+    them, without ever releasing its slots.
+    """
+    return asyncio.get_running_loop() if runs_async_calls() else None
+
+
+async def _request(
+    method: str, url: str, headers: Optional[dict[str, str]] = None
+) -> httpx.Response:
+    """Sends a request within the rate and concurrency limits."""
+    start = time.monotonic()
+    if RATE_LIMITER is not None:
+        await RATE_LIMITER.acquire()
+    sent = None
+    try:
+        async with LIMITER.slot(
+            urlparse(url).netloc, _limiter_partition()
+        ) as slot:
+            sent = time.monotonic()
+            request = SESSION.client.build_request(method, url, headers=headers)
+            resp = await SESSION.client.send(
+                request, stream=True, follow_redirects=True
+            )
+            # The latency is measured until the headers, whatever the size
+            # of the body.
+            slot.response(resp.status_code)
+            try:
+                await resp.aread()
+            finally:
+                await resp.aclose()
+    except Exception as e:
+        if sent is not None and events.enabled():
+            _emit_request(method, url, start, sent, error=e)
+        raise
+    if events.enabled():
+        _emit_request(method, url, start, sent, resp)
+    return resp
+
+
+async def _off_loop(func: Callable[..., T], *args: Any) -> T:
+    """Runs a function using the disk cache without blocking the loop."""
+    if DISK_CACHE is None:
+        return func(*args)
+    return await asyncio.to_thread(func, *args)
+
+
+@async_retry()
+async def _fetch(url: str) -> bytes:
+    entry, content = await _off_loop(_cached_or_none, url)
+    if content is not None:
+        _emit_disk_hit(url)
+        return content
+    headers = entry.validators if entry is not None else {}
+    resp = await _request('GET', url, headers)
+    content = await _off_loop(_handle_response, url, resp, entry)
+    if content is None:
+        resp = await _request('GET', url)
+        content = await _off_loop(_handle_response, url, resp, None)
+    return cast(bytes, content)
+
+
+@async_retry()
+async def _file_size(url: str) -> Optional[int]:
+    resp = await _request('HEAD', url)
     resp.raise_for_status()
-    return resp.json()
+    length = resp.headers.get('content-length')
+    return int(length) if length is not None else None
+
+
+def _validator(resp: httpx.Response) -> Optional[str]:
+    """The ETag or Last-Modified of a response, usable in If-Range."""
+    etag = resp.headers.get('etag')
+    if etag is not None and not etag.startswith('W/'):
+        return etag
+    return resp.headers.get('last-modified')
+
+
+def _total_size(resp: httpx.Response) -> Optional[int]:
+    """The size of the file from the Content-Range of a 206 or a 416."""
+    total = resp.headers.get('content-range', '').rpartition('/')[2]
+    return int(total) if total.isdigit() else None
+
+
+def _validator_file(part_file: Path) -> Path:
+    """Holds the validator of the content of 'part_file'."""
+    return part_file.with_name(f'{part_file.name}.validator')
+
+
+def _read_validator(part_file: Path) -> Optional[str]:
+    try:
+        return _validator_file(part_file).read_text(encoding='utf-8')
+    except OSError:
+        return None
+
+
+def _remove_part_file(part_file: Path):
+    part_file.unlink(missing_ok=True)
+    _validator_file(part_file).unlink(missing_ok=True)
+
+
+def _remove_stale_parts(part_file: Path, keep: list[Path]):
+    """Removes the pieces of previous downloads of the file not in 'keep'.
+
+    They were left by a download with another number of parts, or of
+    another version of the file.
+    """
+    kept = {path.name for path in keep}
+    kept.update(_validator_file(path).name for path in keep)
+    for path in part_file.parent.glob(f'{glob.escape(part_file.name)}*'):
+        if path.name not in kept:
+            path.unlink(missing_ok=True)
+
+
+@async_retry()
+async def _range_support(url: str) -> Optional[tuple[int, Optional[str]]]:
+    """The size and validator of the file, if the server supports ranges."""
+    resp = await _request('HEAD', url)
+    resp.raise_for_status()
+    length = resp.headers.get('content-length')
+    if resp.headers.get('accept-ranges') != 'bytes' or length is None:
+        return None
+    return (int(length), _validator(resp))
+
+
+async def _request_range(
+    url: str,
+    part_file: Path,
+    start: int,
+    end: Optional[int],
+    validator: Optional[str],
+) -> bool:
+    """Appends the missing bytes of the range to 'part_file'.
+
+    Returns:
+        False if 'part_file' was longer than the file, which changed.
+    """
+    offset = part_file.stat().st_size if part_file.exists() else 0
+    if end is not None and start + offset > end:
+        return True
+    headers = {}
+    if start + offset > 0 or end is not None:
+        last = '' if end is None else str(end)
+        headers['Range'] = f'bytes={start + offset}-{last}'
+        # A file which changed on the server is sent whole, instead of
+        # a range to splice with the bytes of the previous version.
+        if_range = validator or (_read_validator(part_file) if offset else None)
+        if if_range is not None:
+            headers['If-Range'] = if_range
+    begin = time.monotonic()
+    if RATE_LIMITER is not None:
+        await RATE_LIMITER.acquire()
+    sent = None
+    resp = None
+    error = None
+    complete = False
+    try:
+        async with LIMITER.slot(
+            urlparse(url).netloc, _limiter_partition()
+        ) as slot:
+            sent = time.monotonic()
+            async with SESSION.client.stream(
+                'GET', url, headers=headers, follow_redirects=True
+            ) as resp:
+                slot.response(resp.status_code)
+                if resp.status_code == 416 and end is None and offset > 0:
+                    # Either the part file already holds the whole file,
+                    # or the file got shorter.
+                    complete = _total_size(resp) == start + offset
+                    return complete
+                resp.raise_for_status()
+                if resp.status_code != 206 and 'Range' in headers:
+                    if start > 0 or end is not None:
+                        reason = (
+                            'changed during the download'
+                            if 'If-Range' in headers
+                            else 'does not support range requests'
+                        )
+                        raise RuntimeError(f'{url} {reason}.')
+                    # The server ignored the range, or the file changed,
+                    # so we start over.
+                    offset = 0
+                if not offset:
+                    _write_validator(part_file, validator or _validator(resp))
+                # The file is written off the loop, which is shared with
+                # the other pieces and downloads.
+                f = await asyncio.to_thread(
+                    open, part_file, 'ab' if offset else 'wb'
+                )
+                try:
+                    async for chunk in resp.aiter_bytes(CHUNK_SIZE):
+                        await asyncio.to_thread(f.write, chunk)
+                finally:
+                    await asyncio.to_thread(f.close)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        if sent is not None and events.enabled():
+            # The 416 of a complete part file is not a failed request.
+            _emit_request(
+                'GET', url, begin, sent, None if complete else resp, error
+            )
+    return True
+
+
+def _write_validator(part_file: Path, validator: Optional[str]):
+    if validator is None:
+        _validator_file(part_file).unlink(missing_ok=True)
+    else:
+        _validator_file(part_file).write_text(validator, encoding='utf-8')
+
+
+@async_retry()
+async def _download_range(
+    url: str,
+    part_file: Path,
+    start: int = 0,
+    end: Optional[int] = None,
+    validator: Optional[str] = None,
+):
+    """Writes the bytes 'start' to 'end' (inclusive) of a file to 'part_file'.
+
+    If 'part_file' already exists, only the missing bytes are requested,
+    so every retry resumes from where the previous attempt stopped. The
+    validator (ETag or Last-Modified) of the first response is kept next
+    to 'part_file' and sent in the If-Range header of the resumed
+    requests, so that a file which changed on the server is downloaded
+    again.
+
+    Args:
+        validator: The validator of the file, from a HEAD request. A part
+            file of another version is removed.
+    """
+    if validator is not None and _read_validator(part_file) != validator:
+        _remove_part_file(part_file)
+    if not await _request_range(url, part_file, start, end, validator):
+        _remove_part_file(part_file)
+        await _request_range(url, part_file, start, end, validator)
+
+
+async def _download_parts(
+    url: str,
+    part_file: Path,
+    size: int,
+    validator: Optional[str],
+    parts: int,
+    retry_policy: Optional[RetryPolicy] = None,
+):
+    """Downloads a file as 'parts' concurrent range requests.
+
+    The pieces are named after their range, so that a download resumed
+    with another number of parts, or after the size of the file changed,
+    does not append to the pieces of the previous one.
+    """
+    step = -(-size // parts)
+    ranges = [
+        (start, min(start + step, size) - 1) for start in range(0, size, step)
+    ]
+    pieces = [
+        part_file.with_name(f'{part_file.name}.{start}-{end}')
+        for start, end in ranges
+    ]
+    _remove_stale_parts(part_file, pieces)
+    await asyncio.gather(
+        *(
+            _download_range(
+                url, piece, start, end, validator, retry_policy=retry_policy
+            )
+            for piece, (start, end) in zip(pieces, ranges)
+        )
+    )
+    # Copying hundreds of MB would block the other requests of the loop.
+    await asyncio.to_thread(_join_pieces, part_file, pieces)
+
+
+def _join_pieces(part_file: Path, pieces: list[Path]):
+    with open(part_file, 'wb') as f:
+        for piece in pieces:
+            with open(piece, 'rb') as src:
+                shutil.copyfileobj(src, f, CHUNK_SIZE)
+    for piece in pieces:
+        _remove_part_file(piece)
+
+
+async def _download(
+    url: str,
+    out_file: Path,
+    parts: int = 1,
+    retry_policy: Optional[RetryPolicy] = None,
+):
+    part_file = out_file.with_name(f'{out_file.name}.part')
+    support = None
+    if parts > 1:
+        support = await _range_support(url, retry_policy=retry_policy)
+    if support is not None and min(parts, support[0] // MIN_PART_SIZE) > 1:
+        size, validator = support
+        parts = min(parts, size // MIN_PART_SIZE)
+        await _download_parts(
+            url, part_file, size, validator, parts, retry_policy
+        )
+    else:
+        _remove_stale_parts(part_file, [part_file])
+        await _download_range(url, part_file, retry_policy=retry_policy)
+    _validator_file(part_file).unlink(missing_ok=True)
+    os.replace(part_file, out_file)
+
+
+class Backend(ABC):
+    """Where the parser reads the distribution tree from.
+
+    The paths are relative to the root of the tree and follow the layout
+    of the GISCO distribution API, e.g. 'themes.json', 'nuts/datasets.json'
+    or 'nuts/geojson/NUTS_RG_01M_2021_4326.geojson'.
+    """
+
+    @abstractmethod
+    def fetch_sync(
+        self, path: str, retry_policy: Optional[RetryPolicy] = None
+    ) -> bytes:
+        """The content of a file."""
+
+    @abstractmethod
+    async def fetch(
+        self, path: str, retry_policy: Optional[RetryPolicy] = None
+    ) -> bytes:
+        """The content of a file, without blocking the event loop."""
+
+    @abstractmethod
+    async def size(
+        self, path: str, retry_policy: Optional[RetryPolicy] = None
+    ) -> Optional[int]:
+        """The size of a file in bytes, None if it is unknown."""
+
+    @abstractmethod
+    async def download(
+        self,
+        path: str,
+        out_file: Path,
+        parts: int = 1,
+        retry_policy: Optional[RetryPolicy] = None,
+    ):
+        """Writes a file to 'out_file', without keeping it in memory."""
+
+
+class HTTPBackend(Backend):
+    """Requests the files from the GISCO API, or from an HTTP mirror of it.
+
+    The requests share the pooled clients of SESSION, the disk cache
+    and the retry policy.
+
+    Args:
+        url: The root of the distribution tree.
+    """
+
+    def __init__(self, url: str = URL):
+        self.url = url if url.endswith('/') else f'{url}/'
+
+    def __repr__(self) -> str:
+        return f'HTTPBackend({self.url!r})'
+
+    def fetch_sync(
+        self, path: str, retry_policy: Optional[RetryPolicy] = None
+    ) -> bytes:
+        return _fetch_sync(urljoin(self.url, path), retry_policy=retry_policy)
+
+    async def fetch(
+        self, path: str, retry_policy: Optional[RetryPolicy] = None
+    ) -> bytes:
+        return await _fetch(urljoin(self.url, path), retry_policy=retry_policy)
+
+    async def size(
+        self, path: str, retry_policy: Optional[RetryPolicy] = None
+    ) -> Optional[int]:
+        return await _file_size(
+            urljoin(self.url, path), retry_policy=retry_policy
+        )
+
+    async def download(
+        self,
+        path: str,
+        out_file: Path,
+        parts: int = 1,
+        retry_policy: Optional[RetryPolicy] = None,
+    ):
+        await _download(urljoin(self.url, path), out_file, parts, retry_policy)
+
+
+class LocalBackend(Backend):
+    """Reads the files from a local copy of the distribution tree.
+
+    No HTTP client is created and the disk cache is bypassed, the files
+    are read directly from the mirror. A missing file raises
+    FileNotFoundError, except in size, which returns None.
+
+    Args:
+        root: The directory holding 'themes.json', either as a path
+            or as a 'file://' URL.
+    """
+
+    def __init__(self, root: FilePath):
+        if str(root).startswith('file:'):
+            root = url2pathname(urlparse(str(root)).path)
+        self.root = Path(root)
+
+    def __repr__(self) -> str:
+        return f'LocalBackend({str(self.root)!r})'
+
+    def fetch_sync(
+        self, path: str, retry_policy: Optional[RetryPolicy] = None
+    ) -> bytes:
+        return (self.root / path).read_bytes()
+
+    async def fetch(
+        self, path: str, retry_policy: Optional[RetryPolicy] = None
+    ) -> bytes:
+        return await asyncio.to_thread((self.root / path).read_bytes)
+
+    async def size(
+        self, path: str, retry_policy: Optional[RetryPolicy] = None
+    ) -> Optional[int]:
+        try:
+            stat = await asyncio.to_thread((self.root / path).stat)
+        except FileNotFoundError:
+            return None
+        return stat.st_size
+
+    async def download(
+        self,
+        path: str,
+        out_file: Path,
+        parts: int = 1,
+        retry_policy: Optional[RetryPolicy] = None,
+    ):
+        part_file = out_file.with_name(f'{out_file.name}.part')
+        await asyncio.to_thread(shutil.copyfile, self.root / path, part_file)
+        os.replace(part_file, out_file)
+
+
+def backend_from_mirror(mirror: Optional[FilePath]) -> Backend:
+    """The backend serving a mirror of the distribution tree.
+
+    Args:
+        mirror: An 'http://' or 'https://' URL, a 'file://' URL or
+            a directory. None means the GISCO API.
+    """
+    if mirror is None:
+        return HTTPBackend()
+    if str(mirror).startswith(('http://', 'https://')):
+        return HTTPBackend(str(mirror))
+    return LocalBackend(mirror)
+
+
+BACKEND = backend_from_mirror(os.environ.get('GISCO_GEODATA_MIRROR') or None)
+
+
+def _get_metadata(path: str) -> JSON:
+    value = _METADATA.get(path)
+    if value is None:
+        with stage('fetch'):
+            content = BACKEND.fetch_sync(path)
+        with stage('parse'):
+            value = _METADATA.setdefault(path, json_loads(content))
+    return value
+
+
+async def _aget_metadata(path: str) -> JSON:
+    value = _METADATA.get(path)
+    if value is None:
+
+        async def fetch() -> tuple[JSON, int]:
+            with stage('fetch'):
+                content = await BACKEND.fetch(path)
+            with stage('parse'):
+                return (json_loads(content), 0)
+
+        # _METADATA is the only cache of the metadata, as in _get_metadata.
+        value = _METADATA.setdefault(
+            path,
+            await _coalesce(('metadata', path), fetch, path, cache=False),
+        )
+    return value
+
+
+def get_themes() -> JSON:
+    return _get_metadata(THEMES_PATH)
+
+
+def get_datasets(theme: str) -> JSON:
+    return _get_metadata(DATASET_PATH.format(theme=theme))
+
+
+async def aget_themes() -> JSON:
+    """The asynchronous version of get_themes, sharing its cache."""
+    return await _aget_metadata(THEMES_PATH)
+
+
+async def aget_datasets(theme: str) -> JSON:
+    """The asynchronous version of get_datasets, sharing its cache."""
+    return await _aget_metadata(DATASET_PATH.format(theme=theme))
 
 
 @lru_cache
-@retry(on=httpx.HTTPStatusError)
 def get_property(theme: str, property: str) -> Any:
     return get_themes()[theme][property]
 
 
-@AsyncLRU()
-@async_retry(on=httpx.HTTPStatusError)
-async def get_file(theme: str, file_format: str, file: str) -> bytes:
-    async with httpx.AsyncClient(**HTTPX_KWARGS) as client:
-        resp = await client.get(
-            FILE_URL.format(theme=theme, file_format=file_format, file=file)
-        )
-        resp.raise_for_status()
-        return resp.content
+async def _coalesce(
+    key: Hashable,
+    fetch: Callable[[], Awaitable[tuple[Any, int]]],
+    path: str,
+    cache: bool = True,
+) -> Any:
+    """Returns the cached value of a key, or fetches and caches it.
+
+    Concurrent calls with the same key, from any thread or event loop,
+    share a single fetch: the first one fetches the value and the others
+    wait for it. If the first one is cancelled, another one takes over.
+    The calls run by run_async only share the fetches of their own loop:
+    the loop of another fetch may be blocked in run_async, waiting for
+    them.
+
+    Args:
+        fetch: Returns the value and its size for the memory cache.
+        path: The path of the value in the distribution tree, for the
+            events.
+        cache: Whether the value is read from and stored in MEMORY_CACHE.
+            If not, only the concurrent calls share the fetch.
+    """
+    flight_key = key
+    if runs_async_calls():
+        flight_key = (key, asyncio.get_running_loop())
+    while True:
+        value = MEMORY_CACHE.get(key, _MISSING) if cache else _MISSING
+        if value is not _MISSING:
+            if events.enabled():
+                events.emit(events.RequestEvent(url=path, source='memory'))
+            return value
+        with _IN_FLIGHT_LOCK:
+            future = _IN_FLIGHT.get(flight_key)
+            leader = future is None
+            if future is None:
+                future = _IN_FLIGHT[flight_key] = concurrent.futures.Future()
+        if not leader:
+            # Shielded, so that a cancelled waiter does not cancel the fetch.
+            start = time.monotonic()
+            value = await asyncio.shield(asyncio.wrap_future(future))
+            if value is not _MISSING:
+                if events.enabled():
+                    events.emit(
+                        events.RequestEvent(
+                            url=path,
+                            source='coalesced',
+                            wait=time.monotonic() - start,
+                        )
+                    )
+                return value
+            continue
+        try:
+            value, size = await fetch()
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        except BaseException:
+            # Lets a waiting call fetch the value instead.
+            future.set_result(_MISSING)
+            raise
+        else:
+            if cache:
+                MEMORY_CACHE.set(key, value, size=size)
+            future.set_result(value)
+            return value
+        finally:
+            with _IN_FLIGHT_LOCK:
+                del _IN_FLIGHT[flight_key]
+
+
+async def get_file(
+    theme: str,
+    file_format: str,
+    file: str,
+    retry_policy: Optional[RetryPolicy] = None,
+) -> bytes:
+    path = FILE_PATH.format(theme=theme, file_format=file_format, file=file)
+
+    async def fetch() -> tuple[bytes, int]:
+        with stage('fetch'):
+            content = await BACKEND.fetch(path, retry_policy=retry_policy)
+        return (content, len(content))
+
+    return await _coalesce(('file', theme, file_format, file), fetch, path)
+
+
+async def get_file_size(
+    theme: str,
+    file_format: str,
+    file: str,
+    retry_policy: Optional[RetryPolicy] = None,
+) -> Optional[int]:
+    """The size of a file in bytes.
+
+    With the HTTP backend, it comes from a HEAD request and is None if
+    the server does not send a Content-Length.
+    """
+    return await BACKEND.size(
+        FILE_PATH.format(theme=theme, file_format=file_format, file=file),
+        retry_policy=retry_policy,
+    )
+
+
+async def download_file(
+    theme: str,
+    file_format: str,
+    file: str,
+    out_file: FilePath,
+    parts: int = 1,
+    retry_policy: Optional[RetryPolicy] = None,
+):
+    """Streams a file to the disk, without keeping it in memory.
+
+    The content is written to 'out_file' with a '.part' suffix which is
+    renamed once complete. If the connection drops, the download resumes
+    with a range request from what was already written, even across
+    processes. The memory and disk caches are bypassed. With a local
+    mirror, the file is copied.
+
+    Args:
+        parts: The number of concurrent range requests used to download
+            the file, if the server supports them. Each part is at least
+            MIN_PART_SIZE bytes.
+        retry_policy: Overrides the global retry policy.
+    """
+    await BACKEND.download(
+        FILE_PATH.format(theme=theme, file_format=file_format, file=file),
+        Path(out_file),
+        parts=parts,
+        retry_policy=retry_policy,
+    )
 
 
 @overload
 async def get_param(
-    theme: str, *params: str, return_type: Literal['bytes']
+    theme: str,
+    *params: str,
+    return_type: Literal['bytes'],
+    retry_policy: Optional[RetryPolicy] = None,
 ) -> bytes: ...
 
 
 @overload
 async def get_param(
-    theme: str, *params: str, return_type: Literal['json'] = 'json'
+    theme: str,
+    *params: str,
+    return_type: Literal['json'] = 'json',
+    retry_policy: Optional[RetryPolicy] = None,
 ) -> JSON: ...
 
 
-@AsyncLRU()
-@async_retry(on=httpx.HTTPStatusError)
 async def get_param(
-    theme: str, *params: str, return_type: Literal['bytes', 'json'] = 'json'
+    theme: str,
+    *params: str,
+    return_type: Literal['bytes', 'json'] = 'json',
+    retry_policy: Optional[RetryPolicy] = None,
 ) -> JSON | bytes:
-    async with httpx.AsyncClient(**HTTPX_KWARGS) as client:
-        resp = await client.get(
-            PARAMS_URL.format(theme=theme, params='/'.join(params)),
-            follow_redirects=True,
-        )
-        resp.raise_for_status()
-        if return_type == 'json':
-            return resp.json()
-        elif return_type == 'bytes':
-            return resp.content
-        else:
-            raise ValueError(f'Return type {return_type} not allowed.')
+    if return_type not in ('bytes', 'json'):
+        raise ValueError(f'Return type {return_type} not allowed.')
+
+    path = PARAMS_PATH.format(theme=theme, params='/'.join(params))
+
+    async def fetch() -> tuple[JSON | bytes, int]:
+        with stage('fetch'):
+            content = await BACKEND.fetch(path, retry_policy=retry_policy)
+        if return_type == 'bytes':
+            return (content, len(content))
+        with stage('parse'):
+            return (json_loads(content), json_size(content))
+
+    return await _coalesce(('param', theme, params, return_type), fetch, path)
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import atexit
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections.abc import Iterator
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from dataclasses import dataclass, field
+from types import TracebackType
+from typing import Optional, Type
+
+# The stages of get(), in the order of the report. 'collect' includes
+# the 'fetch' and 'parse' stages of the units it waits for.
+STAGES = (
+    'collect',
+    'fetch',
+    'parse',
+    'filter',
+    'read_dataframe',
+    'from_features',
+    'concat',
+)
+_DISABLED: AbstractContextManager[None] = nullcontext()
+
+
+@dataclass
+class StageStats:
+    """The calls of a stage.
+
+    Args:
+        calls: The number of calls.
+        seconds: The sum of the wall time of the calls.
+        busy: The wall time during which at least one call was running,
+            which is lower than 'seconds' when the calls overlap.
+        max_seconds: The wall time of the longest call.
+        peak_memory: The highest memory allocated during a call, above
+            the memory allocated when the call started, in bytes. The
+            allocations of the code running concurrently (e.g. other
+            requests) are included.
+    """
+
+    calls: int = 0
+    seconds: float = 0.0
+    busy: float = 0.0
+    max_seconds: float = 0.0
+    peak_memory: int = 0
+    # The number of running calls and since when one is running.
+    _running: int = field(default=0, repr=False)
+    _busy_since: float = field(default=0.0, repr=False)
+
+
+class _Frame:
+    """A running call of a stage."""
+
+    __slots__ = ('stats', 'start', 'memory', 'peak')
+
+    def __init__(self, stats: StageStats, start: float, memory: int):
+        self.stats = stats
+        self.start = start
+        self.memory = memory
+        self.peak = memory
+
+
+class _Stage:
+    def __init__(self, profile: Profile, name: str):
+        self.profile = profile
+        self.name = name
+        self.frame: Optional[_Frame] = None
+
+    def __enter__(self):
+        self.frame = self.profile._enter(self.name)
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ):
+        assert self.frame is not None
+        self.profile._exit(self.frame)
+
+
+class Profile:
+    """The wall time and memory peaks of the stages of the pipeline.
+
+    Args:
+        memory: Whether to trace the memory allocations with tracemalloc,
+            which slows down the allocations. If tracemalloc is already
+            tracing, its peak is not reset and the memory peaks are only
+            sampled when the stages start and end.
+    """
+
+    def __init__(self, memory: bool = True):
+        self.memory = memory
+        self.stages: dict[str, StageStats] = {}
+        self.seconds = 0.0
+        self._start = 0.0
+        self._frames: set[_Frame] = set()
+        self._started_tracing = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._start = time.perf_counter()
+
+    def stop(self):
+        self.seconds = time.perf_counter() - self._start
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def stage(self, name: str) -> AbstractContextManager[None]:
+        return _Stage(self, name)
+
+    def _memory(self) -> int:
+        """The current memory, after updating the peak of the frames."""
+        if not self.memory or not tracemalloc.is_tracing():
+            return 0
+        current, peak = tracemalloc.get_traced_memory()
+        if self._started_tracing:
+            tracemalloc.reset_peak()
+        else:
+            # The peak belongs to the code which started tracing, so it is
+            # left alone and only the current memory is sampled.
+            peak = current
+        for frame in self._frames:
+            frame.peak = max(frame.peak, peak)
+        return current
+
+    def _enter(self, name: str) -> _Frame:
+        with self._lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = StageStats()
+            now = time.perf_counter()
+            if stats._running == 0:
+                stats._busy_since = now
+            stats._running += 1
+            frame = _Frame(stats, now, self._memory())
+            self._frames.add(frame)
+        return frame
+
+    def _exit(self, frame: _Frame):
+        with self._lock:
+            now = time.perf_counter()
+            self._memory()
+            self._frames.discard(frame)
+            stats = frame.stats
+            elapsed = now - frame.start
+            stats.calls += 1
+            stats.seconds += elapsed
+            stats.max_seconds = max(stats.max_seconds, elapsed)
+            stats.peak_memory = max(
+                stats.peak_memory, frame.peak - frame.memory
+            )
+            stats._running -= 1
+            if stats._running == 0:
+                stats.busy += now - stats._busy_since
+
+    def report(self) -> str:
+        """A table of the stages, with the time and memory of their calls."""
+        names = [name for name in STAGES if name in self.stages]
+        names.extend(sorted(set(self.stages) - set(STAGES)))
+        lines = [
+            f'{"stage":<16}{"calls":>7}{"busy":>10}{"total":>10}'
+            f'{"mean":>10}{"max":>10}{"peak MiB":>10}'
+        ]
+        for name in names:
+            stats = self.stages[name]
+            mean = stats.seconds / stats.calls if stats.calls else 0.0
+            peak = f'{stats.peak_memory / 1024**2:.1f}' if self.memory else '-'
+            lines.append(
+                f'{name:<16}{stats.calls:>7}{stats.busy:>9.3f}s'
+                f'{stats.seconds:>9.3f}s{mean * 1000:>8.1f}ms'
+                f'{stats.max_seconds * 1000:>8.1f}ms{peak:>10}'
+            )
+        lines.append(f'wall time: {self.seconds:.3f}s')
+        return '\n'.join(lines)
+
+    def __str__(self) -> str:
+        return self.report()
+
+
+# The profile recording the stages, None when profiling is disabled.
+_PROFILE: Optional[Profile] = None
+
+
+def stage(name: str) -> AbstractContextManager[None]:
+    """Records a stage in the active profile, if there is one.
+
+    Does nothing (and costs a global lookup) when profiling is disabled.
+    """
+    profile = _PROFILE
+    if profile is None:
+        return _DISABLED
+    return profile.stage(name)
+
+
+@contextmanager
+def profile(memory: bool = True) -> Iterator[Profile]:
+    """Records the stages of the pipeline run in the block.
+
+    The stages are recorded for the whole process, including the
+    synchronous methods running on the background event loop. Profiles
+    don't nest, the innermost one records the stages.
+
+    Example:
+        with profile() as report:
+            NUTS().get(nuts_level='LEVL_3')
+        print(report)
+
+    Args:
+        memory: Whether to measure the memory peaks with tracemalloc.
+    """
+    global _PROFILE
+    previous = _PROFILE
+    current = _PROFILE = Profile(memory)
+    current.start()
+    try:
+        yield current
+    finally:
+        current.stop()
+        _PROFILE = previous
+
+
+def _profile_process():
+    """Profiles the whole process, printing the report at exit."""
+    global _PROFILE
+    current = _PROFILE = Profile()
+    current.start()
+
+    def report():
+        current.stop()
+        print(current.report(), file=sys.stderr)
+
+    atexit.register(report)
+
+
+if os.environ.get('GISCO_GEODATA_PROFILE', '') not in ('', '0'):
+    _profile_process()
@@ -0,0 +1,36 @@
+import httpx
+import pytest
+
+from gisco_geodata import parser
+from gisco_geodata.caching import MemoryCache
+
+
+@pytest.fixture
+def mock_session(monkeypatch):
+    """Serves the requests of parser.SESSION with a handler.
+
+    Returns a function taking the handler of httpx.MockTransport, which
+    can be called again to replace it.
+    """
+
+    def install(handler):
+        monkeypatch.setattr(
+            parser,
+            'SESSION',
+            parser.Session(transport=httpx.MockTransport(handler)),
+        )
+
+    return install
+
+
+@pytest.fixture
+def mock_backend(monkeypatch, mock_session):
+    """Like mock_session, with an HTTP backend and empty caches."""
+
+    def install(handler):
+        mock_session(handler)
+        monkeypatch.setattr(parser, 'BACKEND', parser.HTTPBackend('https://x/'))
+        monkeypatch.setattr(parser, 'MEMORY_CACHE', MemoryCache())
+        monkeypatch.setattr(parser, 'DISK_CACHE', None)
+
+    return install
@@ -0,0 +1,52 @@
+import pytest
+
+from gisco_geodata.catalog import Catalog, FileRecord
+
+
+def test_file_record_from_file_name():
+    record = FileRecord.from_file_name(
+        'nuts', '2021', 'shp', 'NUTS_RG_01M_2021_4326_LEVL_3.shp.zip'
+    )
+    assert (record.code, record.spatial_type, record.scale) == (
+        'NUTS',
+        'RG',
+        '01M',
+    )
+    assert (record.projection, record.level, record.extension) == (
+        '4326',
+        'LEVL_3',
+        'shp.zip',
+    )
+    record = FileRecord.from_file_name(
+        'nuts', '2021', 'geojson', 'NUTS_LB_2021_3035.geojson'
+    )
+    assert (record.spatial_type, record.scale, record.projection) == (
+        'LB',
+        None,
+        '3035',
+    )
+    assert record.level is None
+    record = FileRecord.from_file_name(
+        'countries', '2020', 'geojson', 'CNTR_BN_100K_2020_3857_INLAND.geojson'
+    )
+    assert (record.scale, record.level) == ('100K', 'INLAND')
+
+
+def test_catalog_filter(tmp_path):
+    catalog = Catalog(
+        FileRecord.from_file_name('nuts', '2021', file_format, file_name)
+        for file_format, file_name in [
+            ('geojson', 'NUTS_RG_01M_2021_4326_LEVL_3.geojson'),
+            ('geojson', 'NUTS_RG_20M_2021_4326_LEVL_3.geojson'),
+            ('shp', 'NUTS_RG_20M_2021_4326_LEVL_3.shp.zip'),
+            ('geojson', 'NUTS_RG_20M_2021_4326_LEVL_2.geojson'),
+        ]
+    )
+    assert len(catalog.filter(level='LEVL_3')) == 3
+    assert len(catalog.filter(scale=['01M', '20M'], file_format='geojson')) == 3
+    assert len(catalog.filter(scale='20M', projection=None)) == 3
+    with pytest.raises(ValueError):
+        catalog.filter(resolution='01M')
+    catalog.to_csv(tmp_path / 'catalog.csv')
+    lines = (tmp_path / 'catalog.csv').read_text().splitlines()
+    assert len(lines) == 5 and lines[0].startswith('theme,year,file_format')
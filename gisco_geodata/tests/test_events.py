@@ -0,0 +1,71 @@
+import asyncio
+
+import httpx
+
+from gisco_geodata import events, parser
+from gisco_geodata.utils import RetryPolicy
+
+
+def test_request_events_with_retries(mock_backend):
+    responses = iter([503, 200])
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(next(responses), content=b'{"a": 1}')
+
+    mock_backend(handler)
+    received = []
+    events.add_listener(received.append)
+    try:
+        with events.collect_stats() as stats:
+            content = asyncio.run(
+                parser._fetch(
+                    'https://x/themes.json',
+                    retry_policy=RetryPolicy(backoff=0),
+                )
+            )
+    finally:
+        events.remove_listener(received.append)
+    assert content == b'{"a": 1}'
+    assert [(e.status_code, e.attempt, e.failed) for e in received] == [
+        (503, 0, True),
+        (200, 1, False),
+    ]
+    assert all(e.source == 'network' and e.bytes == 8 for e in received)
+    assert stats.requests == 2 and stats.retries == 1 and stats.errors == 1
+    assert stats.cache_misses == 2 and stats.bytes == 16
+    assert stats.status_codes == {503: 1, 200: 1}
+    assert stats.percentile(50) is not None
+
+
+def test_cache_hits_and_coalesced_requests(mock_backend):
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={'a': 1})
+
+    mock_backend(handler)
+
+    async def main():
+        await asyncio.gather(
+            *(parser.get_param('nuts', 'units.json') for _ in range(3))
+        )
+        await parser.get_param('nuts', 'units.json')
+
+    with events.collect_stats() as stats:
+        asyncio.run(main())
+    assert stats.requests == 4
+    assert stats.cache_misses == 1 and stats.cache_hits == 3
+    assert stats.hit_ratio == 0.75
+    # Only the request sent to the server has a latency.
+    assert len(stats.latencies) == 1
+
+
+def test_listener_errors_are_warnings(monkeypatch, recwarn):
+    def listener(event):
+        raise ValueError
+
+    events.add_listener(listener)
+    try:
+        events.emit(events.RequestEvent(url='themes.json'))
+    finally:
+        events.remove_listener(listener)
+    assert recwarn.pop(RuntimeWarning)
+    assert not events.enabled()
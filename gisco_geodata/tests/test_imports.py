@@ -0,0 +1,18 @@
+import subprocess
+import sys
+
+HEAVY_MODULES = ('geopandas', 'pandas', 'pyogrio')
+
+
+def test_import_does_not_load_heavy_modules():
+    code = (
+        'import sys, gisco_geodata; '
+        f'print([m for m in {HEAVY_MODULES!r} if m in sys.modules])'
+    )
+    output = subprocess.run(
+        [sys.executable, '-c', code],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    assert output.strip() == '[]'
@@ -0,0 +1,204 @@
+import asyncio
+import threading
+import time
+
+import httpx
+
+from gisco_geodata import parser
+from gisco_geodata.limits import AdaptiveLimiter, TokenBucket
+from gisco_geodata.utils import RetryPolicy
+
+
+def _peak(limiter: AdaptiveLimiter, host: str, tasks: int) -> int:
+    in_flight = peak = 0
+
+    async def one():
+        nonlocal in_flight, peak
+        async with limiter.slot(host):
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+    async def main():
+        await asyncio.gather(*(one() for _ in range(tasks)))
+
+    asyncio.run(main())
+    return peak
+
+
+def test_limit_per_host():
+    limiter = AdaptiveLimiter(max_concurrency=3, latency_factor=None)
+    limiter.set_host_limit('b', 1)
+    assert _peak(limiter, 'a', 10) == 3
+    assert _peak(limiter, 'b', 5) == 1
+    assert limiter.state('a').in_flight == 0
+
+
+def test_partitions_have_their_own_slots():
+    limiter = AdaptiveLimiter(max_concurrency=2, latency_factor=None)
+
+    class Partition:
+        pass
+
+    partition = Partition()
+
+    async def main(partition):
+        for _ in range(2):
+            await limiter.acquire('a')
+        # Would wait forever for the slots held above.
+        await asyncio.wait_for(limiter.acquire('a', partition), timeout=1)
+        limiter.set_host_limit('a', 5)
+        assert limiter.state('a', partition).max_limit == 5
+        limiter.release('a', partition=partition)
+
+    asyncio.run(main(partition))
+    assert limiter.state('a').in_flight == 2
+    assert limiter.state('a', partition).in_flight == 0
+    del partition
+    assert not limiter._partitions
+
+
+def test_limit_shared_between_loops():
+    limiter = AdaptiveLimiter(max_concurrency=2, latency_factor=None)
+    lock = threading.Lock()
+    in_flight = peak = 0
+
+    async def one():
+        nonlocal in_flight, peak
+        async with limiter.slot('a'):
+            with lock:
+                in_flight += 1
+                peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            with lock:
+                in_flight -= 1
+
+    async def main():
+        await asyncio.gather(*(one() for _ in range(5)))
+
+    threads = [
+        threading.Thread(target=asyncio.run, args=(main(),)) for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak == 2
+    assert limiter.state('a').in_flight == 0
+
+
+def test_cancelled_waiter_releases_its_slot():
+    limiter = AdaptiveLimiter(max_concurrency=1)
+
+    async def main():
+        await limiter.acquire('a')
+        waiter = asyncio.ensure_future(limiter.acquire('a'))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        limiter.release('a')
+        await asyncio.sleep(0)
+        await asyncio.wait_for(limiter.acquire('a'), 1)
+
+    asyncio.run(main())
+    assert limiter.state('a').in_flight == 1
+
+
+def test_aimd():
+    limiter = AdaptiveLimiter(max_concurrency=8)
+    state = limiter.state('a')
+    for _ in range(3):
+        state.in_flight += 1
+        limiter.release('a', latency=0.1, throttled=True)
+    # The throttled responses of the same round trip decrease once.
+    assert state.limit == 4 and state.decreases == 1
+    for _ in range(100):
+        state.in_flight += 1
+        limiter.release('a', latency=0.1)
+    assert state.limit == 8
+    # A round trip later, the latency grows.
+    state.last_decrease -= 10
+    state.in_flight += 1
+    limiter.release('a', latency=10)
+    assert state.limit == 4
+
+
+def test_throttling_shrinks_the_limit(monkeypatch, mock_session):
+    statuses = iter([429, 429, 200])
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(next(statuses), content=b'{}')
+
+    limiter = AdaptiveLimiter(max_concurrency=10)
+    monkeypatch.setattr(parser, 'LIMITER', limiter)
+    mock_session(handler)
+    policy = RetryPolicy(backoff=0, jitter=False)
+    content = asyncio.run(
+        parser._fetch('https://example.com/a', retry_policy=policy)
+    )
+    assert content == b'{}'
+    state = limiter.state('example.com')
+    assert state.decreases >= 1
+    assert state.limit < 10 and state.in_flight == 0
+
+
+def test_token_bucket_paces_after_burst():
+    bucket = TokenBucket(rate=100, burst=2)
+    delays = [bucket.reserve() for _ in range(5)]
+    assert delays[:2] == [0, 0]
+    assert 0 < delays[2] < delays[3] < delays[4] <= 0.03 + 1e-3
+
+
+def test_token_bucket_shared_through_file(tmp_path):
+    lock_file = tmp_path / 'bucket'
+    first = TokenBucket(rate=10, burst=1, lock_file=lock_file)
+    second = TokenBucket(rate=10, burst=1, lock_file=lock_file)
+    assert first.reserve() == 0
+    assert second.reserve() > 0.09
+
+
+def test_token_bucket_waits_for_the_lock_off_the_loop(tmp_path):
+    import fcntl
+
+    lock_file = tmp_path / 'bucket'
+    first = TokenBucket(rate=10, burst=1, lock_file=lock_file)
+    second = TokenBucket(rate=10, burst=1, lock_file=lock_file)
+    ticks = []
+
+    async def tick():
+        for _ in range(5):
+            await asyncio.sleep(0.01)
+            ticks.append(time.monotonic())
+
+    async def main():
+        await first.acquire()
+        # The lock is held as if by another process, until 'released'.
+        with open(lock_file, 'a+b') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            timer = threading.Timer(0.3, fcntl.flock, (f, fcntl.LOCK_UN))
+            timer.start()
+            await asyncio.gather(second.acquire(), tick())
+            timer.join()
+
+    start = time.monotonic()
+    asyncio.run(main())
+    assert len(ticks) == 5 and ticks[-1] - start < 0.25
+    # The second bucket waited for the token taken by the first one.
+    assert time.monotonic() - start >= 0.3
+
+
+def test_rate_limit_applies_to_requests(monkeypatch, mock_session):
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=b'{}')
+
+    monkeypatch.setattr(parser, 'RATE_LIMITER', TokenBucket(rate=50, burst=1))
+    mock_session(handler)
+
+    async def main():
+        await asyncio.gather(
+            *(parser._fetch(f'https://example.com/{i}') for i in range(6))
+        )
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    assert time.perf_counter() - start >= 0.1
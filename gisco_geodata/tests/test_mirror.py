@@ -0,0 +1,155 @@
+import json
+
+import pytest
+
+from gisco_geodata import parser
+from gisco_geodata.__main__ import main
+from gisco_geodata.mirror import MANIFEST, mirror
+
+FILES = {
+    'geojson': [
+        'NUTS_RG_01M_2021_4326_LEVL_0.geojson',
+        'NUTS_RG_20M_2021_4326_LEVL_0.geojson',
+        'NUTS_LB_2021_4326_LEVL_0.geojson',
+    ],
+    'csv': ['NUTS_AT_2021.csv'],
+}
+UNITS = {
+    'AT': ['AT-region-01M-4326-2021.geojson', 'AT-label-4326-2021.geojson']
+}
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    """A local tree with the layout of the GISCO API."""
+    root = tmp_path / 'source'
+    (root / 'nuts' / 'geojson').mkdir(parents=True)
+    (root / 'nuts' / 'csv').mkdir()
+    (root / 'nuts' / 'distribution').mkdir()
+    (root / 'themes.json').write_text(
+        json.dumps({'nuts': {'title': 'NUTS'}, 'countries': {}})
+    )
+    (root / 'nuts' / 'datasets.json').write_text(
+        json.dumps(
+            {
+                'nuts-2016': {'date': '01/01/2016'},
+                'nuts-2021': {
+                    'files': 'nuts-2021-files.json',
+                    'units': 'nuts-2021-units.json',
+                },
+            }
+        )
+    )
+    (root / 'nuts' / 'nuts-2021-files.json').write_text(json.dumps(FILES))
+    (root / 'nuts' / 'nuts-2021-units.json').write_text(json.dumps(UNITS))
+    for file_format, file_names in FILES.items():
+        for file_name in file_names:
+            (root / 'nuts' / file_format / file_name).write_text(file_name)
+    for file_name in UNITS['AT']:
+        (root / 'nuts' / 'distribution' / file_name).write_text(file_name)
+    monkeypatch.setattr(parser, 'BACKEND', parser.LocalBackend(root))
+    return root
+
+
+@pytest.mark.parametrize('scale', ['01M', '01m'])
+def test_mirror_selects_files(source, tmp_path, scale):
+    out_dir = tmp_path / 'mirror'
+    report = mirror(
+        out_dir,
+        themes=['nuts'],
+        years=['2021'],
+        scales=[scale],
+        formats=['geojson'],
+        units=True,
+    )
+    files = sorted(
+        path.relative_to(out_dir).as_posix()
+        for path in out_dir.rglob('*')
+        if path.is_file()
+    )
+    assert files == [
+        MANIFEST,
+        'nuts/datasets.json',
+        'nuts/distribution/AT-label-4326-2021.geojson',
+        'nuts/distribution/AT-region-01M-4326-2021.geojson',
+        'nuts/geojson/NUTS_LB_2021_4326_LEVL_0.geojson',
+        'nuts/geojson/NUTS_RG_01M_2021_4326_LEVL_0.geojson',
+        'nuts/nuts-2021-files.json',
+        'nuts/nuts-2021-units.json',
+        'themes.json',
+    ]
+    assert report.downloaded == 4 and not report.failed
+    assert json.loads((out_dir / 'themes.json').read_text()) == {
+        'nuts': {'title': 'NUTS'}
+    }
+    assert list(
+        json.loads((out_dir / 'nuts' / 'datasets.json').read_text())
+    ) == ['nuts-2021']
+
+
+def test_mirror_merges_the_metadata_of_previous_syncs(source, tmp_path):
+    out_dir = tmp_path / 'mirror'
+    mirror(out_dir, themes=['nuts'], years=['2021'], formats=['csv'])
+    mirror(out_dir, themes=['nuts'], years=['2016'], formats=['csv'])
+    (source / 'countries').mkdir()
+    (source / 'countries' / 'datasets.json').write_text('{}')
+    mirror(out_dir, themes=['countries'])
+    assert json.loads((out_dir / 'themes.json').read_text()) == {
+        'nuts': {'title': 'NUTS'},
+        'countries': {},
+    }
+    assert sorted(
+        json.loads((out_dir / 'nuts' / 'datasets.json').read_text())
+    ) == ['nuts-2016', 'nuts-2021']
+    # The files of the first sync are still reachable through the mirror.
+    backend = parser.LocalBackend(out_dir)
+    files = json.loads(backend.fetch_sync('nuts/nuts-2021-files.json'))
+    assert files['csv'] == ['NUTS_AT_2021.csv']
+
+
+def test_mirror_skips_present_files(source, tmp_path):
+    out_dir = tmp_path / 'mirror'
+    mirror(out_dir, themes=['nuts'], formats=['csv'])
+    assert mirror(out_dir, themes=['nuts'], formats=['csv']).skipped == 1
+    # Same size, different content.
+    (out_dir / 'nuts' / 'csv' / 'NUTS_AT_2021.csv').write_text('X' * 16)
+    assert mirror(out_dir, themes=['nuts'], formats=['csv']).skipped == 1
+    report = mirror(out_dir, themes=['nuts'], formats=['csv'], verify=True)
+    assert report.downloaded == 1
+    content = (out_dir / 'nuts' / 'csv' / 'NUTS_AT_2021.csv').read_text()
+    assert content == 'NUTS_AT_2021.csv'
+
+
+def test_sync_command(source, tmp_path, capsys):
+    out_dir = tmp_path / 'mirror'
+    assert (
+        main(
+            [
+                'sync',
+                str(out_dir),
+                '--theme',
+                'nuts',
+                '--format',
+                'csv',
+                '--quiet',
+            ]
+        )
+        == 0
+    )
+    assert '1 downloaded' in capsys.readouterr().out
+    (source / 'nuts' / 'csv' / 'NUTS_AT_2021.csv').unlink()
+    (out_dir / 'nuts' / 'csv' / 'NUTS_AT_2021.csv').unlink()
+    assert (
+        main(
+            [
+                'sync',
+                str(out_dir),
+                '--theme',
+                'nuts',
+                '--format',
+                'csv',
+                '--quiet',
+            ]
+        )
+        == 1
+    )
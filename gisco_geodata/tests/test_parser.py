@@ -0,0 +1,555 @@
+import asyncio
+import http.server
+import json
+import os
+import threading
+import time
+import tracemalloc
+from typing import Optional
+
+import httpx
+import pytest
+
+from gisco_geodata import events, parser, set_httpx_args
+from gisco_geodata.caching import DiskCache, MemoryCache, json_size
+from gisco_geodata.limits import AdaptiveLimiter
+from gisco_geodata.utils import json_loads, run_async
+
+
+def test_session_reuses_client():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        return httpx.Response(200, json={'path': request.url.path})
+
+    session = parser.Session(transport=httpx.MockTransport(handler))
+
+    async def main():
+        first = session.client
+        for i in range(3):
+            await first.get(f'https://example.com/{i}')
+        assert session.client is first
+        await session.aclose()
+        assert session.client is not first
+        await session.aclose()
+
+    asyncio.run(main())
+    assert requests == ['/0', '/1', '/2']
+
+
+def test_session_configure_drops_pool():
+    session = parser.Session()
+    client = session.sync_client
+    session.configure(timeout=5)
+    assert client.is_closed
+    assert session.sync_client.timeout.read == 5
+    session.close()
+
+
+@pytest.fixture
+def http_server():
+    """A local HTTP server keeping the connections alive."""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Length', '2')
+            self.end_headers()
+            self.wfile.write(b'{}')
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}/'
+    server.shutdown()
+    server.server_close()
+
+
+def _open_connections(client: httpx.AsyncClient) -> int:
+    return len(client._transport._pool.connections)  # type: ignore
+
+
+def test_session_closes_the_clients_of_every_loop(http_server, monkeypatch):
+    session = parser.Session()
+    monkeypatch.setattr(parser, 'SESSION', session)
+    monkeypatch.setattr(parser, 'HTTPX_KWARGS', {})
+    clients = []
+
+    async def request():
+        await session.client.get(http_server)
+        clients.append(session.client)
+        assert _open_connections(session.client) == 1
+
+    # A loop finished by asyncio.run and the background loop.
+    asyncio.run(request())
+    run_async(request())
+    assert clients[0].is_closed and _open_connections(clients[0]) == 0
+    assert _open_connections(clients[1]) == 1
+    set_httpx_args(timeout=10)
+    run_async(asyncio.sleep(0.1))
+    assert clients[1].is_closed and _open_connections(clients[1]) == 0
+    # An idle loop which is not closed.
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(request())
+        set_httpx_args()
+        assert clients[2].is_closed and _open_connections(clients[2]) == 0
+    finally:
+        loop.close()
+
+
+def test_disk_cache_revalidation(tmp_path, monkeypatch, mock_session):
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(request.headers.get('If-None-Match'))
+        if request.headers.get('If-None-Match') == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(
+            200, content=b'{"a": 1}', headers={'ETag': '"v1"'}
+        )
+
+    mock_session(handler)
+    monkeypatch.setattr(parser, 'DISK_CACHE', DiskCache(tmp_path))
+    url = 'https://example.com/nuts/datasets.json'
+    assert asyncio.run(parser._fetch(url)) == b'{"a": 1}'
+    # A new cache instance, as if the process was restarted.
+    monkeypatch.setattr(parser, 'DISK_CACHE', DiskCache(tmp_path))
+    assert parser._fetch_sync(url) == b'{"a": 1}'
+    assert sent == [None, '"v1"']
+    monkeypatch.setattr(
+        parser, 'DISK_CACHE', DiskCache(tmp_path, revalidate=False)
+    )
+    assert asyncio.run(parser._fetch(url)) == b'{"a": 1}'
+    assert len(sent) == 2
+
+
+def test_disk_cache_eviction(tmp_path):
+    cache = DiskCache(tmp_path, max_size=10)
+    entry = cache.put('a', b'123456', {})
+    os.utime(cache.objects_dir / entry.digest, (0, 0))
+    cache.put('b', b'abcdef', {})
+    # The index entry is removed along with the body.
+    assert cache.get('a') is None
+    assert len(list(cache.index_dir.iterdir())) == 1
+    entry_b = cache.get('b')
+    assert entry_b is not None
+    assert cache.read(entry_b) == b'abcdef'
+    assert cache.read(entry) is None
+
+
+def test_disk_cache_keeps_the_updated_index_entries(tmp_path):
+    cache = DiskCache(tmp_path, max_size=10)
+    old = cache.put('a', b'123456', {})
+    os.utime(cache.objects_dir / old.digest, (0, 0))
+    # 'a' now points to another body, which survives the eviction of the
+    # old one.
+    cache.put('a', b'abcdef', {})
+    entry = cache.get('a')
+    assert entry is not None and entry.digest != old.digest
+    assert cache.read(entry) == b'abcdef'
+    assert [path.name for path in cache.refs_dir.iterdir()] == [entry.digest]
+
+
+def test_disk_cache_measures_the_directory_lazily(tmp_path, monkeypatch):
+    monkeypatch.setattr(DiskCache, 'RESCAN_INTERVAL', 4)
+    cache = DiskCache(tmp_path, max_size=100)
+    measures = []
+    stat_objects = cache._stat_objects
+    monkeypatch.setattr(
+        cache, '_stat_objects', lambda: measures.append(1) or stat_objects()
+    )
+    for i in range(9):
+        cache.put(str(i), b'%05d' % i, {})
+    # On the first body, then every 4 bodies.
+    assert len(measures) == 3
+    for i in range(9, 30):
+        cache.put(str(i), b'%05d' % i, {})
+    assert cache.size <= 100
+    # Evicting down to 90 bytes leaves room for two bodies before the
+    # next measure.
+    assert len(measures) < 15
+
+
+def test_disk_cache_shared_by_processes(tmp_path, monkeypatch):
+    # The bodies stored by the other processes are accounted for when
+    # the directory is measured, here on every stored body.
+    monkeypatch.setattr(DiskCache, 'RESCAN_INTERVAL', 1)
+    # One instance per process, sharing the directory.
+    caches = [DiskCache(tmp_path, max_size=20) for _ in range(3)]
+    for i in range(12):
+        caches[i % 3].put(str(i), b'%05d' % i, {})
+    assert caches[0].size <= 20
+    assert len(list(caches[0].index_dir.iterdir())) == 4
+    assert len(list(caches[0].refs_dir.iterdir())) == 4
+
+
+def test_memory_cache_bounded_by_size():
+    cache = MemoryCache(max_size=10)
+    cache.set('a', 'A', size=4)
+    cache.set('b', 'B', size=4)
+    assert cache.get('a') == 'A'
+    cache.set('c', 'C', size=4)
+    # 'b' is the least recently used entry.
+    assert cache.get('b') is None
+    cache.set('d', 'D', size=11)
+    assert cache.get('d') is None
+    info = cache.info()
+    assert (info.hits, info.misses, info.evictions) == (1, 2, 1)
+    assert (info.entries, info.size) == (2, 8)
+
+
+def test_memory_cache_ttl(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    cache = MemoryCache(ttl=5)
+    cache.set('a', 'A', size=1)
+    assert cache.get('a') == 'A'
+    now[0] = 6
+    assert cache.get('a') is None
+    assert cache.info().size == 0
+
+
+def test_json_size_estimates_the_parsed_size():
+    coordinates = [[10 + i / 1e4, 45 + i / 1e4] for i in range(10000)]
+    content = json.dumps(
+        {
+            'type': 'Feature',
+            'properties': {'NUTS_ID': 'AT1'},
+            'geometry': {'type': 'Polygon', 'coordinates': [coordinates]},
+        }
+    ).encode()
+    tracemalloc.start()
+    try:
+        value = json_loads(content)
+        parsed = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    assert value['properties'] == {'NUTS_ID': 'AT1'}
+    assert parsed > 3 * len(content)
+    assert 0.7 < json_size(content) / parsed < 1.5
+
+
+def test_download_file_streams_to_disk(tmp_path, mock_session):
+    body = b'x' * (3 * parser.CHUNK_SIZE + 7)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=body)
+
+    mock_session(handler)
+    out_file = tmp_path / 'NUTS_RG_01M_2021_4326.shp.zip'
+    asyncio.run(parser.download_file('nuts', 'shp', out_file.name, out_file))
+    assert out_file.read_bytes() == body
+    assert [path.name for path in tmp_path.iterdir()] == [out_file.name]
+
+
+def _range_handler(body: bytes, requests: list, etag: Optional[str] = None):
+    def handler(request: httpx.Request) -> httpx.Response:
+        range_ = request.headers.get('Range')
+        requests.append((request.method, range_))
+        headers = {'Accept-Ranges': 'bytes', 'Content-Length': str(len(body))}
+        if etag is not None:
+            headers['ETag'] = etag
+        if request.method == 'HEAD':
+            return httpx.Response(200, headers=headers)
+        if_range = request.headers.get('If-Range')
+        if range_ is None or (if_range is not None and if_range != etag):
+            return httpx.Response(200, content=body, headers=headers)
+        start, end = range_.removeprefix('bytes=').split('-')
+        if int(start) >= len(body):
+            return httpx.Response(
+                416, headers={'Content-Range': f'bytes */{len(body)}'}
+            )
+        end = int(end) if end else len(body) - 1
+        return httpx.Response(
+            206,
+            content=body[int(start) : end + 1],
+            headers={'ETag': etag} if etag is not None else {},
+        )
+
+    return handler
+
+
+def test_download_file_resumes_part_file(tmp_path, mock_session):
+    body = bytes(range(256)) * 100
+    requests = []
+    mock_session(_range_handler(body, requests))
+    out_file = tmp_path / 'file.zip'
+    (tmp_path / 'file.zip.part').write_bytes(body[:1000])
+    asyncio.run(parser.download_file('nuts', 'shp', 'file.zip', out_file))
+    assert out_file.read_bytes() == body
+    assert requests == [('GET', 'bytes=1000-')]
+
+
+def test_download_file_in_parts(tmp_path, monkeypatch, mock_session):
+    body = bytes(range(256)) * 100
+    requests = []
+    monkeypatch.setattr(parser, 'MIN_PART_SIZE', 1000)
+    mock_session(_range_handler(body, requests))
+    out_file = tmp_path / 'file.zip'
+    asyncio.run(
+        parser.download_file('nuts', 'shp', 'file.zip', out_file, parts=4)
+    )
+    assert out_file.read_bytes() == body
+    assert requests[0] == ('HEAD', None)
+    assert sorted(requests[1:]) == [
+        ('GET', 'bytes=0-6399'),
+        ('GET', 'bytes=12800-19199'),
+        ('GET', 'bytes=19200-25599'),
+        ('GET', 'bytes=6400-12799'),
+    ]
+    assert [path.name for path in tmp_path.iterdir()] == ['file.zip']
+
+
+def test_download_file_restarts_when_the_file_changed(tmp_path, mock_session):
+    old, new = b'a' * 3000, b'b' * 2000
+    requests = []
+    mock_session(_range_handler(old, requests, etag='"v1"'))
+    out_file = tmp_path / 'file.zip'
+    (tmp_path / 'file.zip.part').write_bytes(old[:1000])
+    (tmp_path / 'file.zip.part.validator').write_text('"v1"')
+    # The validator of the part file does not match anymore.
+    mock_session(_range_handler(new, requests, etag='"v2"'))
+    asyncio.run(parser.download_file('nuts', 'shp', 'file.zip', out_file))
+    assert out_file.read_bytes() == new
+    # The part file is longer than the new file.
+    (tmp_path / 'file.zip.part').write_bytes(old)
+    (tmp_path / 'file.zip.part.validator').write_text('"v2"')
+    asyncio.run(parser.download_file('nuts', 'shp', 'file.zip', out_file))
+    assert out_file.read_bytes() == new
+    assert requests == [
+        ('GET', 'bytes=1000-'),
+        ('GET', 'bytes=3000-'),
+        ('GET', None),
+    ]
+    assert [path.name for path in tmp_path.iterdir()] == ['file.zip']
+
+
+def test_download_file_completed_part_file(tmp_path, mock_session):
+    body = b'a' * 3000
+    requests = []
+    mock_session(_range_handler(body, requests, etag='"v1"'))
+    out_file = tmp_path / 'file.zip'
+    (tmp_path / 'file.zip.part').write_bytes(body)
+    (tmp_path / 'file.zip.part.validator').write_text('"v1"')
+    with events.collect_stats() as stats:
+        asyncio.run(parser.download_file('nuts', 'shp', 'file.zip', out_file))
+    assert out_file.read_bytes() == body
+    assert requests == [('GET', 'bytes=3000-')]
+    assert stats.requests == 1 and stats.errors == 0
+
+
+def test_download_file_in_parts_ignores_stale_pieces(
+    tmp_path, monkeypatch, mock_session
+):
+    body = bytes(range(256)) * 100
+    requests = []
+    monkeypatch.setattr(parser, 'MIN_PART_SIZE', 1000)
+    mock_session(_range_handler(body, requests, etag='"v2"'))
+    out_file = tmp_path / 'file.zip'
+    # Left by a download in 2 parts, and by one of another version.
+    (tmp_path / 'file.zip.part.0-12799').write_bytes(b'x' * 100)
+    (tmp_path / 'file.zip.part.0-6399').write_bytes(b'y' * 100)
+    (tmp_path / 'file.zip.part.0-6399.validator').write_text('"v1"')
+    asyncio.run(
+        parser.download_file('nuts', 'shp', 'file.zip', out_file, parts=4)
+    )
+    assert out_file.read_bytes() == body
+    assert ('GET', 'bytes=0-6399') in requests
+    assert [path.name for path in tmp_path.iterdir()] == ['file.zip']
+
+
+def test_incomplete_backend_cannot_be_created():
+    class Backend(parser.Backend):
+        def fetch_sync(self, path, retry_policy=None):
+            return b''
+
+    with pytest.raises(TypeError):
+        Backend()
+
+
+def test_local_backend_serves_mirror(tmp_path, monkeypatch):
+    (tmp_path / 'nuts' / 'geojson').mkdir(parents=True)
+    (tmp_path / 'themes.json').write_text('{"nuts": {"title": "NUTS"}}')
+    (tmp_path / 'nuts' / 'datasets.json').write_text('{"nuts-2021": {}}')
+    (tmp_path / 'nuts' / 'units.json').write_text('{"AT": ["AT1"]}')
+    (tmp_path / 'nuts' / 'geojson' / 'a.geojson').write_bytes(b'data')
+    session = parser.Session()
+    monkeypatch.setattr(parser, 'SESSION', session)
+    monkeypatch.setattr(
+        parser, 'BACKEND', parser.backend_from_mirror(tmp_path.as_uri())
+    )
+    monkeypatch.setattr(parser, 'MEMORY_CACHE', MemoryCache())
+    monkeypatch.setattr(parser, '_METADATA', {})
+    assert parser.get_themes() == {'nuts': {'title': 'NUTS'}}
+    assert parser.get_datasets('nuts') == {'nuts-2021': {}}
+
+    async def main():
+        units = await parser.get_param('nuts', 'units.json')
+        content = await parser.get_file('nuts', 'geojson', 'a.geojson')
+        size = await parser.get_file_size('nuts', 'geojson', 'a.geojson')
+        await parser.download_file(
+            'nuts', 'geojson', 'a.geojson', tmp_path / 'out.geojson'
+        )
+        return units, content, size
+
+    assert asyncio.run(main()) == ({'AT': ['AT1']}, b'data', 4)
+    assert (tmp_path / 'out.geojson').read_bytes() == b'data'
+    missing = parser.get_file_size('nuts', 'geojson', 'missing.geojson')
+    assert asyncio.run(missing) is None
+    assert not session._clients and session._sync_client is None
+
+
+def test_backend_from_mirror():
+    assert isinstance(parser.backend_from_mirror(None), parser.HTTPBackend)
+    backend = parser.backend_from_mirror('http://localhost:8000/v2')
+    assert isinstance(backend, parser.HTTPBackend)
+    assert backend.url == 'http://localhost:8000/v2/'
+    assert isinstance(parser.backend_from_mirror('/data'), parser.LocalBackend)
+
+
+def _counting_backend(monkeypatch, delay: float = 0.05, error=None):
+    """Replaces the backend with one counting the fetches."""
+    fetched = []
+
+    class Backend(parser.HTTPBackend):
+        async def fetch(self, path, retry_policy=None):
+            fetched.append(path)
+            await asyncio.sleep(delay)
+            if error is not None:
+                raise error
+            return b'{"a": 1}'
+
+    monkeypatch.setattr(parser, 'BACKEND', Backend())
+    monkeypatch.setattr(parser, 'MEMORY_CACHE', MemoryCache())
+    return fetched
+
+
+def test_get_param_coalesces_concurrent_calls(monkeypatch):
+    fetched = _counting_backend(monkeypatch)
+
+    async def main():
+        return await asyncio.gather(
+            *(parser.get_param('nuts', 'a.json') for _ in range(5))
+        )
+
+    results = asyncio.run(main())
+    assert results == [{'a': 1}] * 5
+    assert fetched == ['nuts/a.json']
+    assert not parser._IN_FLIGHT
+
+
+def test_aget_themes_is_only_cached_in_the_metadata(monkeypatch):
+    fetched = _counting_backend(monkeypatch)
+    monkeypatch.setattr(parser, '_METADATA', {})
+
+    async def main():
+        return await asyncio.gather(*(parser.aget_themes() for _ in range(5)))
+
+    assert asyncio.run(main()) == [{'a': 1}] * 5
+    assert fetched == ['themes.json']
+    assert parser._METADATA == {'themes.json': {'a': 1}}
+    info = parser.MEMORY_CACHE.info()
+    assert info.entries == 0 and info.hits == 0 and info.misses == 0
+
+
+def test_get_param_coalesces_across_threads(monkeypatch):
+    fetched = _counting_backend(monkeypatch, delay=0.2)
+    results = []
+
+    def target():
+        results.append(asyncio.run(parser.get_param('nuts', 'a.json')))
+
+    threads = [threading.Thread(target=target) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [{'a': 1}] * 3
+    assert fetched == ['nuts/a.json']
+
+
+def test_get_param_sync_call_inside_coroutine(monkeypatch):
+    fetched = _counting_backend(monkeypatch, delay=0.2)
+    results = []
+
+    async def main():
+        leader = asyncio.ensure_future(parser.get_param('nuts', 'a.json'))
+        await asyncio.sleep(0.05)
+        # Blocks this loop, and so the leader, until the background loop
+        # has the value.
+        results.append(run_async(parser.get_param('nuts', 'a.json')))
+        results.append(await leader)
+
+    thread = threading.Thread(target=asyncio.run, args=(main(),), daemon=True)
+    thread.start()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert results == [{'a': 1}] * 2
+    assert len(fetched) == 2
+
+
+def test_sync_call_inside_coroutine_with_pending_requests(
+    monkeypatch, mock_session
+):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json={'a': 1})
+
+    mock_session(handler)
+    monkeypatch.setattr(parser, 'BACKEND', parser.HTTPBackend('https://x/'))
+    monkeypatch.setattr(parser, 'MEMORY_CACHE', MemoryCache())
+    monkeypatch.setattr(parser, 'DISK_CACHE', None)
+    monkeypatch.setattr(parser, 'LIMITER', AdaptiveLimiter())
+    results = []
+
+    async def main():
+        pending = [
+            asyncio.ensure_future(parser.get_param('nuts', f'{i}.json'))
+            for i in range(300)
+        ]
+        await asyncio.sleep(0)
+        # The requests of this loop hold, or wait for, every slot of the
+        # host while run_async blocks the loop.
+        results.append(run_async(parser.get_param('nuts', 'other.json')))
+        results.extend(await asyncio.gather(*pending))
+
+    thread = threading.Thread(target=asyncio.run, args=(main(),), daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive()
+    assert results == [{'a': 1}] * 301
+
+
+def test_get_param_coalesced_errors_and_cancellation(monkeypatch):
+    fetched = _counting_backend(monkeypatch, error=ValueError('boom'))
+
+    async def failing():
+        results = await asyncio.gather(
+            *(parser.get_param('nuts', 'a.json') for _ in range(3)),
+            return_exceptions=True,
+        )
+        assert all(isinstance(result, ValueError) for result in results)
+
+    asyncio.run(failing())
+    assert len(fetched) == 1 and not parser._IN_FLIGHT
+
+    fetched = _counting_backend(monkeypatch)
+
+    async def cancelled():
+        leader = asyncio.ensure_future(parser.get_param('nuts', 'a.json'))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(parser.get_param('nuts', 'a.json'))
+        await asyncio.sleep(0)
+        leader.cancel()
+        # The follower fetches the value itself.
+        assert await follower == {'a': 1}
+
+    asyncio.run(cancelled())
+    assert len(fetched) == 2
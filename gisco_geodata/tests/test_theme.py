@@ -0,0 +1,234 @@
+import asyncio
+import json
+import tracemalloc
+
+import pytest
+
+from gisco_geodata import (
+    NUTS,
+    CallEvent,
+    add_listener,
+    clear_cache,
+    collect_stats,
+    parser,
+    profile,
+    remove_listener,
+    theme,
+)
+from gisco_geodata.profiling import stage
+from gisco_geodata.theme import FileIndex, _file_name_from_stem, _prefer_bulk
+
+FILES = {
+    'geojson': [
+        'NUTS_RG_20M_2021_4326_LEVL_0.geojson',
+        'NUTS_RG_20M_2021_4326.geojson',
+        'NUTS_RG_20M_2021_3035_LEVL_0.geojson',
+        'NUTS_LB_2021_4326_LEVL_0.geojson',
+    ],
+    'shp': ['NUTS_RG_20M_2021_4326_LEVL_0.shp.zip'],
+}
+
+
+def test_file_index_matches_scan():
+    index = FileIndex(FILES)
+    stems = [
+        'RG_20M_2021_4326_LEVL_0',
+        'RG_20M_2021_4326',
+        'RG_20M_2021_4326.geojson',
+        'RG_20M_2021',
+        'LB_2021_4326_LEVL_0',
+        'RG_20M_2021_43',
+        'RG_60M',
+    ]
+    for file_format, file_names in FILES.items():
+        for stem in stems:
+            assert index.get(file_format, stem) == _file_name_from_stem(
+                file_names, stem
+            )
+
+
+def test_file_index_matches_whole_components():
+    files = {
+        'geojson': [
+            'NUTS_RG_20M_2021_4326_LEVL_10.geojson',
+            'NUTS_RG_20M_2021_4326_LEVL_1.geojson',
+        ]
+    }
+    index = FileIndex(files)
+    assert (
+        index.get('geojson', 'RG_20M_2021_4326_LEVL_1')
+        == 'NUTS_RG_20M_2021_4326_LEVL_1.geojson'
+    )
+    # The stems which don't end at a '_' boundary are matched as prefixes.
+    assert (
+        index.get('geojson', 'RG_20M_2021_4326_LEV')
+        == 'NUTS_RG_20M_2021_4326_LEVL_10.geojson'
+    )
+
+
+def test_prefer_bulk():
+    assert _prefer_bulk(1500, 1500, 'RG', '01M')
+    assert _prefer_bulk(40, 40, 'LB', None)
+    assert not _prefer_bulk(2, 1500, 'RG', '20M')
+
+
+@pytest.fixture
+def nuts_mirror(tmp_path, monkeypatch):
+    """A local mirror with three NUTS 0 units and one NUTS 1 unit."""
+    (tmp_path / 'nuts' / 'distribution').mkdir(parents=True)
+    (tmp_path / 'themes.json').write_text(json.dumps({'nuts': {}}))
+    (tmp_path / 'nuts' / 'datasets.json').write_text(
+        json.dumps(
+            {
+                'nuts-2021': {
+                    'files': 'nuts-2021-files.json',
+                    'units': 'nuts-2021-units.json',
+                }
+            }
+        )
+    )
+    units = ['FR', 'AT', 'DE', 'AT1']
+    level_file = 'NUTS_RG_20M_2021_4326_LEVL_0.geojson'
+    (tmp_path / 'nuts' / 'nuts-2021-files.json').write_text(
+        json.dumps({'geojson': [level_file]})
+    )
+    (tmp_path / 'nuts' / 'nuts-2021-units.json').write_text(
+        json.dumps({unit: [] for unit in units})
+    )
+
+    def feature_collection(*units: str) -> str:
+        features = [
+            {
+                'type': 'Feature',
+                'properties': {'NUTS_ID': unit},
+                'geometry': {'type': 'Point', 'coordinates': [0, 0]},
+            }
+            for unit in units
+        ]
+        return json.dumps(
+            {
+                'type': 'FeatureCollection',
+                'crs': {
+                    'type': 'name',
+                    'properties': {'name': 'urn:ogc:def:crs:EPSG::4326'},
+                },
+                'features': features,
+            }
+        )
+
+    for unit in units:
+        (
+            tmp_path
+            / 'nuts'
+            / 'distribution'
+            / f'{unit}-region-20M-4326-2021.geojson'
+        ).write_text(feature_collection(unit))
+    # The file of the level, in another order than the list of units.
+    (tmp_path / 'nuts' / 'geojson').mkdir()
+    (tmp_path / 'nuts' / 'geojson' / level_file).write_text(
+        feature_collection('DE', 'FR', 'AT')
+    )
+    monkeypatch.setattr(parser, 'BACKEND', parser.LocalBackend(tmp_path))
+    clear_cache()
+    yield tmp_path
+    clear_cache()
+
+
+def test_get_keeps_the_order_of_the_units(nuts_mirror):
+    gdf = NUTS().get(nuts_level='LEVL_0')
+    assert list(gdf['NUTS_ID']) == ['FR', 'AT', 'DE']
+
+
+def test_get_from_the_file_of_the_level(nuts_mirror, monkeypatch):
+    per_unit = NUTS().get(nuts_level='LEVL_0')
+    monkeypatch.setattr(theme, 'BULK_FETCH', True)
+    with collect_stats() as stats:
+        bulk = NUTS().get(nuts_level='LEVL_0')
+    # Only the list of units (twice, to compare with the file of the
+    # level) is read from the memory cache, not the cached units.
+    assert stats.cache_hits == 2
+    assert list(bulk.columns) == list(per_unit.columns)
+    assert list(bulk['NUTS_ID']) == list(per_unit['NUTS_ID'])
+
+
+def test_get_level_file_with_pyogrio(nuts_mirror, monkeypatch):
+    pytest.importorskip('pyogrio')
+    monkeypatch.setattr(theme, 'BULK_FETCH', True)
+    monkeypatch.setattr(theme, 'GEOJSON_READER', 'pyogrio')
+    with profile() as report:
+        gdf = NUTS().get(nuts_level='LEVL_0')
+    assert 'read_dataframe' in report.stages
+    assert 'from_features' not in report.stages
+    assert list(gdf['NUTS_ID']) == ['FR', 'AT', 'DE']
+    assert list(gdf.index) == [0, 1, 2]
+
+
+def test_iter_units(nuts_mirror):
+    units = list(NUTS().iter_units(nuts_level='LEVL_0', window=1))
+    assert len(units) == 3
+    assert sorted(gdf['NUTS_ID'].item() for gdf in units) == ['AT', 'DE', 'FR']
+
+
+def test_async_paths_do_not_block(nuts_mirror, monkeypatch):
+    class Backend(parser.LocalBackend):
+        def fetch_sync(self, path, retry_policy=None):
+            raise AssertionError(f'Blocking request for {path}.')
+
+    monkeypatch.setattr(parser, 'BACKEND', Backend(nuts_mirror))
+
+    async def main():
+        gdf = await NUTS().aget(nuts_level='LEVL_0')
+        units = [gdf async for gdf in NUTS().aiter_units(nuts_level='LEVL_1')]
+        return gdf, units
+
+    gdf, units = asyncio.run(main())
+    assert len(gdf) == 3 and len(units) == 1
+    # The sync API reads the metadata loaded by the async one.
+    assert NUTS().default_dataset.year == '2021'
+
+
+def test_get_reports_its_requests(nuts_mirror):
+    received = []
+    add_listener(received.append)
+    try:
+        NUTS().get(nuts_level='LEVL_0')
+        with collect_stats() as stats:
+            NUTS().get(nuts_level='LEVL_0')
+    finally:
+        remove_listener(received.append)
+    calls = [event for event in received if isinstance(event, CallEvent)]
+    assert [call.name for call in calls] == ['NUTS.aget', 'NUTS.aget']
+    assert calls[0].error is None
+    # The second call reads the list of units and the three units
+    # from the memory cache.
+    assert calls[1].stats.cache_hits == 4
+    assert stats.cache_hits == 4 and stats.cache_misses == 0
+
+
+def test_profile_records_the_stages(nuts_mirror):
+    with profile() as report:
+        NUTS().get(nuts_level='LEVL_0')
+    assert {'collect', 'fetch', 'parse', 'from_features'} <= set(report.stages)
+    # The three units, the datasets, the list of units and the themes.
+    assert report.stages['fetch'].calls >= 3
+    assert report.stages['collect'].busy <= report.seconds
+    assert 'from_features' in str(report)
+    # Nothing is recorded out of the block.
+    NUTS().get(nuts_level='LEVL_1')
+    assert report.stages['from_features'].calls == 1
+    assert stage('fetch') is stage('parse')
+
+
+def test_profile_keeps_the_tracemalloc_peak():
+    tracemalloc.start()
+    try:
+        data = bytearray(10 * 1024**2)
+        del data
+        with profile() as report:
+            with stage('parse'):
+                pass
+        assert tracemalloc.is_tracing()
+        assert tracemalloc.get_traced_memory()[1] >= 10 * 1024**2
+    finally:
+        tracemalloc.stop()
+    assert report.stages['parse'].calls == 1
@@ -32,3 +32,13 @@ def test_get_nuts():
     setattr(theme, 'GEOPANDAS_AVAILABLE', True)
     geojson = NUTS_.get(countries='RO', nuts_level='LEVL_0', spatial_type='RG')
     assert isinstance(geojson, gpd.GeoDataFrame)
+
+
+def test_aget_nuts():
+    async def main():
+        return await NUTS_.aget(
+            countries='RO', nuts_level='LEVL_0', spatial_type='RG'
+        )
+
+    geojson = asyncio.run(main())
+    assert isinstance(geojson, gpd.GeoDataFrame)
@@ -0,0 +1,266 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from gisco_geodata import utils
+from gisco_geodata.utils import RetryPolicy, async_retry, retry
+
+
+def _status_error(status: int, headers=None) -> httpx.HTTPStatusError:
+    request = httpx.Request('GET', 'https://example.com')
+    response = httpx.Response(status, headers=headers, request=request)
+    return httpx.HTTPStatusError('error', request=request, response=response)
+
+
+def test_retry_policy_classification():
+    policy = RetryPolicy()
+    assert policy.should_retry(_status_error(503))
+    assert policy.should_retry(_status_error(429))
+    assert not policy.should_retry(_status_error(404))
+    assert policy.should_retry(httpx.ConnectError('error'))
+    assert not policy.should_retry(ValueError())
+    policy = RetryPolicy(
+        rules={httpx.TransportError: True, httpx.ConnectError: False}
+    )
+    assert not policy.should_retry(httpx.ConnectError('error'))
+    assert policy.should_retry(httpx.ReadError('error'))
+
+
+def test_retry_policy_delay():
+    policy = RetryPolicy(backoff=1, max_delay=5, jitter=False)
+    exc = _status_error(503)
+    assert [policy.delay(i, exc) for i in range(4)] == [1, 2, 4, 5]
+    exc = _status_error(429, headers={'Retry-After': '3'})
+    assert policy.delay(0, exc) == 3
+    policy = RetryPolicy(backoff=1, max_delay=5)
+    assert all(0 <= policy.delay(i, exc) <= 5 for i in range(10))
+
+
+def test_retry_policy_budget():
+    policy = RetryPolicy(backoff=1, jitter=False, budget=2.5)
+    exc = _status_error(503)
+    start = utils.time.monotonic()
+    assert policy.next_delay(0, exc, start) == 1
+    assert policy.next_delay(1, exc, start - 1) is None
+
+
+def test_retry_stops_on_non_retryable(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(utils.time, 'sleep', sleeps.append)
+    calls = []
+
+    @retry(RetryPolicy(jitter=False, retries=3))
+    def func(status):
+        calls.append(status)
+        raise _status_error(status)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        func(404)
+    assert calls == [404] and sleeps == []
+    with pytest.raises(httpx.HTTPStatusError):
+        func(503)
+    assert len(calls) == 5 and sleeps == [0.5, 1, 2]
+
+
+def test_retry_deprecated_arguments(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(utils.time, 'sleep', sleeps.append)
+    calls = []
+
+    with pytest.warns(DeprecationWarning):
+
+        @retry(on=ValueError, retries=2, delay=0.1)
+        def func(exc):
+            calls.append(exc)
+            raise exc
+
+    with pytest.raises(KeyError):
+        func(KeyError())
+    assert len(calls) == 1
+    with pytest.raises(ValueError):
+        func(ValueError())
+    assert len(calls) == 4 and sleeps == [0.1, 0.1]
+    with pytest.warns(DeprecationWarning):
+        policy = utils._legacy_policy(httpx.HTTPError, None, None, None)
+    assert policy is not None and policy.retries == 50
+    assert policy.should_retry(_status_error(404))
+
+
+def test_async_retry_per_call_policy():
+    calls = []
+
+    @async_retry()
+    async def func():
+        calls.append(None)
+        if len(calls) < 3:
+            raise httpx.ReadError('error')
+        return 'done'
+
+    policy = RetryPolicy(backoff=0, jitter=False)
+    assert asyncio.run(func(retry_policy=policy)) == 'done'
+    assert len(calls) == 3
+
+
+def test_run_async_uses_one_background_loop():
+    async def current_loop():
+        return asyncio.get_running_loop()
+
+    async def nested():
+        # Blocking calls made from the background loop must not deadlock.
+        return utils.run_async(current_loop())
+
+    loop = utils.run_async(current_loop())
+    assert utils.run_async(current_loop()) is loop
+    assert loop is utils.get_loop_thread().loop
+    assert utils.run_async(nested()) is not loop
+
+    async def fail():
+        raise ValueError('error')
+
+    with pytest.raises(ValueError):
+        utils.run_async(fail())
+
+
+def test_run_async_inside_running_loop():
+    async def main():
+        return utils.run_async(asyncio.sleep(0, result='done'))
+
+    assert asyncio.run(main()) == 'done'
+
+
+def _geojson(unit: str, crs: str = 'urn:ogc:def:crs:EPSG::4326') -> dict:
+    return {
+        'type': 'FeatureCollection',
+        'crs': {'type': 'name', 'properties': {'name': crs}},
+        'features': [
+            {
+                'type': 'Feature',
+                'properties': {'NUTS_ID': unit},
+                'geometry': {'type': 'Point', 'coordinates': [0, 0]},
+            }
+        ],
+    }
+
+
+def test_gdf_from_geojson():
+    gdf = utils.gdf_from_geojson([_geojson('RO'), _geojson('IT')])
+    assert list(gdf['NUTS_ID']) == ['RO', 'IT']
+    assert list(gdf.index) == [0, 1]
+    assert gdf.crs.to_epsg() == 4326
+    gdf = utils.gdf_from_geojson(_geojson('RO'))
+    assert list(gdf['NUTS_ID']) == ['RO']
+
+
+def test_gdf_from_geojson_bytes():
+    contents = [
+        json.dumps(_geojson('RO')).encode(),
+        json.dumps(_geojson('IT')).encode(),
+    ]
+    gdf = utils.gdf_from_geojson_bytes(contents)
+    assert list(gdf['NUTS_ID']) == ['RO', 'IT']
+    assert gdf.crs.to_epsg() == 4326
+
+
+async def _after(delay: float, value):
+    await asyncio.sleep(delay)
+    return value
+
+
+def test_iter_completed_yields_indexes():
+    async def main():
+        return [
+            item
+            async for item in utils.iter_completed(
+                [_after(0.03, 'a'), _after(0.01, 'b'), _after(0.02, 'c')]
+            )
+        ]
+
+    assert asyncio.run(main()) == [(1, 'b'), (2, 'c'), (0, 'a')]
+
+
+def test_collect_ordered():
+    async def main():
+        return await utils.collect_ordered(
+            _after(delay, i) for i, delay in enumerate([0.03, 0.01, 0.02])
+        )
+
+    assert asyncio.run(main()) == [0, 1, 2]
+
+
+def test_handle_completed_requests_is_deprecated():
+    async def main():
+        return await utils.handle_completed_requests(
+            _after(delay, i) for i, delay in enumerate([0.02, 0.01])
+        )
+
+    with pytest.warns(DeprecationWarning):
+        assert asyncio.run(main()) == [0, 1]
+
+
+def test_collect_ordered_cancels_on_error():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def fail():
+        raise ValueError
+
+    async def main():
+        with pytest.raises(ValueError):
+            await utils.collect_ordered([slow(), fail()])
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert cancelled == [True]
+
+
+def test_iter_completed_awaits_the_remaining_tasks():
+    async def fail(delay):
+        await asyncio.sleep(delay)
+        raise ValueError
+
+    async def main():
+        completed = utils.iter_completed([fail(0), fail(0), _after(1, 'a')])
+        with pytest.raises(ValueError):
+            async for _ in completed:
+                pass
+        # The failed sibling and the cancelled task are already done.
+        return asyncio.all_tasks() - {asyncio.current_task()}
+
+    assert asyncio.run(main()) == set()
+
+
+def test_iter_completed_limit():
+    started = []
+
+    async def one(i):
+        started.append(i)
+        await asyncio.sleep(0.01)
+        return i
+
+    async def main():
+        completed = utils.iter_completed((one(i) for i in range(10)), limit=3)
+        results = []
+        async for index, result in completed:
+            # The next awaitables are scheduled once a result is consumed.
+            assert len(started) <= len(results) + 3
+            results.append(result)
+        return results
+
+    assert sorted(asyncio.run(main())) == list(range(10))
+
+
+def test_iter_async():
+    async def numbers():
+        for i in range(3):
+            await asyncio.sleep(0)
+            yield i
+
+    assert list(utils.iter_async(numbers())) == [0, 1, 2]
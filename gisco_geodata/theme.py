@@ -1,23 +1,33 @@
 from __future__ import annotations
 
-import asyncio
 import datetime
 import os
 import sys
 import xml.etree.ElementTree as ET
-from collections.abc import Sequence
+from collections.abc import (
+    AsyncIterator,
+    Callable,
+    Coroutine,
+    Iterable,
+    Iterator,
+    Sequence,
+)
 from dataclasses import dataclass
 from enum import Enum
-from functools import partial
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Any, Literal, Optional, cast, overload
+from typing import TYPE_CHECKING, Any, Literal, Optional, cast, overload
 
+from .events import instrumented
 from .parser import (
+    aget_datasets,
+    aget_themes,
+    download_file,
     get_datasets,
-    get_file,
     get_param,
     get_themes,
 )
+from .profiling import stage
 from .typing import (
     JSON,
     CountryBoundary,
@@ -36,27 +46,116 @@ from .typing import (
     UrbanAuditCategory,
 )
 from .utils import (
+    collect_ordered,
     gdf_from_geojson,
+    gdf_from_geojson_bytes,
     geopandas_is_available,
-    handle_completed_requests,
+    iter_async,
+    iter_completed,
     pandas_is_available,
     run_async,
 )
 
+if TYPE_CHECKING:
+    # geopandas and pandas are imported when they are first used, as they
+    # would take most of the import time of the package.
+    import geopandas as gpd
+    import pandas as pd
+
+    # aget without its overloads on the literal arguments, which get()
+    # forwards as plain strings.
+    AGet = Callable[..., Coroutine[Any, Any, list[GeoJSON] | gpd.GeoDataFrame]]
+
 PLATFORM = sys.platform
+# Kept in sync with the maximum of parser.LIMITER by set_semaphore_value.
 SEMAPHORE_VALUE = 50
+GEOJSON_READER: Literal['json', 'pyogrio'] = 'json'
+# Whether get() can download the file holding every unit of a level
+# and filter it, instead of downloading the units one by one.
+BULK_FETCH = False
+# The cost of a request (connection, latency) expressed in bytes,
+# used to choose between the bulk file and the per unit files.
+REQUEST_COST = 100_000
 GEOPANDAS_AVAILABLE = geopandas_is_available()
 PANDAS_AVAILABLE = pandas_is_available()
 
 
-if GEOPANDAS_AVAILABLE:
-    import geopandas as gpd
-
-if PANDAS_AVAILABLE:
-    import pandas as pd
-
 _UNITS_REGION = '{unit}-region-{scale}-{projection}-{year}.geojson'
 _UNITS_LABEL = '{unit}-label-{projection}-{year}.geojson'
+# Rough size of a unit file by scale, the labels being single points.
+_UNIT_SIZES = {
+    '100K': 1_500_000,
+    '01M': 300_000,
+    '03M': 100_000,
+    '10M': 30_000,
+    '20M': 10_000,
+    '60M': 4_000,
+}
+_LABEL_SIZE = 500
+
+
+def _file_name_from_stem(
+    file_names: list[str], file_stem: str
+) -> Optional[str]:
+    for value in file_names:
+        # We check against 'SPATIALTYPE_YEAR_PROJECTION' etc.
+        # instead of 'THEME_SPATIALTYPE_YEAR_PROJECTION'.
+        # Naming of the 'THEME' inside the file names is inconsistent.
+        # For example, for 'Communes' the file name starts with 'COMM'.
+        to_check_against = '_'.join(value.split('_')[1:])
+        if to_check_against.startswith(file_stem):
+            return value
+    return None
+
+
+def _file_stems(file_name: str) -> list[str]:
+    """The stems that resolve to a file name.
+
+    For 'NUTS_RG_20M_2021_4326_LEVL_3.geojson', these are 'RG', 'RG_20M',
+    ..., 'RG_20M_2021_4326_LEVL_3' and 'RG_20M_2021_4326_LEVL_3.geojson'.
+    """
+    without_theme = '_'.join(file_name.split('_')[1:])
+    parts = without_theme.split('.')[0].split('_')
+    stems = ['_'.join(parts[: i + 1]) for i in range(len(parts))]
+    stems.append(without_theme)
+    return stems
+
+
+class FileIndex:
+    """Resolves file stems to the file names of a dataset in constant time.
+
+    A stem ending at a '_' boundary resolves to the first file name with
+    the same components, e.g. 'RG_20M_2021_4326_LEVL_1' resolves to
+    '..._LEVL_1.geojson' even if '..._LEVL_10.geojson' is listed first.
+    Scanning the file names in order for the first one starting with the
+    stem (see _file_name_from_stem) returned the latter, and is only done
+    for the stems which don't end at a '_' boundary.
+    """
+
+    def __init__(self, files: Files):
+        self.files = files
+        self._index: dict[str, dict[str, str]] = {}
+        for file_format, file_names in files.items():
+            index = self._index[file_format] = {}
+            for file_name in file_names:
+                for stem in _file_stems(file_name):
+                    index.setdefault(stem, file_name)
+
+    def get(self, file_format: str, file_stem: str) -> Optional[str]:
+        file_name = self._index.get(file_format, {}).get(file_stem)
+        if file_name is not None:
+            return file_name
+        return _file_name_from_stem(self.files[file_format], file_stem)
+
+
+# (theme, year) -> FileIndex
+_FILE_INDEXES: dict[tuple[str, str], FileIndex] = {}
+
+
+@lru_cache
+def _dataset_key(theme: str, year: str) -> str:
+    """The key of the dataset of a year in the datasets of a theme."""
+    return [k for k in get_datasets(theme).keys() if year in k][0]
 
 
 @dataclass
@@ -120,6 +219,101 @@ class Documentation:
             os.startfile(out_file)  # type: ignore
 
 
+def _prefer_bulk(
+    requested: int, total: int, spatial_type: str, scale: Optional[str]
+) -> bool:
+    """Whether downloading all the units of a level is cheaper.
+
+    Compares one request for the 'total' units with one request
+    per 'requested' unit, using the estimated size of a unit.
+    """
+    if spatial_type == 'LB':
+        unit_size = _LABEL_SIZE
+    else:
+        unit_size = _UNIT_SIZES.get(cast(str, scale), _UNIT_SIZES['01M'])
+    per_unit = requested * (REQUEST_COST + unit_size)
+    bulk = REQUEST_COST + total * unit_size
+    return bulk <= per_unit
+
+
+async def _get_bulk(
+    theme_parser: ThemeParser,
+    year: str,
+    file_stem: str,
+    id_property: str,
+    units: Sequence[str],
+) -> Optional[list[GeoJSON] | gpd.GeoDataFrame]:
+    """Downloads the file with all the units of a level and keeps 'units'.
+
+    The features are returned in the order of 'units'. With the 'pyogrio'
+    reader (see set_geojson_reader), the file is read from its bytes into
+    a GeoDataFrame. Returns None if the dataset has no such file.
+    """
+    dataset = Dataset(theme_parser, year)
+    file_name = await dataset.aget_file_name_from_stem(
+        'geojson', f'{file_stem}.geojson'
+    )
+    if file_name is None:
+        return None
+    # The features are kept in the order of 'units', like the per unit path.
+    positions = {unit: i for i, unit in enumerate(units)}
+    if GEOPANDAS_AVAILABLE and GEOJSON_READER == 'pyogrio':
+        content = await get_param(
+            theme_parser.name, 'geojson', file_name, return_type='bytes'
+        )
+        gdf = gdf_from_geojson_bytes(content)
+        with stage('filter'):
+            gdf = gdf[gdf[id_property].isin(positions)]
+            order = gdf[id_property].map(positions).argsort(kind='stable')
+            return gdf.iloc[order].reset_index(drop=True)
+    geojson = cast(
+        GeoJSON, await get_param(theme_parser.name, 'geojson', file_name)
+    )
+    with stage('filter'):
+        features = sorted(
+            (
+                feature
+                for feature in geojson['features']
+                if feature['properties'].get(id_property) in positions
+            ),
+            key=lambda feature: positions[feature['properties'][id_property]],
+        )
+    return [cast(GeoJSON, {**geojson, 'features': features})]
+
+
+async def _aiter_units(
+    theme_parser: Countries | NUTS | UrbanAudit,
+    units: Iterable[str],
+    spatial_type: str,
+    scale: Optional[str],
+    projection: str,
+    year: str,
+    window: Optional[int],
+) -> AsyncIterator[GeoJSON | gpd.GeoDataFrame]:
+    """Yields the units one by one, in the order they are downloaded.
+
+    At most 'window' units are downloaded ahead of the consumer, so
+    the memory used does not depend on the number of units (besides
+    the memory cache, see set_memory_cache). Each unit is converted
+    to a GeoDataFrame if geopandas is available.
+    """
+    completed = iter_completed(
+        (
+            theme_parser._get_one(unit, spatial_type, scale, projection, year)
+            for unit in units
+        ),
+        limit=window or SEMAPHORE_VALUE,
+    )
+    try:
+        async for _, geojson in completed:
+            if GEOPANDAS_AVAILABLE:
+                yield gdf_from_geojson(geojson)
+            else:
+                yield geojson
+    finally:
+        await completed.aclose()
+
+
 class Property(Enum):
     DATE = 'date'
     DOCUMENTATION = 'documentation'
@@ -171,6 +365,17 @@ class ThemeParser:
             Dataset(self, year.split('-')[-1]) for year in self.datasets.keys()
         ]
 
+    async def aget_properties(self) -> JSON:
+        return (await aget_themes())[self.name]
+
+    async def aget_datasets(self) -> list[Dataset]:
+        # Once loaded, the datasets are read from the cache without I/O.
+        await aget_datasets(self.name)
+        return self.get_datasets()
+
+    async def aget_default_dataset(self) -> Dataset:
+        return (await self.aget_datasets())[-1]
+
     def get_property(self, property: str) -> Any:
         return self.properties[property]
 
@@ -189,6 +394,7 @@ class ThemeParser:
         projection: Optional[str] = None,
         country_boundary: Optional[str] = None,
         nuts_level: Optional[str] = None,
+        parts: int = 1,
         **kwargs: str,
     ) -> GeoJSON | gpd.GeoDataFrame: ...
 
@@ -203,6 +409,7 @@ class ThemeParser:
         scale: Optional[Scale] = None,
         projection: Optional[Projection] = None,
         country_boundary: Optional[CountryBoundary] = None,
+        parts: int = 1,
         **kwargs: str,
     ) -> None: ...
 
@@ -217,6 +424,7 @@ class ThemeParser:
         scale: Optional[str] = None,
         projection: Optional[str] = None,
         country_boundary: Optional[CountryBoundary] = None,
+        parts: int = 1,
         **kwargs: str,
     ) -> None: ...
 
@@ -231,6 +439,7 @@ class ThemeParser:
         scale: Optional[Scale] = None,
         projection: Optional[Projection] = None,
         nuts_level: Optional[NUTSLevel] = None,
+        parts: int = 1,
         **kwargs: str,
     ) -> None: ...
 
@@ -245,6 +454,7 @@ class ThemeParser:
         scale: Optional[str] = None,
         projection: Optional[str] = None,
         nuts_level: Optional[str] = None,
+        parts: int = 1,
         **kwargs: str,
     ) -> None: ...
 
@@ -259,13 +469,44 @@ class ThemeParser:
         projection: Optional[str] = None,
         country_boundary: Optional[str] = None,
         nuts_level: Optional[str] = None,
+        parts: int = 1,
+        **kwargs: str,
+    ) -> Optional[GeoJSON | gpd.GeoDataFrame]:
+        return run_async(
+            self.adownload(
+                spatial_type=spatial_type,
+                file_format=file_format,
+                year=year,
+                out_dir=out_dir,
+                scale=scale,
+                projection=projection,
+                country_boundary=country_boundary,
+                nuts_level=nuts_level,
+                parts=parts,
+                **kwargs,
+            )
+        )
+
+    @instrumented
+    async def adownload(
+        self,
+        *,
+        spatial_type: str,
+        file_format: Optional[str] = None,
+        year: Optional[str] = None,
+        out_dir: Optional[FilePath] = None,
+        scale: Optional[str] = None,
+        projection: Optional[str] = None,
+        country_boundary: Optional[str] = None,
+        nuts_level: Optional[str] = None,
+        parts: int = 1,
         **kwargs: str,
     ) -> Optional[GeoJSON | gpd.GeoDataFrame]:
         if year is None:
-            year = self.default_dataset.year
+            year = (await self.aget_default_dataset()).year
         if file_format is None:
             file_format = 'geojson'
-        return self.get_dataset(year)._download(
+        return await self.get_dataset(year)._adownload(
             self.name,
             spatial_type,
             scale,
@@ -277,6 +518,7 @@ class ThemeParser:
             file_format=file_format,
             return_type='json',
             out_dir=out_dir,
+            parts=parts,
         )
 
 
@@ -327,6 +569,8 @@ class PostalCodes(ThemeParser):
             .splitlines()
         )
         if PANDAS_AVAILABLE:
+            import pandas as pd
+
             return pd.Series(data=ids[1:], name=ids[0])
         return ids
 
@@ -341,7 +585,7 @@ class Countries(ThemeParser):
 
     async def get_units(self, year: Optional[str] = None) -> Units:
         if year is None:
-            return await self.default_dataset.get_units()
+            return await (await self.aget_default_dataset()).get_units()
         return await Dataset(self, year).get_units()
 
     async def _gather_units(
@@ -356,9 +600,7 @@ class Countries(ThemeParser):
 
         return filter(filter_logic, await self.get_units(year))
 
-    async def _get_one(
-        self, unit, spatial_type, scale, projection, year, semaphore
-    ):
+    async def _get_one(self, unit, spatial_type, scale, projection, year):
         if spatial_type == 'RG':
             param = _UNITS_REGION.format(
                 unit=unit, scale=scale, projection=projection, year=year
@@ -372,21 +614,29 @@ class Countries(ThemeParser):
                 f'Wrong parameter {spatial_type}.Allowed are "RG" and "LB".'
             )
         try:
-            async with semaphore:
-                geojson = cast(
-                    GeoJSON, await get_param(self.name, 'distribution', param)
-                )
+            geojson = cast(
+                GeoJSON, await get_param(self.name, 'distribution', param)
+            )
         except Exception:
             raise
         return geojson
 
     async def _get_many(self, countries, spatial_type, scale, projection, year):
-        semaphore = asyncio.Semaphore(SEMAPHORE_VALUE)
-        units = await self._gather_units(countries, year)
+        units = list(await self._gather_units(countries, year))
+        if units and BULK_FETCH:
+            total = len(await self.get_units(year))
+            if _prefer_bulk(len(units), total, spatial_type, scale):
+                if spatial_type == 'RG':
+                    file_stem = f'RG_{scale}_{year}_{projection}'
+                else:
+                    file_stem = f'{spatial_type}_{year}_{projection}'
+                result = await _get_bulk(
+                    self, year, file_stem, 'CNTR_ID', units
+                )
+                if result is not None:
+                    return result
         to_do = [
-            self._get_one(
-                unit, spatial_type, scale, projection, year, semaphore
-            )
+            self._get_one(unit, spatial_type, scale, projection, year)
             for unit in units
         ]
         if not units:
@@ -399,12 +649,11 @@ class Countries(ThemeParser):
                 f'year {year}'
             )
             raise ValueError
-        to_do_iter = asyncio.as_completed(to_do)
-        result = await handle_completed_requests(coros=to_do_iter)
+        result = await collect_ordered(to_do)
         return result
 
     @overload
-    def get(
+    async def aget(
         self,
         *,
         countries: Optional[str | Sequence[str]] = None,
@@ -414,7 +663,7 @@ class Countries(ThemeParser):
     ) -> list[GeoJSON] | gpd.GeoDataFrame: ...
 
     @overload
-    def get(
+    async def aget(
         self,
         *,
         countries: Optional[str | Sequence[str]] = None,
@@ -424,7 +673,8 @@ class Countries(ThemeParser):
         year: Optional[str] = None,
     ) -> list[GeoJSON] | gpd.GeoDataFrame: ...
 
-    def get(
+    @instrumented
+    async def aget(
         self,
         *,
         countries: Optional[str | Sequence[str]] = None,
@@ -436,13 +686,103 @@ class Countries(ThemeParser):
         if isinstance(countries, str):
             countries = [countries]
         if year is None:
-            year = self.default_dataset.year
-        coro = self._get_many(countries, spatial_type, scale, projection, year)
-        geojson = run_async(coro)
-        if GEOPANDAS_AVAILABLE:
+            year = (await self.aget_default_dataset()).year
+        geojson = await self._get_many(
+            countries, spatial_type, scale, projection, year
+        )
+        # The file of the level may already be read into a GeoDataFrame.
+        if GEOPANDAS_AVAILABLE and isinstance(geojson, list):
             return gdf_from_geojson(geojson)
         return geojson
 
+    async def aiter_units(
+        self,
+        *,
+        countries: Optional[str | Sequence[str]] = None,
+        spatial_type: str = 'RG',
+        projection: str = '4326',
+        scale: Optional[str] = '20M',
+        year: Optional[str] = None,
+        window: Optional[int] = None,
+    ) -> AsyncIterator[GeoJSON | gpd.GeoDataFrame]:
+        """Yields the units as they are downloaded, instead of all at once.
+
+        Args:
+            window: The maximum number of units downloaded ahead of
+                the consumer. Defaults to the semaphore value.
+        """
+        if isinstance(countries, str):
+            countries = [countries]
+        if year is None:
+            year = (await self.aget_default_dataset()).year
+        units = await self._gather_units(countries, year)
+        async for unit in _aiter_units(
+            self, units, spatial_type, scale, projection, year, window
+        ):
+            yield unit
+
+    def iter_units(
+        self,
+        *,
+        countries: Optional[str | Sequence[str]] = None,
+        spatial_type: str = 'RG',
+        projection: str = '4326',
+        scale: Optional[str] = '20M',
+        year: Optional[str] = None,
+        window: Optional[int] = None,
+    ) -> Iterator[GeoJSON | gpd.GeoDataFrame]:
+        """The synchronous version of aiter_units."""
+        return iter_async(
+            self.aiter_units(
+                countries=countries,
+                spatial_type=spatial_type,
+                projection=projection,
+                scale=scale,
+                year=year,
+                window=window,
+            )
+        )
+
+    @overload
+    def get(
+        self,
+        *,
+        countries: Optional[str | Sequence[str]] = None,
+        spatial_type: Literal['LB'],
+        projection: Projection = '4326',
+        year: Optional[str] = None,
+    ) -> list[GeoJSON] | gpd.GeoDataFrame: ...
+
+    @overload
+    def get(
+        self,
+        *,
+        countries: Optional[str | Sequence[str]] = None,
+        spatial_type: Literal['RG'],
+        scale: Scale = '20M',
+        projection: Projection = '4326',
+        year: Optional[str] = None,
+    ) -> list[GeoJSON] | gpd.GeoDataFrame: ...
+
+    def get(
+        self,
+        *,
+        countries: Optional[str | Sequence[str]] = None,
+        spatial_type: str = 'RG',
+        projection: str = '4326',
+        scale: Optional[str] = '20M',
+        year: Optional[str] = None,
+    ) -> list[GeoJSON] | gpd.GeoDataFrame:
+        return run_async(
+            cast('AGet', self.aget)(
+                countries=countries,
+                spatial_type=spatial_type,
+                projection=projection,
+                scale=scale,
+                year=year,
+            )
+        )
+
 
 class NUTS(ThemeParser):
     name = Theme.NUTS.value
@@ -454,7 +794,7 @@ class NUTS(ThemeParser):
 
     async def get_units(self, year: Optional[str] = None) -> Units:
         if year is None:
-            return await self.default_dataset.get_units()
+            return await (await self.aget_default_dataset()).get_units()
         return await Dataset(self, year).get_units()
 
     async def _gather_units(
@@ -472,9 +812,7 @@ class NUTS(ThemeParser):
 
         return filter(filter_logic, await self.get_units(year))
 
-    async def _get_one(
-        self, unit, spatial_type, scale, projection, year, semaphore
-    ):
+    async def _get_one(self, unit, spatial_type, scale, projection, year):
         if spatial_type == 'RG':
             param = _UNITS_REGION.format(
                 unit=unit, scale=scale, projection=projection, year=year
@@ -488,10 +826,9 @@ class NUTS(ThemeParser):
                 f'Wrong parameter {spatial_type}.Allowed are "RG" and "LB".'
             )
         try:
-            async with semaphore:
-                geojson = cast(
-                    GeoJSON, await get_param(self.name, 'distribution', param)
-                )
+            geojson = cast(
+                GeoJSON, await get_param(self.name, 'distribution', param)
+            )
         except Exception:
             raise
         return geojson
@@ -499,12 +836,23 @@ class NUTS(ThemeParser):
     async def _get_many(
         self, nuts_level, countries, spatial_type, scale, projection, year
     ):
-        semaphore = asyncio.Semaphore(SEMAPHORE_VALUE)
-        units = await self._gather_units(nuts_level, countries, year)
+        units = list(await self._gather_units(nuts_level, countries, year))
+        if units and BULK_FETCH:
+            total = len(list(await self._gather_units(nuts_level, None, year)))
+            if _prefer_bulk(len(units), total, spatial_type, scale):
+                if spatial_type == 'RG':
+                    file_stem = f'RG_{scale}_{year}_{projection}_{nuts_level}'
+                else:
+                    file_stem = (
+                        f'{spatial_type}_{year}_{projection}_{nuts_level}'
+                    )
+                result = await _get_bulk(
+                    self, year, file_stem, 'NUTS_ID', units
+                )
+                if result is not None:
+                    return result
         to_do = [
-            self._get_one(
-                unit, spatial_type, scale, projection, year, semaphore
-            )
+            self._get_one(unit, spatial_type, scale, projection, year)
             for unit in units
         ]
         if not units:
@@ -518,12 +866,11 @@ class NUTS(ThemeParser):
                 f'year {year}'
             )
             raise ValueError
-        to_do_iter = asyncio.as_completed(to_do)
-        results = await handle_completed_requests(coros=to_do_iter)
+        results = await collect_ordered(to_do)
         return results
 
     @overload
-    def get(
+    async def aget(
         self,
         *,
         countries: Optional[str | Sequence[str]] = None,
@@ -534,7 +881,7 @@ class NUTS(ThemeParser):
     ) -> list[GeoJSON] | gpd.GeoDataFrame: ...
 
     @overload
-    def get(
+    async def aget(
         self,
         *,
         countries: Optional[str | Sequence[str]] = None,
@@ -545,7 +892,8 @@ class NUTS(ThemeParser):
         year: Optional[str] = None,
     ) -> list[GeoJSON] | gpd.GeoDataFrame: ...
 
-    def get(
+    @instrumented
+    async def aget(
         self,
         *,
         countries: Optional[str | Sequence[str]] = None,
@@ -558,15 +906,110 @@ class NUTS(ThemeParser):
         if isinstance(countries, str):
             countries = [countries]
         if year is None:
-            year = self.default_dataset.year
-        coro = self._get_many(
+            year = (await self.aget_default_dataset()).year
+        geojson = await self._get_many(
             nuts_level, countries, spatial_type, scale, projection, year
         )
-        geojson = run_async(coro)
-        if GEOPANDAS_AVAILABLE:
+        # The file of the level may already be read into a GeoDataFrame.
+        if GEOPANDAS_AVAILABLE and isinstance(geojson, list):
             return gdf_from_geojson(geojson)
         return geojson
 
+    async def aiter_units(
+        self,
+        *,
+        countries: Optional[str | Sequence[str]] = None,
+        nuts_level: NUTSLevel = 'LEVL_0',
+        spatial_type: str = 'RG',
+        projection: str = '4326',
+        scale: Optional[str] = '20M',
+        year: Optional[str] = None,
+        window: Optional[int] = None,
+    ) -> AsyncIterator[GeoJSON | gpd.GeoDataFrame]:
+        """Yields the units as they are downloaded, instead of all at once.
+
+        Args:
+            window: The maximum number of units downloaded ahead of
+                the consumer. Defaults to the semaphore value.
+        """
+        if isinstance(countries, str):
+            countries = [countries]
+        if year is None:
+            year = (await self.aget_default_dataset()).year
+        units = await self._gather_units(nuts_level, countries, year)
+        async for unit in _aiter_units(
+            self, units, spatial_type, scale, projection, year, window
+        ):
+            yield unit
+
+    def iter_units(
+        self,
+        *,
+        countries: Optional[str | Sequence[str]] = None,
+        nuts_level: NUTSLevel = 'LEVL_0',
+        spatial_type: str = 'RG',
+        projection: str = '4326',
+        scale: Optional[str] = '20M',
+        year: Optional[str] = None,
+        window: Optional[int] = None,
+    ) -> Iterator[GeoJSON | gpd.GeoDataFrame]:
+        """The synchronous version of aiter_units."""
+        return iter_async(
+            self.aiter_units(
+                countries=countries,
+                nuts_level=nuts_level,
+                spatial_type=spatial_type,
+                projection=projection,
+                scale=scale,
+                year=year,
+                window=window,
+            )
+        )
+
+    @overload
+    def get(
+        self,
+        *,
+        countries: Optional[str | Sequence[str]] = None,
+        nuts_level: NUTSLevel = 'LEVL_0',
+        spatial_type: Literal['LB'] = 'LB',
+        projection: Projection = '4326',
+        year: Optional[str] = None,
+    ) -> list[GeoJSON] | gpd.GeoDataFrame: ...
+
+    @overload
+    def get(
+        self,
+        *,
+        countries: Optional[str | Sequence[str]] = None,
+        nuts_level: NUTSLevel = 'LEVL_0',
+        spatial_type: Literal['RG'] = 'RG',
+        scale: Scale = '20M',
+        projection: Projection = '4326',
+        year: Optional[str] = None,
+    ) -> list[GeoJSON] | gpd.GeoDataFrame: ...
+
+    def get(
+        self,
+        *,
+        countries: Optional[str | Sequence[str]] = None,
+        nuts_level: NUTSLevel = 'LEVL_0',
+        spatial_type: str = 'RG',
+        projection: str = '4326',
+        scale: Optional[str] = '20M',
+        year: Optional[str] = None,
+    ) -> list[GeoJSON] | gpd.GeoDataFrame:
+        return run_async(
+            cast('AGet', self.aget)(
+                countries=countries,
+                nuts_level=nuts_level,
+                spatial_type=spatial_type,
+                projection=projection,
+                scale=scale,
+                year=year,
+            )
+        )
+
 
 class UrbanAudit(ThemeParser):
     name = Theme.URBAN_AUDIT.value
@@ -578,7 +1021,7 @@ class UrbanAudit(ThemeParser):
 
     async def get_units(self, year: Optional[str] = None) -> Units:
         if year is None:
-            return await self.default_dataset.get_units()
+            return await (await self.aget_default_dataset()).get_units()
         return await Dataset(self, year).get_units()
 
     async def _gather_units(
@@ -604,9 +1047,7 @@ class UrbanAudit(ThemeParser):
             return units
         return filter(filter_logic, units)
 
-    async def _get_one(
-        self, unit, spatial_type, scale, projection, year, semaphore
-    ):
+    async def _get_one(self, unit, spatial_type, scale, projection, year):
         if spatial_type == 'RG':
             param = _UNITS_REGION.format(
                 unit=unit, scale=scale, projection=projection, year=year
@@ -620,10 +1061,9 @@ class UrbanAudit(ThemeParser):
                 f'Wrong parameter {spatial_type}.Allowed are "RG" and "LB".'
             )
         try:
-            async with semaphore:
-                geojson = cast(
-                    GeoJSON, await get_param(self.name, 'distribution', param)
-                )
+            geojson = cast(
+                GeoJSON, await get_param(self.name, 'distribution', param)
+            )
         except Exception:
             raise
         else:
@@ -632,7 +1072,6 @@ class UrbanAudit(ThemeParser):
     async def _get_many(
         self, countries, category, spatial_type, scale, projection, year
     ):
-        semaphore = asyncio.Semaphore(SEMAPHORE_VALUE)
         units = await self._gather_units(category, countries)
         if not units:
             print(
@@ -646,17 +1085,14 @@ class UrbanAudit(ThemeParser):
             )
             raise ValueError
         to_do = [
-            self._get_one(
-                unit, spatial_type, scale, projection, year, semaphore
-            )
+            self._get_one(unit, spatial_type, scale, projection, year)
             for unit in units
         ]
-        to_do_iter = asyncio.as_completed(to_do)
-        results = await handle_completed_requests(coros=to_do_iter)
+        results = await collect_ordered(to_do)
         return results
 
     @overload
-    def get(
+    async def aget(
         self,
         *,
         countries: Optional[str | Sequence[str]] = None,
@@ -667,7 +1103,7 @@ class UrbanAudit(ThemeParser):
     ) -> list[GeoJSON] | gpd.GeoDataFrame: ...
 
     @overload
-    def get(
+    async def aget(
         self,
         *,
         spatial_type: Literal['RG'] = 'RG',
@@ -678,7 +1114,8 @@ class UrbanAudit(ThemeParser):
         year: Optional[str] = None,
     ) -> list[GeoJSON] | gpd.GeoDataFrame: ...
 
-    def get(
+    @instrumented
+    async def aget(
         self,
         *,
         spatial_type: str = 'RG',
@@ -691,15 +1128,109 @@ class UrbanAudit(ThemeParser):
         if isinstance(countries, str):
             countries = [countries]
         if year is None:
-            year = self.default_dataset.year
-        coro = self._get_many(
+            year = (await self.aget_default_dataset()).year
+        geojson = await self._get_many(
             countries, category, spatial_type, scale, projection, year
         )
-        geojson = run_async(coro)
         if GEOPANDAS_AVAILABLE:
             return gdf_from_geojson(geojson)
         return geojson
 
+    async def aiter_units(
+        self,
+        *,
+        countries: Optional[str | Sequence[str]] = None,
+        category: Optional[UrbanAuditCategory] = None,
+        spatial_type: str = 'RG',
+        projection: str = '4326',
+        scale: str = '100K',
+        year: Optional[str] = None,
+        window: Optional[int] = None,
+    ) -> AsyncIterator[GeoJSON | gpd.GeoDataFrame]:
+        """Yields the units as they are downloaded, instead of all at once.
+
+        Args:
+            window: The maximum number of units downloaded ahead of
+                the consumer. Defaults to the semaphore value.
+        """
+        if isinstance(countries, str):
+            countries = [countries]
+        if year is None:
+            year = (await self.aget_default_dataset()).year
+        units = await self._gather_units(category, countries)
+        async for unit in _aiter_units(
+            self, units, spatial_type, scale, projection, year, window
+        ):
+            yield unit
+
+    def iter_units(
+        self,
+        *,
+        countries: Optional[str | Sequence[str]] = None,
+        category: Optional[UrbanAuditCategory] = None,
+        spatial_type: str = 'RG',
+        projection: str = '4326',
+        scale: str = '100K',
+        year: Optional[str] = None,
+        window: Optional[int] = None,
+    ) -> Iterator[GeoJSON | gpd.GeoDataFrame]:
+        """The synchronous version of aiter_units."""
+        return iter_async(
+            self.aiter_units(
+                countries=countries,
+                category=category,
+                spatial_type=spatial_type,
+                projection=projection,
+                scale=scale,
+                year=year,
+                window=window,
+            )
+        )
+
+    @overload
+    def get(
+        self,
+        *,
+        countries: Optional[str | Sequence[str]] = None,
+        category: Optional[UrbanAuditCategory] = None,
+        spatial_type: Literal['LB'] = 'LB',
+        projection: Projection = '4326',
+        year: Optional[str] = None,
+    ) -> list[GeoJSON] | gpd.GeoDataFrame: ...
+
+    @overload
+    def get(
+        self,
+        *,
+        spatial_type: Literal['RG'] = 'RG',
+        countries: Optional[str | Sequence[str]] = None,
+        category: Optional[UrbanAuditCategory] = None,
+        projection: Projection = '4326',
+        scale: Scale = '100K',
+        year: Optional[str] = None,
+    ) -> list[GeoJSON] | gpd.GeoDataFrame: ...
+
+    def get(
+        self,
+        *,
+        spatial_type: str = 'RG',
+        countries: Optional[str | Sequence[str]] = None,
+        category: Optional[UrbanAuditCategory] = None,
+        projection: str = '4326',
+        scale: str = '100K',
+        year: Optional[str] = None,
+    ) -> list[GeoJSON] | gpd.GeoDataFrame:
+        return run_async(
+            cast('AGet', self.aget)(
+                spatial_type=spatial_type,
+                countries=countries,
+                category=category,
+                projection=projection,
+                scale=scale,
+                year=year,
+            )
+        )
+
 
 @dataclass
 class Dataset:
@@ -708,11 +1239,12 @@ class Dataset:
 
     def __post_init__(self):
         self.download = partial(self.theme_parser.download, year=self.year)
+        self.adownload = partial(self.theme_parser.adownload, year=self.year)
 
     @property
     def properties(self) -> JSON:
         return self.theme_parser.datasets[
-            [k for k in self.theme_parser.datasets.keys() if self.year in k][0]
+            _dataset_key(self.theme_parser.name, self.year)
         ]
 
     @property
@@ -751,6 +1283,13 @@ class Dataset:
     def files(self) -> Files:
         return run_async(self.get_files())
 
+    @property
+    def file_index(self) -> FileIndex:
+        index = _FILE_INDEXES.get((self.theme_parser.name, self.year))
+        if index is None:
+            return run_async(self.get_file_index())
+        return index
+
     @property
     def packages(self) -> Optional[Packages]:
         return self.get_packages()
@@ -771,7 +1310,7 @@ class Dataset:
     def get_metadata(self) -> Optional[Metadata]:
         # We do an isinstance check because it was possible that
         # the value was set before, metadata could be stored
-        # by async lru cache.
+        # by the lru cache of get_datasets.
         metadata_props = self.properties.get(Property.METADATA.value, None)
         if metadata_props is None:
             return None
@@ -783,30 +1322,44 @@ class Dataset:
 
     async def get_files(self) -> Files:
         return await get_param(
-            self.theme_parser.name, self.get_property(Property.FILES.value)
+            self.theme_parser.name,
+            await self.aget_property(Property.FILES.value),
         )
 
     async def get_units(self) -> Units:
         return await get_param(
-            self.theme_parser.name, self.get_property(Property.UNITS.value)
+            self.theme_parser.name,
+            await self.aget_property(Property.UNITS.value),
         )
 
     def get_property(self, property: str) -> Any:
         return self.properties[property]
 
+    async def aget_properties(self) -> JSON:
+        # Once loaded, the datasets are read from the cache without I/O.
+        await aget_datasets(self.theme_parser.name)
+        return self.properties
+
+    async def aget_property(self, property: str) -> Any:
+        return (await self.aget_properties())[property]
+
+    async def get_file_index(self) -> FileIndex:
+        key = (self.theme_parser.name, self.year)
+        index = _FILE_INDEXES.get(key)
+        if index is None:
+            index = _FILE_INDEXES[key] = FileIndex(await self.get_files())
+        return index
+
     def get_file_name_from_stem(
         self, file_format: str, file_stem: str
     ) -> Optional[str]:
-        json_ = self.files[file_format]
-        for value in json_:
-            # We check against 'SPATIALTYPE_YEAR_PROJECTION' etc.
-            # instead of 'THEME_SPATIALTYPE_YEAR_PROJECTION'.
-            # Naming of the 'THEME' inside the file names is inconsistent.
-            # For example, for 'Communes' the file name starts with 'COMM'.
-            to_check_against = '_'.join(value.split('_')[1:])
-            if to_check_against.startswith(file_stem):
-                return value
-        return None
+        return self.file_index.get(file_format, file_stem)
+
+    async def aget_file_name_from_stem(
+        self, file_format: str, file_stem: str
+    ) -> Optional[str]:
+        index = await self.get_file_index()
+        return index.get(file_format, file_stem)
 
     def _download(
         self,
@@ -814,6 +1367,25 @@ class Dataset:
         file_format: str,
         out_dir: Optional[FilePath] = None,
         return_type: Literal['bytes', 'json'] = 'json',
+        parts: int = 1,
+    ) -> Optional[GeoJSON | JSON | gpd.GeoDataFrame | bytes]:
+        return run_async(
+            self._adownload(
+                *args,
+                file_format=file_format,
+                out_dir=out_dir,
+                return_type=return_type,
+                parts=parts,
+            )
+        )
+
+    async def _adownload(
+        self,
+        *args: Optional[str],
+        file_format: str,
+        out_dir: Optional[FilePath] = None,
+        return_type: Literal['bytes', 'json'] = 'json',
+        parts: int = 1,
     ) -> Optional[GeoJSON | JSON | gpd.GeoDataFrame | bytes]:
         valid_formats = ('csv', 'geojson')
         if out_dir is None and file_format not in valid_formats:
@@ -835,29 +1407,45 @@ class Dataset:
         # which can't be parsed from anywhere.
         file_stem = '_'.join(arg for arg in args[1:] if arg is not None)
         file_stem_upper = file_stem.upper()
-        file_name = self.get_file_name_from_stem(file_format, file_stem_upper)
+        file_name = await self.aget_file_name_from_stem(
+            file_format, file_stem_upper
+        )
         if file_name is None:
-            to_choose_from = '\n'.join(self.files[file_format.lower()])
+            files = await self.get_files()
+            to_choose_from = '\n'.join(files[file_format.lower()])
             raise ValueError(
                 f'No file found for {file_stem_upper}\n'
                 f'Available to choose from:\n{to_choose_from}'
             )
 
         if out_dir is not None:
-            content = run_async(
-                get_file(self.theme_parser.name, file_format, file_name)
+            await download_file(
+                self.theme_parser.name,
+                file_format,
+                file_name,
+                Path(out_dir) / file_name,
+                parts=parts,
             )
-            with open(Path(out_dir) / file_name, 'wb') as f:
-                f.write(content)
             return None
+        elif (
+            GEOPANDAS_AVAILABLE
+            and GEOJSON_READER == 'pyogrio'
+            and file_format == 'geojson'
+            and return_type == 'json'
+        ):
+            content = await get_param(
+                self.theme_parser.name,
+                file_format,
+                file_name,
+                return_type='bytes',
+            )
+            return gdf_from_geojson_bytes(content)
         else:
-            coro = run_async(
-                get_param(
-                    self.theme_parser.name,
-                    file_format,
-                    file_name,
-                    return_type=return_type,
-                )
+            coro = await get_param(
+                self.theme_parser.name,
+                file_format,
+                file_name,
+                return_type=return_type,
             )
 
             if GEOPANDAS_AVAILABLE and file_format == 'geojson':
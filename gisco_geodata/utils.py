@@ -1,20 +1,33 @@
 from __future__ import annotations
 
 import asyncio
+import atexit
+import email.utils
 import functools
 import importlib.util
+import itertools
+import json
 import os
+import random
 import threading
 import time
+import warnings
 from collections.abc import (
+    AsyncGenerator,
+    AsyncIterator,
+    Awaitable,
     Callable,
     Coroutine,
+    Iterable,
     Iterator,
+    Mapping,
     Sequence,
 )
+from dataclasses import dataclass, field
 from typing import (
     TYPE_CHECKING,
     Any,
+    Optional,
     Type,
     TypeVar,
     cast,
@@ -22,6 +35,9 @@ from typing import (
 
 import httpx
 
+from .events import ATTEMPT, bind_context
+from .profiling import stage
+
 if TYPE_CHECKING:
     import geopandas as gpd
 
@@ -29,6 +45,10 @@ if TYPE_CHECKING:
 
 T = TypeVar('T')
 
+_EXHAUSTED = object()
+# Timeouts, rate limiting and server errors which are worth retrying.
+RETRY_STATUS_CODES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
 
 def is_pytest_running():
     return 'PYTEST_CURRENT_TEST' in os.environ
@@ -50,9 +70,32 @@ def pandas_is_available() -> bool:
     return is_package_installed('pandas')
 
 
+def pyogrio_is_available() -> bool:
+    return is_package_installed('pyogrio')
+
+
+def orjson_is_available() -> bool:
+    return is_package_installed('orjson')
+
+
+ORJSON_AVAILABLE = orjson_is_available()
+
+
+def json_loads(content: bytes) -> Any:
+    """Parses JSON, with orjson if it is installed."""
+    if ORJSON_AVAILABLE:
+        import orjson
+
+        return orjson.loads(content)
+    return json.loads(content)
+
+
 def gdf_from_geojson(geojsons: GeoJSON | Sequence[GeoJSON]) -> gpd.GeoDataFrame:
     """Created a GeoDataFrame from GeoJSON.
 
+    The features of all the GeoJSONs sharing a CRS are converted at once,
+    instead of building and concatenating one GeoDataFrame per GeoJSON.
+
     Args:
         geojsons (GeoJSON | Sequence[GeoJSON]): GeoJSON information.
 
@@ -65,68 +108,337 @@ def gdf_from_geojson(geojsons: GeoJSON | Sequence[GeoJSON]) -> gpd.GeoDataFrame:
     import pandas as pd
 
     if isinstance(geojsons, dict):
-        return gpd.GeoDataFrame.from_features(
-            features=geojsons['features'],
-            crs=geojsons['crs']['properties']['name'],
-        )
-    elif isinstance(geojsons, Sequence):
-        return cast(
-            gpd.GeoDataFrame,
-            pd.concat(
-                [
-                    gpd.GeoDataFrame.from_features(
-                        features=geojson['features'],
-                        crs=geojson['crs']['properties']['name'],
-                    )
-                    for geojson in geojsons
-                ]
-            ),
-        )
-    else:
+        geojsons = [geojsons]
+    elif not isinstance(geojsons, Sequence):
         raise ValueError(f'Wrong argument {geojsons}')
+    features_by_crs: dict[str, list[dict]] = {}
+    for geojson in geojsons:
+        crs = geojson['crs']['properties']['name']
+        features_by_crs.setdefault(crs, []).extend(geojson['features'])
+    with stage('from_features'):
+        frames = [
+            gpd.GeoDataFrame.from_features(features=features, crs=crs)
+            for crs, features in features_by_crs.items()
+        ]
+    if len(frames) == 1:
+        return frames[0]
+    with stage('concat'):
+        return cast(gpd.GeoDataFrame, pd.concat(frames, ignore_index=True))
+
+
+def gdf_from_geojson_bytes(
+    contents: bytes | Sequence[bytes],
+) -> gpd.GeoDataFrame:
+    """Created a GeoDataFrame from raw GeoJSON bytes.
+
+    If pyogrio is installed, the bytes are read by GDAL, without creating
+    Python objects for every feature and coordinate. This is faster and
+    uses less memory for large files, but opening a file has a fixed cost,
+    so it is slower for many small files. Otherwise, the bytes are parsed
+    with json_loads and passed to gdf_from_geojson.
+
+    Args:
+        contents (bytes | Sequence[bytes]): The GeoJSON files.
+
+    Returns:
+        GeoDataFrame: The GeoDataFrame describing the GeoJSONs.
+    """
+    assert geopandas_is_available()
+
+    import geopandas as gpd
+    import pandas as pd
+
+    if isinstance(contents, bytes):
+        contents = [contents]
+    if not pyogrio_is_available():
+        with stage('parse'):
+            geojsons = [json_loads(content) for content in contents]
+        return gdf_from_geojson(geojsons)
+
+    import pyogrio
+
+    with stage('read_dataframe'):
+        frames = [pyogrio.read_dataframe(content) for content in contents]
+    if len(frames) == 1:
+        return frames[0]
+    with stage('concat'):
+        return cast(gpd.GeoDataFrame, pd.concat(frames, ignore_index=True))
+
+
+async def _indexed(index: int, aw: Awaitable[T]) -> tuple[int, T]:
+    return (index, await aw)
+
+
+async def iter_completed(
+    aws: Iterable[Awaitable[T]], limit: Optional[int] = None
+) -> AsyncGenerator[tuple[int, T], None]:
+    """Yields the results as they complete, with the index of their awaitable.
+
+    If one of the awaitables fails, or if the generator is closed early,
+    the remaining ones are cancelled and awaited.
+
+    Args:
+        aws: The awaitables, consumed lazily if 'limit' is set.
+        limit: The maximum number of awaitables scheduled and not yet
+            yielded. The next ones are only scheduled once the consumer
+            asks for more results. None schedules them all at once.
+    """
+    indexed = enumerate(aws)
+    tasks: dict[asyncio.Future[tuple[int, T]], int] = {}
+
+    def schedule():
+        count = None if limit is None else max(0, limit - len(tasks))
+        for index, aw in itertools.islice(indexed, count):
+            tasks[asyncio.ensure_future(_indexed(index, aw))] = index
+
+    try:
+        schedule()
+        while tasks:
+            done, _ = await asyncio.wait(
+                tasks, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in sorted(done, key=tasks.__getitem__):
+                result = task.result()
+                del tasks[task]
+                yield result
+            schedule()
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Retrieves the errors of the cancelled or failed tasks, which
+        # would otherwise be logged when they are garbage collected.
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def collect_ordered(aws: Iterable[Awaitable[T]]) -> list[T]:
+    """The results of the awaitables, in their order, see iter_completed."""
+    aws = list(aws)
+    results: list[Any] = [None] * len(aws)
+    completed = iter_completed(aws)
+    try:
+        with stage('collect'):
+            async for index, result in completed:
+                results[index] = result
+    finally:
+        await completed.aclose()
+    return results
 
 
 async def handle_completed_requests(
-    coros: Iterator[asyncio.futures.Future[T]],
+    coros: Iterable[Awaitable[T]],
 ) -> list[T]:
-    json = []
-    for coro in coros:
-        try:
-            json.append(await coro)  # <8>
-        except httpx.HTTPStatusError:
-            raise
-        except httpx.RequestError:
-            raise
-        except KeyboardInterrupt:
-            break
-    return json
+    """The results of the awaitables, in their order.
+
+    Deprecated, use collect_ordered (or iter_completed to get the
+    results as they complete).
+    """
+    warnings.warn(
+        'handle_completed_requests is deprecated, use collect_ordered.',
+        DeprecationWarning,
+        stacklevel=2,
+    )
+    return await collect_ordered(coros)
+
+
+async def _anext(iterator: AsyncIterator[T]) -> Any:
+    try:
+        return await iterator.__anext__()
+    except StopAsyncIteration:
+        return _EXHAUSTED
+
+
+def iter_async(iterator: AsyncIterator[T]) -> Iterator[T]:
+    """Iterates an async iterator from synchronous code, with run_async.
+
+    The iterator runs on the background event loop, so its pending
+    tasks keep running between the items.
+    """
+    try:
+        while True:
+            item = run_async(_anext(iterator))
+            if item is _EXHAUSTED:
+                return
+            yield item
+    finally:
+        aclose = getattr(iterator, 'aclose', None)
+        if aclose is not None:
+            run_async(aclose())
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    """Parses the 'Retry-After' header, given in seconds or as a date."""
+    value = response.headers.get('retry-after')
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+@dataclass
+class RetryPolicy:
+    """Decides whether and when a failed call is retried.
+
+    Args:
+        retries: The maximum number of retries.
+        backoff: The delay before the first retry, in seconds. It doubles
+            with every retry.
+        max_delay: The maximum delay between two attempts, in seconds.
+        jitter: Whether to pick a random delay between 0 and the
+            exponential backoff, so concurrent calls don't retry in sync.
+        budget: The maximum total time spent on a call, retries included,
+            in seconds. None means there is no limit.
+        status_codes: The HTTP status codes that are retried. Others, like
+            404, are raised right away.
+        respect_retry_after: Whether to wait for the delay requested by
+            the server in the 'Retry-After' header (up to 'max_delay').
+        rules: Whether to retry an exception, by exception class. The most
+            specific class of the exception found in the rules is used and
+            exceptions not covered by the rules are not retried.
+    """
+
+    retries: int = 8
+    backoff: float = 0.5
+    max_delay: float = 30.0
+    jitter: bool = True
+    budget: Optional[float] = None
+    status_codes: frozenset[int] = RETRY_STATUS_CODES
+    respect_retry_after: bool = True
+    rules: Mapping[Type[BaseException], bool] = field(
+        default_factory=lambda: {
+            httpx.HTTPStatusError: True,
+            httpx.TransportError: True,
+        }
+    )
+
+    def should_retry(self, exc: BaseException) -> bool:
+        for cls in type(exc).__mro__:
+            if cls in self.rules:
+                if not self.rules[cls]:
+                    return False
+                break
+        else:
+            return False
+        if isinstance(exc, httpx.HTTPStatusError):
+            return exc.response.status_code in self.status_codes
+        return True
+
+    def delay(self, attempt: int, exc: BaseException) -> float:
+        """The time to wait before the retry number 'attempt' (from 0)."""
+        delay = min(self.max_delay, self.backoff * 2**attempt)
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        if self.respect_retry_after and isinstance(exc, httpx.HTTPStatusError):
+            retry_after = _retry_after(exc.response)
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    def next_delay(
+        self, attempt: int, exc: BaseException, start: float
+    ) -> Optional[float]:
+        """The delay before the next attempt, or None to stop retrying."""
+        if attempt >= self.retries or not self.should_retry(exc):
+            return None
+        delay = self.delay(attempt, exc)
+        if (
+            self.budget is not None
+            and time.monotonic() - start + delay > self.budget
+        ):
+            return None
+        return delay
+
+
+RETRY_POLICY = RetryPolicy()
+
+
+def _legacy_policy(
+    policy: Optional[RetryPolicy | Type[Exception]],
+    on: Optional[Type[Exception]],
+    retries: Optional[int],
+    delay: Optional[float],
+) -> Optional[RetryPolicy]:
+    """Maps the deprecated arguments of retry/async_retry to a RetryPolicy.
+
+    They retried every exception of type 'on', 'retries' times (50 by
+    default), waiting 'delay' seconds (0.5 by default) between attempts.
+    """
+    if isinstance(policy, type):
+        # The first positional argument used to be 'on'.
+        policy, on = None, policy
+    if on is None and retries is None and delay is None:
+        return policy
+    if policy is not None:
+        raise TypeError(
+            "'policy' can't be combined with 'on', 'retries' and 'delay'."
+        )
+    warnings.warn(
+        "The 'on', 'retries' and 'delay' arguments are deprecated, "
+        'pass a RetryPolicy instead.',
+        DeprecationWarning,
+        stacklevel=3,
+    )
+    delay = 0.5 if delay is None else delay
+    return RetryPolicy(
+        retries=50 if retries is None else retries,
+        backoff=delay,
+        max_delay=delay,
+        jitter=False,
+        status_codes=frozenset(range(100, 600)),
+        respect_retry_after=False,
+        rules={Exception if on is None else on: True},
+    )
 
 
 def async_retry(
-    on: Type[Exception] = Exception, retries: int = 50, delay: float = 0.5
+    policy: Optional[RetryPolicy | Type[Exception]] = None,
+    retries: Optional[int] = None,
+    delay: Optional[float] = None,
+    *,
+    on: Optional[Type[Exception]] = None,
 ):
-    """Wraps async functions into try/except blocks.
+    """Retries async functions according to a RetryPolicy.
+
+    The decorated function accepts an additional 'retry_policy' keyword
+    argument, which overrides the policy for that call.
 
     Args:
-        retries: The number of retries.
-        delay: The time delay in seconds between each retry.
+        policy: The policy to use. Defaults to RETRY_POLICY,
+            read at call time.
+        retries, delay, on: Deprecated, the number of retries, the delay
+            in seconds between them and the exception type retried
+            (also accepted as the first positional argument).
     """
+    policy = _legacy_policy(policy, on, retries, delay)
 
     def decorator(
         func: Callable[..., Coroutine[Any, Any, T]],
     ) -> Callable[..., Coroutine[Any, Any, T]]:
         @functools.wraps(func)
-        async def wrapper(*args, **kwargs):
-            attempts = 0
-            while attempts < retries:
+        async def wrapper(
+            *args, retry_policy: Optional[RetryPolicy] = None, **kwargs
+        ):
+            policy_ = retry_policy or policy or RETRY_POLICY
+            start = time.monotonic()
+            attempt = 0
+            while True:
+                token = ATTEMPT.set(attempt)
                 try:
                     return await func(*args, **kwargs)
-                except on:
-                    await asyncio.sleep(delay)
-                    attempts += 1
-            raise RuntimeError(
-                f'Function {func.__name__} failed after {retries} retries.'
-            )
+                except Exception as exc:
+                    delay = policy_.next_delay(attempt, exc, start)
+                    if delay is None:
+                        raise
+                finally:
+                    ATTEMPT.reset(token)
+                await asyncio.sleep(delay)
+                attempt += 1
 
         return wrapper
 
@@ -134,29 +446,46 @@ def async_retry(
 
 
 def retry(
-    on: Type[Exception] = Exception, retries: int = 50, delay: float = 0.5
+    policy: Optional[RetryPolicy | Type[Exception]] = None,
+    retries: Optional[int] = None,
+    delay: Optional[float] = None,
+    *,
+    on: Optional[Type[Exception]] = None,
 ):
-    """Wraps functions into try/except blocks.
+    """Retries functions according to a RetryPolicy.
+
+    The decorated function accepts an additional 'retry_policy' keyword
+    argument, which overrides the policy for that call.
 
     Args:
-        on: The Exception type that should be raised to retry.
-        retries: The number of retries.
-        delay: The time delay in seconds between each retry.
+        policy: The policy to use. Defaults to RETRY_POLICY,
+            read at call time.
+        retries, delay, on: Deprecated, the number of retries, the delay
+            in seconds between them and the exception type retried
+            (also accepted as the first positional argument).
     """
+    policy = _legacy_policy(policy, on, retries, delay)
 
     def decorator(func):
         @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            attempts = 0
-            while attempts < retries:
+        def wrapper(
+            *args, retry_policy: Optional[RetryPolicy] = None, **kwargs
+        ):
+            policy_ = retry_policy or policy or RETRY_POLICY
+            start = time.monotonic()
+            attempt = 0
+            while True:
+                token = ATTEMPT.set(attempt)
                 try:
                     return func(*args, **kwargs)
-                except on:
-                    time.sleep(delay)
-                    attempts += 1
-            raise RuntimeError(
-                f'Function {func.__name__} failed after {retries} retries.'
-            )
+                except Exception as exc:
+                    delay = policy_.next_delay(attempt, exc, start)
+                    if delay is None:
+                        raise
+                finally:
+                    ATTEMPT.reset(token)
+                time.sleep(delay)
+                attempt += 1
 
         return wrapper
 
@@ -167,18 +496,82 @@ class RunThread(threading.Thread):
     def __init__(self, coro: Coroutine[Any, Any, T]):
         self.coro = coro
         self.result = None
+        self.exception: Optional[BaseException] = None
         super().__init__()
 
     def run(self):
-        self.result = asyncio.run(self.coro)
+        try:
+            self.result = asyncio.run(self.coro)
+        except BaseException as exc:
+            self.exception = exc
+
+
+class LoopThread(threading.Thread):
+    """A daemon thread running an event loop until shutdown."""
+
+    def __init__(self):
+        super().__init__(name='gisco-geodata-loop', daemon=True)
+        self.loop = asyncio.new_event_loop()
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def shutdown(self, timeout: float = 5):
+        """Runs the shutdown callbacks and stops the loop."""
+        for callback in _SHUTDOWN_CALLBACKS:
+            future = asyncio.run_coroutine_threadsafe(callback(), self.loop)
+            try:
+                future.result(timeout)
+            except Exception:
+                pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.join(timeout)
+        if not self.is_alive():
+            self.loop.close()
+
+
+_LOOP_THREAD: Optional[LoopThread] = None
+_LOOP_LOCK = threading.Lock()
+_SHUTDOWN_CALLBACKS: list[Callable[[], Coroutine[Any, Any, Any]]] = []
+
+
+def on_shutdown(callback: Callable[[], Coroutine[Any, Any, Any]]):
+    """Registers a coroutine function to run on the background loop at exit.
+
+    Used to release the resources bound to the loop (e.g. HTTP clients).
+    """
+    _SHUTDOWN_CALLBACKS.append(callback)
+
+
+def get_loop_thread() -> LoopThread:
+    """The thread of the background event loop, started on first use."""
+    global _LOOP_THREAD
+    with _LOOP_LOCK:
+        if _LOOP_THREAD is None or not _LOOP_THREAD.is_alive():
+            _LOOP_THREAD = LoopThread()
+            _LOOP_THREAD.start()
+            atexit.register(_LOOP_THREAD.shutdown)
+        return _LOOP_THREAD
+
+
+def runs_async_calls() -> bool:
+    """Whether the current thread runs the coroutines of run_async.
+
+    The threads calling run_async, even from a running event loop, are
+    blocked until these coroutines return.
+    """
+    return isinstance(threading.current_thread(), (LoopThread, RunThread))
 
 
 def run_async(coro: Coroutine[Any, Any, T]) -> T:
     """Function to use instead of asyncio.run.
 
-    This prevents problems when there is already
-      asynchronous code running.
-      See: https://stackoverflow.com/a/75094151
+    The coroutine is executed on a single, long-lived background event
+    loop shared by every synchronous call. This prevents problems when
+    there is already asynchronous code running (e.g. in Jupyter, see
+    https://stackoverflow.com/a/75094151) and lets the connection pools
+    and in-flight requests be shared across calls.
 
     Args:
         coro (Coroutine[Any, Any, _T]):
@@ -187,14 +580,21 @@ def run_async(coro: Coroutine[Any, Any, T]) -> T:
     Returns:
         _T: The returned result from the coroutine execution.
     """
-    try:
-        loop = asyncio.get_running_loop()
-    except RuntimeError:
-        loop = None
-    if loop and loop.is_running():
+    # The requests are reported to events.collect_stats blocks of the caller.
+    coro = bind_context(coro)
+    loop_thread = get_loop_thread()
+    if threading.current_thread() is loop_thread:
+        # Called from a coroutine of the background loop, waiting
+        # for the result here would block the loop forever.
         thread = RunThread(coro)
         thread.start()
         thread.join()
+        if thread.exception is not None:
+            raise thread.exception
         return cast(T, thread.result)
-    else:
-        return asyncio.run(coro)
+    future = asyncio.run_coroutine_threadsafe(coro, loop_thread.loop)
+    try:
+        return future.result()
+    except BaseException:
+        future.cancel()
+        raise